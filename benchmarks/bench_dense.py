@@ -0,0 +1,66 @@
+"""Recall@k and latency of the dense ANN tier against exact brute force.
+
+Usage:
+    python -m benchmarks.bench_dense --sizes 10000 100000 --queries 200 --top-k 10
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+
+from core.dense_index import DenseRetriever, brute_force
+from core.embedding import HashingEmbedder
+
+from .bench_scoring import synthetic_corpus
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--vector-store", default="faiss")
+    args = parser.parse_args()
+
+    embedder = HashingEmbedder(dim=args.dim)
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            retriever = DenseRetriever(tmp, embedder, vector_store=args.vector_store)
+            t0 = time.perf_counter()
+            corpus = synthetic_corpus(size)
+            for lo in range(0, size, 4096):
+                retriever.add_texts(corpus[lo:lo + 4096])
+            build_s = time.perf_counter() - t0
+            queries = embedder.embed_batch(synthetic_corpus(args.queries, seed=size))
+            data = retriever.matrix.view()
+
+            t0 = time.perf_counter()
+            exact = [{d for d, _ in brute_force(data, q, args.top_k)} for q in queries]
+            exact_ms = (time.perf_counter() - t0) / len(queries) * 1000
+
+            for nprobe in args.nprobe:
+                if hasattr(retriever.index, "nprobe"):
+                    retriever.index.nprobe = nprobe
+                t0 = time.perf_counter()
+                approx = [{d for d, _ in retriever.search(q, args.top_k)} for q in queries]
+                ann_ms = (time.perf_counter() - t0) / len(queries) * 1000
+                recall = sum(len(a & e) for a, e in zip(approx, exact)) / max(1, sum(len(e) for e in exact))
+                print(json.dumps({
+                    "size": size,
+                    "index": retriever.index.name,
+                    "nprobe": nprobe,
+                    "build_s": round(build_s, 3),
+                    f"recall@{args.top_k}": round(recall, 4),
+                    "ann_query_ms": round(ann_ms, 4),
+                    "exact_query_ms": round(exact_ms, 4),
+                }))
+                if not hasattr(retriever.index, "nprobe"):
+                    break
+
+
+if __name__ == "__main__":
+    main()
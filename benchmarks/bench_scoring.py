@@ -0,0 +1,73 @@
+"""Compare the pure-Python and NumPy scoring backends of MemoryManager.
+
+Usage:
+    python -m benchmarks.bench_scoring --sizes 10000 100000 1000000 --queries 200
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+import time
+from typing import Dict, List
+
+from core.memory_manager import _tf
+from core.scoring import make_backend
+
+
+def synthetic_corpus(n: int, vocab: int = 20000, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    # Zipf-like term distribution so posting lengths look like real dialogue
+    words = [f"w{i}" for i in range(vocab)]
+    cum = list(itertools.accumulate(1.0 / (i + 1) for i in range(vocab)))
+    return [" ".join(rng.choices(words, cum_weights=cum, k=rng.randint(4, 24))) for _ in range(n)]
+
+
+def bench_backend(name: str, docs: List[Dict[str, float]], queries: List[Dict[str, float]], k: int, batch: int) -> Dict[str, float]:
+    backend = make_backend(name)
+    t0 = time.perf_counter()
+    for i, vec in enumerate(docs):
+        backend.add(i, vec)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for q in queries:
+        backend.search(q, k)
+    single_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for lo in range(0, len(queries), batch):
+        backend.search_batch(queries[lo:lo + batch], k)
+    batch_s = time.perf_counter() - t0
+
+    n = max(1, len(queries))
+    return {
+        "backend": backend.name,
+        "build_s": round(build_s, 4),
+        "query_ms": round(single_s / n * 1000, 4),
+        "batch_query_ms": round(batch_s / n * 1000, 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--backends", nargs="+", default=["python", "numpy"])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        docs = [_tf(t) for t in synthetic_corpus(size)]
+        queries = [_tf(t) for t in synthetic_corpus(args.queries, seed=size)]
+        for name in args.backends:
+            row = {"size": size, **bench_backend(name, docs, queries, args.top_k, args.batch)}
+            if row["backend"] != name:
+                row["note"] = f"{name} unavailable, fell back to {row['backend']}"
+            print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Synthetic Chinese/English conversation corpora for offline benchmarks.
+
+Utterances are built from templates over fixed vocabularies with a seeded RNG,
+so the same (n, lang, seed) always yields the same corpus. A share of them
+carry tool keywords (搜索/总结/心情 ...) and memory-worthy preferences
+("我喜欢 ...") so routing and memory-write paths get exercised.
+"""
+from __future__ import annotations
+
+import random
+from typing import List
+
+_ZH_TOPICS = [
+    "乌龙茶", "咖啡", "跑步", "爬山", "电影", "小说", "猫", "狗", "钢琴", "吉他", "旅行", "做饭",
+    "上海", "北京", "成都", "杭州", "工作", "考试", "面试", "周末", "生日", "雨天", "音乐会", "画画",
+]
+_ZH_TEMPLATES = [
+    "今天{a}的时候想到了{b}",
+    "我喜欢{a}，也喜欢{b}",
+    "我的目标是今年学会{a}",
+    "最近{a}让我有点累，想聊聊{b}",
+    "你还记得我说过的{a}吗",
+    "帮我搜索一下{a}的新闻",
+    "帮我总结一下关于{a}和{b}的事情",
+    "我现在的心情不太好，因为{a}",
+    "周末打算去{a}，顺便看看{b}",
+    "我的城市是{a}，这里的{b}很好",
+]
+_EN_TOPICS = [
+    "tea", "coffee", "running", "hiking", "movies", "novels", "cats", "dogs", "piano", "guitar", "travel",
+    "cooking", "Berlin", "Tokyo", "work", "exams", "interviews", "weekends", "birthdays", "rain", "concerts",
+]
+_EN_TEMPLATES = [
+    "I was thinking about {a} while {b} today",
+    "Do you remember what I said about {a}?",
+    "My plan this year is to get better at {a}",
+    "Lately {a} has been stressful, can we talk about {b}?",
+    "I really enjoy {a} and sometimes {b}",
+    "Tell me something kind about {a}",
+]
+
+
+def conversation_corpus(n: int, lang: str = "mixed", seed: int = 7) -> List[str]:
+    """``n`` user utterances; ``lang`` is "zh", "en" or "mixed" (about 70% Chinese)."""
+    rng = random.Random(seed)
+    out: List[str] = []
+    for _ in range(n):
+        zh = lang == "zh" or (lang == "mixed" and rng.random() < 0.7)
+        topics, templates = (_ZH_TOPICS, _ZH_TEMPLATES) if zh else (_EN_TOPICS, _EN_TEMPLATES)
+        a, b = rng.sample(topics, 2)
+        out.append(rng.choice(templates).format(a=a, b=b))
+    return out
+
+
+def memory_corpus(n: int, lang: str = "mixed", seed: int = 7) -> List[str]:
+    """``n`` stored-memory texts shaped like node_memory_decision_and_write output."""
+    users = conversation_corpus(n, lang, seed)
+    return [f"{u}\n（占位回复）我已理解：{u}" for u in users]
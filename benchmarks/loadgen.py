@@ -0,0 +1,98 @@
+"""Concurrent-session load generator for the web mode (POST /chat).
+
+Usage:
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --sessions 32 --turns 10
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+_PROMPTS = ["你好，今天过得怎么样？", "帮我记住我喜欢喝乌龙茶", "我之前说过喜欢什么？", "Tell me something kind."]
+
+
+async def _post(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, path: str, payload: Dict) -> Tuple[int, Dict]:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        (
+            f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        ).encode("latin-1")
+        + body
+    )
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    status = int(head[0].split(" ", 2)[1])
+    length = 0
+    for line in head[1:]:
+        if line.lower().startswith("content-length:"):
+            length = int(line.split(":", 1)[1])
+    data = await reader.readexactly(length) if length else b"{}"
+    return status, json.loads(data)
+
+
+async def _session(url: str, index: int, turns: int, latencies: List[float], counts: Dict[str, int]) -> None:
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    session_id: Optional[str] = None
+    try:
+        for turn in range(turns):
+            payload = {"text": _PROMPTS[(index + turn) % len(_PROMPTS)], "user_id": f"load-{index}"}
+            if session_id:
+                payload["session_id"] = session_id
+            t0 = time.perf_counter()
+            status, data = await _post(reader, writer, parts.netloc, "/chat", payload)
+            if status == 200:
+                latencies.append(time.perf_counter() - t0)
+                session_id = data.get("session_id")
+                counts["ok"] += 1
+            elif status == 503:
+                counts["rejected"] += 1
+                await asyncio.sleep(0.05)
+            else:
+                counts["errors"] += 1
+    finally:
+        writer.close()
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def run(url: str, sessions: int, turns: int) -> Dict:
+    latencies: List[float] = []
+    counts = {"ok": 0, "rejected": 0, "errors": 0}
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_session(url, i, turns, latencies, counts) for i in range(sessions)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "sessions": sessions,
+        "turns": turns,
+        **counts,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(counts["ok"] / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p90_ms": round(_percentile(latencies, 0.90) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+    for sessions in args.sessions:
+        print(json.dumps(asyncio.run(run(args.url, sessions, args.turns))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Multi-process stress test of the sharded memory store.
+
+Several processes append memories to one ``ShardedMemory`` at once while
+searching it (and, with ``--rewrite``, one of them keeps rewriting every
+shard), then the shard files are checked: every line parses, every record
+sits in its shard with an intact checksum, and each (writer, seq) pair was
+stored exactly once. Exits 1 on any lost, duplicated or corrupt record.
+
+Usage:
+    python -m benchmarks.memory_stress --procs 8 --writes 500 --shards 4 --rewrite
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+from core.sharded_memory import ShardedMemory
+
+_WORDS = ["咖啡", "跑步", "上海", "猫", "rust", "python", "jazz", "hiking", "茶", "电影", "北京", "guitar"]
+
+
+def _text(pid: int, seq: int, user: str, rng: random.Random) -> str:
+    return f"{user} w{pid} s{seq} " + " ".join(rng.choices(_WORDS, k=6))
+
+
+def _writer(pid: int, args: argparse.Namespace, results: "mp.Queue") -> None:
+    rng = random.Random(pid)
+    memory = ShardedMemory(args.root, shards=args.shards, partition_key="user")
+    leaks = searches = rewrites = 0
+    t0 = time.perf_counter()
+    for start in range(0, args.writes, args.batch):
+        items = []
+        for seq in range(start, min(start + args.batch, args.writes)):
+            user = f"u{rng.randrange(args.users)}"
+            text = _text(pid, seq, user, rng)
+            items.append((text, {"user": user, "writer": pid, "seq": seq, "crc": zlib.crc32(text.encode("utf-8"))}))
+        memory.add_memories(items)
+        if args.search_every and (start // args.batch) % args.search_every == 0:
+            user = f"u{rng.randrange(args.users)}"
+            hits = memory.search(" ".join(rng.choices(_WORDS, k=2)), user=user)
+            searches += 1
+            # A user-scoped search must only see that user's memories
+            leaks += sum(1 for h in hits if not h.startswith(user + " "))
+        if args.rewrite and pid == 0 and (start // args.batch) % 10 == 5:
+            memory.rewrite(lambda live: [record for _, record in live])
+            rewrites += 1
+    elapsed = time.perf_counter() - t0
+    memory.close()
+    results.put({"pid": pid, "s": elapsed, "searches": searches, "leaks": leaks, "rewrites": rewrites})
+
+
+def check(args: argparse.Namespace) -> Dict[str, int]:
+    memory = ShardedMemory(args.root, shards=args.shards, partition_key="user")
+    report = {"records": 0, "corrupt_lines": 0, "bad_checksum": 0, "wrong_shard": 0, "duplicates": 0, "lost": 0}
+    seen: Counter = Counter()
+    for i in range(args.shards):
+        path = Path(args.root) / f"shard-{i:02d}" / "memories.jsonl"
+        for line in path.read_bytes().splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                report["corrupt_lines"] += 1
+                continue
+            meta = record.get("meta") or {}
+            report["records"] += 1
+            if zlib.crc32(record.get("text", "").encode("utf-8")) != meta.get("crc"):
+                report["bad_checksum"] += 1
+            if memory.shard_of(meta) != i:
+                report["wrong_shard"] += 1
+            seen[(meta.get("writer"), meta.get("seq"))] += 1
+    expected = {(pid, seq) for pid in range(args.procs) for seq in range(args.writes)}
+    report["duplicates"] = sum(n - 1 for n in seen.values() if n > 1)
+    report["lost"] = len(expected - set(seen))
+    report["indexed"] = len(memory)
+    memory.close()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", default=None, help="store directory (default: a temporary one, removed afterwards)")
+    parser.add_argument("--procs", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=500, help="memories per process")
+    parser.add_argument("--batch", type=int, default=8, help="memories per add_memories call")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--search-every", type=int, default=4, help="batches between searches (0: none)")
+    parser.add_argument("--rewrite", action="store_true", help="process 0 rewrites all shards every 10 batches")
+    args = parser.parse_args()
+    tmp = None
+    if args.root is None:
+        tmp = args.root = tempfile.mkdtemp(prefix="memory_stress_")
+
+    ctx = mp.get_context("spawn")
+    results: "mp.Queue" = ctx.Queue()
+    t0 = time.perf_counter()
+    procs = [ctx.Process(target=_writer, args=(pid, args, results)) for pid in range(args.procs)]
+    for p in procs:
+        p.start()
+    stats: List[Dict] = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    wall = time.perf_counter() - t0
+
+    report = check(args)
+    total = args.procs * args.writes
+    report.update(
+        procs=args.procs,
+        shards=args.shards,
+        writes=total,
+        wall_s=round(wall, 3),
+        writes_per_s=round(total / wall, 1),
+        searches=sum(s["searches"] for s in stats),
+        leaks=sum(s["leaks"] for s in stats),
+        rewrites=sum(s["rewrites"] for s in stats),
+    )
+    print(json.dumps(report, ensure_ascii=False))
+    if tmp is not None:
+        shutil.rmtree(tmp, ignore_errors=True)
+    failed = any(report[k] for k in ("corrupt_lines", "bad_checksum", "wrong_shard", "duplicates", "lost", "leaks"))
+    failed = failed or report["records"] != total or report["indexed"] != total or any(p.exitcode for p in procs)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""End-to-end benchmark suite: memory, routing, turn pipeline and startup.
+
+Runs offline on synthetic conversation corpora and prints one JSON document.
+Compare against a stored baseline to flag regressions (exit status 1).
+
+Usage:
+    python -m benchmarks.suite --memories 5000 --out bench.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --threshold 0.15
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from core.graph_builder import DialogueGraph
+from core.llm_manager import LLMManager
+from core.memory_manager import MemoryManager
+from core.reasoning import ToolRouter
+from core.state import AgentState
+
+from .corpus import conversation_corpus, memory_corpus
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# metric name -> {"value", "unit", "better": "higher" | "lower"} (or {"skipped": reason})
+Results = Dict[str, Dict[str, object]]
+
+
+def _metric(results: Results, name: str, value: float, unit: str, better: str) -> None:
+    results[name] = {"value": round(value, 4), "unit": unit, "better": better}
+
+
+def _best_of(repeat: int, fn: Callable[[], float]) -> float:
+    # Best-of-N damps scheduler noise; every run does identical work
+    return min(fn() for _ in range(repeat))
+
+
+def _make_memory(root: str, args: argparse.Namespace) -> MemoryManager:
+    return MemoryManager(
+        persist_path=os.path.join(root, "memories.jsonl"),
+        top_k=4,
+        backend=args.backend,
+        tokenizer="cjk",
+        storage=args.storage,
+    )
+
+
+def bench_memory(args: argparse.Namespace, results: Results) -> None:
+    texts = memory_corpus(args.memories, args.lang, args.seed)
+    queries = conversation_corpus(args.queries, args.lang, args.seed + 1)
+
+    def add_run() -> float:
+        with tempfile.TemporaryDirectory() as tmp:
+            memory = _make_memory(tmp, args)
+            t0 = time.perf_counter()
+            for text in texts:
+                memory.add_memory(text, meta={"type": "dialogue"})
+            elapsed = time.perf_counter() - t0
+            memory.close()
+            return elapsed
+
+    add_s = _best_of(args.repeat, add_run)
+    _metric(results, "memory.add_memory.ops_per_s", len(texts) / add_s, "ops/s", "higher")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = _make_memory(tmp, args)
+        memory.add_memories([(t, {"type": "dialogue"}) for t in texts])
+
+        def load_run() -> float:
+            t0 = time.perf_counter()
+            reopened = _make_memory(tmp, args)
+            elapsed = time.perf_counter() - t0
+            reopened.close()
+            return elapsed
+
+        _metric(results, "memory.load.s", _best_of(args.repeat, load_run), "s", "lower")
+
+        def search_run() -> float:
+            t0 = time.perf_counter()
+            for q in queries:
+                memory.search(q)
+            return time.perf_counter() - t0
+
+        search_s = _best_of(args.repeat, search_run)
+        memory.close()
+    _metric(results, "memory.search.ops_per_s", len(queries) / search_s, "ops/s", "higher")
+
+
+def bench_router(args: argparse.Namespace, results: Results) -> None:
+    router = ToolRouter()
+    texts = conversation_corpus(args.queries * 10, args.lang, args.seed + 2)
+
+    def run() -> float:
+        t0 = time.perf_counter()
+        for text in texts:
+            router.select(text)
+        return time.perf_counter() - t0
+
+    _metric(results, "router.select.ops_per_s", len(texts) / _best_of(args.repeat, run), "ops/s", "higher")
+
+
+def _turn_latencies(runner, turns: List[str]) -> List[float]:
+    state = AgentState()
+    latencies = []
+    for text in turns:
+        state.stt_text = text
+        t0 = time.perf_counter()
+        state = runner.run_turn(state)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def _best_turns(repeat: int, runner, turns: List[str]) -> List[float]:
+    # Each repeat replays the same conversation from an empty state; keep the fastest replay
+    return min((_turn_latencies(runner, turns) for _ in range(repeat)), key=statistics.median)
+
+
+def bench_turns(args: argparse.Namespace, results: Results) -> None:
+    turns = conversation_corpus(args.turns, args.lang, args.seed + 3)
+    seed_memories = memory_corpus(min(args.memories, 2000), args.lang, args.seed)
+    llm = LLMManager(provider="openai", model="gpt-4o-mini")
+    prompts = {"system": "你是一个助理。", "memory": ""}
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = _make_memory(tmp, args)
+        memory.add_memories([(t, {"type": "dialogue"}) for t in seed_memories])
+        graph = DialogueGraph(llm=llm, memory=memory, prompts=prompts)
+        seq = _best_turns(args.repeat, graph, turns)
+        _metric(results, "turn.dialogue_graph.p50_ms", statistics.median(seq) * 1000, "ms", "lower")
+        _metric(results, "turn.dialogue_graph.p99_ms", _quantile(seq, 0.99) * 1000, "ms", "lower")
+
+        from core.langgraph_builder import build_graph, langgraph_available
+
+        if not langgraph_available():
+            results["turn.langgraph.p50_ms"] = {"skipped": "langgraph not installed"}
+        else:
+            runner = build_graph(llm=llm, memory=memory, prompts=prompts)
+            lg = _best_turns(args.repeat, runner, turns)
+            _metric(results, "turn.langgraph.p50_ms", statistics.median(lg) * 1000, "ms", "lower")
+            _metric(results, "turn.langgraph.overhead_ratio", statistics.median(lg) / statistics.median(seq), "x", "lower")
+        memory.close()
+
+
+def bench_startup(args: argparse.Namespace, results: Results) -> None:
+    """Wall time of ``python main.py`` in CLI mode until it exits on the first prompt."""
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copytree(REPO_ROOT / "config", Path(tmp) / "config")
+        env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            subprocess.run(
+                [sys.executable, str(REPO_ROOT / "main.py")],
+                input=b"exit\n",
+                cwd=tmp,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                check=True,
+            )
+            times.append(time.perf_counter() - t0)
+    _metric(results, "startup.main.ms", min(times) * 1000, "ms", "lower")
+
+
+def _quantile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+BENCHES = {
+    "memory": bench_memory,
+    "router": bench_router,
+    "turn": bench_turns,
+    "startup": bench_startup,
+}
+
+
+def compare(results: Results, baseline: Results, threshold: float) -> List[Dict[str, object]]:
+    """Rows for metrics present in both runs; ``regressed`` when worse by more than ``threshold``."""
+    rows = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base or "value" not in cur or "value" not in base or not base["value"]:
+            continue
+        change = (cur["value"] - base["value"]) / base["value"]
+        worse = -change if cur["better"] == "higher" else change
+        rows.append({
+            "metric": name,
+            "baseline": base["value"],
+            "current": cur["value"],
+            "change": round(change, 4),
+            "regressed": worse > threshold,
+        })
+    return rows
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    results: Results = {}
+    for name in args.only or list(BENCHES):
+        BENCHES[name](args, results)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": round(time.time(), 3),
+            "memories": args.memories,
+            "queries": args.queries,
+            "turns": args.turns,
+            "lang": args.lang,
+            "seed": args.seed,
+            "backend": args.backend,
+            "storage": args.storage,
+        },
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--memories", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--lang", choices=["zh", "en", "mixed"], default="mixed")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", default="auto")
+    parser.add_argument("--storage", default="jsonl")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHES))
+    parser.add_argument("--out", help="also write the JSON report here")
+    parser.add_argument("--save-baseline", help="write the results as a baseline file")
+    parser.add_argument("--baseline", help="compare against this baseline file")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report["results"], baseline.get("results", {}), args.threshold)
+        report["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "rows": rows}
+        regressed = [r["metric"] for r in rows if r["regressed"]]
+        report["comparison"]["regressions"] = regressed
+        status = 1 if regressed else 0
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
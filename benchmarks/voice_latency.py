@@ -0,0 +1,111 @@
+"""Measure end-of-speech to first audio for the streamed voice pipeline.
+
+Replays a WAV utterance at capture speed through the VAD, incremental STT,
+the dialogue graph and sentence-level TTS, using the WAV-backed stub
+engines in voice/stubs.py, then runs the same turn the sequential way
+(fixed-length recording, one transcription, full reply, one synthesis).
+Both latencies are measured from the moment speech actually stops.
+
+Usage:
+    python -m benchmarks.voice_latency                       # synthetic utterance
+    python -m benchmarks.voice_latency --wav in.wav --transcript "今天有点累。" --out reply.wav
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Dict
+
+from main import load_config
+from ui.runtime import build_runtime, new_state
+from voice.audio import FRAME_MS, AudioFrame, paced, wav_frames
+from voice.pipeline import make_voice_pipeline
+from voice.stubs import ScriptedSTT, ToneTTS, WavPlayer, synth_utterance
+
+
+async def streamed(config: Dict, args: argparse.Namespace, stt: ScriptedSTT, tts: ToneTTS, speech_end: float) -> Dict:
+    graph = build_runtime(config)
+    player = WavPlayer(args.out)
+    pipeline = make_voice_pipeline(config, graph, stt, tts, player)
+    frames = wav_frames(args.wav, FRAME_MS, pipeline.sample_rate)
+    t0 = time.perf_counter()
+    metrics = await pipeline.run_turn(paced(frames, FRAME_MS), new_state(config))
+    player.close()
+    graph.close()
+    # Time from speech actually stopping to the VAD closing the utterance
+    vad_ms = (metrics["end_of_speech_at"] - t0 - speech_end) * 1000
+    metrics["vad_end_ms"] = round(vad_ms, 1)
+    for key in ("transcript_ms", "first_token_ms", "first_sentence_ms", "first_audio_ms", "done_ms"):
+        if metrics[key] is not None:
+            metrics[key] = round(metrics[key] + vad_ms, 1)
+    metrics.pop("end_of_speech_at")
+    return metrics
+
+
+async def sequential(config: Dict, args: argparse.Namespace, stt: ScriptedSTT, tts: ToneTTS, speech_end: float) -> Dict:
+    graph = build_runtime(config)
+    player = WavPlayer()
+    loop = asyncio.get_running_loop()
+    rate = int((config.get("voice") or {}).get("sample_rate", 16000))
+    frames = wav_frames(args.wav, FRAME_MS, rate)
+    t0 = time.perf_counter()
+    buf, n = bytearray(int(args.record_seconds * rate) * 2), 0
+    async for frame in paced(frames, FRAME_MS):
+        take = min(len(frame), len(buf) - n)
+        buf[n:n + take] = frame.data[:take]
+        n += take
+        if n >= len(buf):
+            break
+    marks = {"recorded": time.perf_counter()}
+    state = new_state(config)
+    state.stt_text = await loop.run_in_executor(None, stt.transcribe_frame, AudioFrame(memoryview(buf)[:n], rate)) or ""
+    marks["transcript"] = time.perf_counter()
+    state = await graph.arun_turn(state)
+    marks["reply"] = time.perf_counter()
+    audio = await loop.run_in_executor(None, tts.synthesize_frame, state.response_text)
+    marks["first_audio"] = time.perf_counter()
+    await loop.run_in_executor(None, player.play_frame, audio)
+    marks["done"] = time.perf_counter()
+    graph.close()
+    end = t0 + speech_end
+    return {key + "_ms": round((t - end) * 1000, 1) for key, t in marks.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default="config/settings.yaml")
+    parser.add_argument("--wav", help="16-bit mono utterance (default: a synthetic one)")
+    parser.add_argument("--transcript", default="今天有点累。想听你讲个轻松的故事。最好短一点，我一会儿还要出门。")
+    parser.add_argument("--speech-ms", type=int, default=2400, help="speech length of the synthetic utterance")
+    parser.add_argument("--lead-ms", type=int, default=400, help="silence before speech in the synthetic utterance")
+    parser.add_argument("--record-seconds", type=float, default=5.0, help="fixed recording length of the sequential baseline")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="placeholder LLM seconds per token")
+    parser.add_argument("--out", help="write the streamed reply audio here")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    config.setdefault("llm", {})["stream_token_delay"] = args.token_delay
+    if args.wav:
+        speech_ms = AudioFrame.from_wav(args.wav).duration_ms
+        speech_end = speech_ms / 1000.0  # without a speech mark, assume it runs to the end of the file
+    else:
+        fd, args.wav = tempfile.mkstemp(prefix="utterance_", suffix=".wav")
+        os.close(fd)
+        synth_utterance(args.wav, speech_ms=args.speech_ms, lead_ms=args.lead_ms, tail_ms=int(args.record_seconds * 1000))
+        speech_ms = args.speech_ms
+        speech_end = (args.lead_ms + args.speech_ms) / 1000.0
+
+    report = {}
+    for name, run in (("streamed", streamed), ("sequential", sequential)):
+        stt, tts = ScriptedSTT(args.transcript, speech_ms), ToneTTS()
+        report[name] = asyncio.run(run(config, args, stt, tts, speech_end))
+        report[name].update(stt_calls=stt.calls, tts_calls=tts.calls)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
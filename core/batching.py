@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+from .embedding import Embedder
+from .instrumentation import Histogram
+from .llm_manager import LLMManager
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_STOP = object()
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collects concurrent single-item calls into one batched call.
+
+    A background thread takes the first queued item, then waits up to
+    ``max_wait_ms`` (from that item's arrival) for more, and calls
+    ``fn(items) -> results`` once ``max_batch`` items are in or the wait
+    runs out. Each caller's future gets its own result, or the exception
+    the batch raised. ``stats`` reports the batch fill ratio and the
+    queueing latency batching added.
+    """
+
+    def __init__(self, fn: Callable[[List[T]], Sequence[R]], max_batch: int = 32, max_wait_ms: float = 5.0, name: str = "batch") -> None:
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+        self.errors = 0
+        self.wait_hist = Histogram()  # microseconds from submit to batch dispatch
+
+    def submit(self, item: T) -> "Future[R]":
+        future: "Future[R]" = Future()
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"batch-{self.name}", daemon=True)
+                    self._thread.start()
+        self._queue.put((time.perf_counter(), item, future))
+        return future
+
+    def __call__(self, item: T) -> R:
+        return self.submit(item).result()
+
+    def map(self, items: Sequence[T]) -> List[R]:
+        futures = [self.submit(item) for item in items]
+        return [f.result() for f in futures]
+
+    def _collect(self, first: Tuple[float, T, Future]) -> Tuple[List[Tuple[float, T, Future]], bool]:
+        batch = [first]
+        deadline = first[0] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            dispatched = time.perf_counter()
+            try:
+                results = self.fn([item for _, item, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"{self.name}: batch of {len(batch)} returned {len(results)} results")
+            except Exception as exc:
+                with self._lock:
+                    self.errors += 1
+                for _, _, future in batch:
+                    future.set_exception(exc)
+            else:
+                for (_, _, future), result in zip(batch, results):
+                    future.set_result(result)
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.full_batches += len(batch) == self.max_batch
+                for t0, _, _ in batch:
+                    self.wait_hist.record(int((dispatched - t0) * 1e6))
+            if stop:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            batches = self.batches
+            return {
+                "batches": batches,
+                "items": self.items,
+                "errors": self.errors,
+                "max_batch": self.max_batch,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "mean_batch": round(self.items / batches, 3) if batches else 0.0,
+                # Share of batch capacity used; low means the wait rarely finds company
+                "fill_ratio": round(self.items / (batches * self.max_batch), 4) if batches else 0.0,
+                "full_batches": self.full_batches,
+                "queue_wait_ms": {
+                    "mean": round(self.wait_hist.mean() / 1000, 3),
+                    "p50": round(self.wait_hist.percentile(0.5) / 1000, 3),
+                    "p99": round(self.wait_hist.percentile(0.99) / 1000, 3),
+                    "max": round(self.wait_hist.max / 1000, 3),
+                },
+            }
+
+    def prometheus(self) -> str:
+        s = self.stats()
+        name = self.name
+        lines = [
+            f'her_batch_calls_total{{batcher="{name}"}} {s["batches"]}',
+            f'her_batch_items_total{{batcher="{name}"}} {s["items"]}',
+            f'her_batch_fill_ratio{{batcher="{name}"}} {s["fill_ratio"]}',
+        ]
+        for key, q in (("p50", "0.5"), ("p99", "0.99")):
+            lines.append(f'her_batch_queue_wait_seconds{{batcher="{name}",quantile="{q}"}} {s["queue_wait_ms"][key] / 1000:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._thread = None
+
+
+class BatchingEmbedder(Embedder):
+    """Embedder whose small calls are micro-batched across threads.
+
+    Query embeddings on the retrieval path and the embeddings of memory
+    writes arrive one or a few texts at a time from concurrent sessions;
+    they are merged into one ``embed_batch`` call on the wrapped embedder.
+    Calls of ``max_batch`` texts or more (e.g. a resync) go straight through.
+    """
+
+    def __init__(self, inner: Embedder, max_batch: int = 32, max_wait_ms: float = 5.0) -> None:
+        self.inner = inner
+        self.name = inner.name
+        self.dim = inner.dim
+        self.batcher: MicroBatcher[str, Any] = MicroBatcher(self._embed_rows, max_batch, max_wait_ms, name="embed")
+
+    def _embed_rows(self, texts: List[str]):
+        return list(self.inner.embed_batch(texts))
+
+    def embed_batch(self, texts: List[str]):
+        if len(texts) >= self.batcher.max_batch:
+            return self.inner.embed_batch(texts)
+        return np.stack(self.batcher.map(texts)) if texts else self.inner.embed_batch(texts)
+
+    def embed(self, text: str):
+        return self.batcher(text)
+
+    def close(self) -> None:
+        self.batcher.close()
+
+
+def _settings(config: Dict) -> Optional[Dict]:
+    conf = config.get("batching") or {}
+    return conf if conf.get("enabled", False) else None
+
+
+def make_batching_embedder(config: Dict, embedder: Optional[Embedder]) -> Optional[Embedder]:
+    """``embedder`` wrapped in a BatchingEmbedder when ``batching`` is enabled."""
+    conf = _settings(config)
+    if conf is None or embedder is None:
+        return embedder
+    return BatchingEmbedder(embedder, int(conf.get("max_batch", 32)), float(conf.get("max_wait_ms", 5.0)))
+
+
+def make_summarizer(config: Dict, llm: LLMManager, memory_prompt: str) -> Optional[MicroBatcher[str, List[str]]]:
+    """Micro-batched ``LLMManager.summarize_batch`` for the memory path, or None when disabled."""
+    conf = _settings(config)
+    if conf is None:
+        return None
+    return MicroBatcher(
+        lambda texts: llm.summarize_batch(texts, memory_prompt),
+        int(conf.get("max_batch", 32)),
+        float(conf.get("max_wait_ms", 5.0)),
+        name="summarize",
+    )
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+_SPACE_RE = re.compile(r"\s+")
+# Trailing/leading punctuation that does not change what is being asked
+_EDGE_PUNCT = "。．.！!？?，,、；;：:~～…\"'“”‘’「」（）() "
+
+DEFAULT_TTLS = {"llm": 3600.0, "web_search": 300.0, "summarize": 86400.0, "emotion_detect": 3600.0}
+
+
+def normalize_key(text: str) -> str:
+    """NFKC, casefold, collapsed whitespace, edge punctuation stripped."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return _SPACE_RE.sub(" ", text).strip(_EDGE_PUNCT)
+
+
+def messages_key(messages: List[Dict[str, str]], normalize: bool = False) -> str:
+    """Stable digest of a chat prompt; with ``normalize`` each content is normalized first."""
+    parts = [(m.get("role", ""), normalize_key(m.get("content", "")) if normalize else m.get("content", "")) for m in messages]
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class DiskTier:
+    """SQLite-backed second tier: survives restarts, expired rows are skipped and pruned."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache (ns TEXT, key TEXT, expires REAL, value TEXT, PRIMARY KEY (ns, key))")
+        self._db.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        self._db.commit()
+
+    def get(self, ns: str, key: str) -> Optional[Tuple[float, Any]]:
+        row = self._db.execute("SELECT expires, value FROM cache WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, ns: str, key: str, expires: float, value: Any) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO cache (ns, key, expires, value) VALUES (?, ?, ?, ?)",
+            (ns, key, expires, json.dumps(value, ensure_ascii=False)),
+        )
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class ResponseCache:
+    """LRU + TTL cache for LLM replies and tool results.
+
+    Entries live in namespaces ("llm", "web_search", ...) with their own TTL;
+    a TTL of 0 disables caching for that namespace. Each value is stored under
+    its exact key and its normalized key, so lookups try the exact text first
+    and then the normalized form. The in-memory tier is bounded by
+    ``max_entries`` (keys, across namespaces); the optional disk tier is
+    consulted on a memory miss and promotes hits back into memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttls: Optional[Dict[str, float]] = None,
+        disk_path: Optional[str] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self._lru: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = DiskTier(Path(disk_path)) if disk_path else None
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _bump(self, ns: str, field: str) -> None:
+        counts = self._stats.setdefault(ns, {"hits": 0, "normalized_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0})
+        counts[field] += 1
+
+    def get(self, ns: str, key: str, normalized: Optional[str] = None) -> Optional[Any]:
+        if self.ttls.get(ns, 0) <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            for k, field in ((key, "hits"), (normalized, "normalized_hits")):
+                if k is None:
+                    continue
+                entry = self._lru.get((ns, k))
+                if entry is None:
+                    continue
+                if entry[0] < now:
+                    del self._lru[(ns, k)]
+                    self._bump(ns, "expired")
+                    continue
+                self._lru.move_to_end((ns, k))
+                self._bump(ns, field)
+                return entry[1]
+            if self._disk is not None:
+                for k in (key, normalized):
+                    found = self._disk.get(ns, k) if k is not None else None
+                    if found is not None:
+                        self._insert(ns, k, found[0], found[1])
+                        self._bump(ns, "disk_hits")
+                        return found[1]
+            self._bump(ns, "misses")
+        return None
+
+    def put(self, ns: str, key: str, value: Any, normalized: Optional[str] = None) -> None:
+        ttl = self.ttls.get(ns, 0)
+        if ttl <= 0:
+            return
+        expires = time.time() + ttl
+        with self._lock:
+            for k in {key, normalized} - {None}:
+                self._insert(ns, k, expires, value)
+                if self._disk is not None:
+                    self._disk.put(ns, k, expires, value)
+
+    def _insert(self, ns: str, key: str, expires: float, value: Any) -> None:
+        self._lru[(ns, key)] = (expires, value)
+        self._lru.move_to_end((ns, key))
+        while len(self._lru) > self.max_entries:
+            (old_ns, _), _ = self._lru.popitem(last=False)
+            self._bump(old_ns, "evictions")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_ns = {ns: dict(counts) for ns, counts in self._stats.items()}
+            size = len(self._lru)
+        for counts in per_ns.values():
+            lookups = counts["hits"] + counts["normalized_hits"] + counts["disk_hits"] + counts["misses"]
+            counts["hit_rate"] = round((lookups - counts["misses"]) / lookups, 4) if lookups else 0.0
+        return {"entries": size, "max_entries": self.max_entries, "namespaces": per_ns}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+
+def make_cache(config: Dict) -> Optional[ResponseCache]:
+    """ResponseCache from the ``cache`` config section, or None when disabled."""
+    conf = config.get("cache") or {}
+    if not conf.get("enabled", False):
+        return None
+    disk_path = None
+    if conf.get("disk", False):
+        data_dir = ((config.get("rag") or {}).get("persist_dir")) or "data/vector_store"
+        disk_path = str(Path(data_dir) / "cache.sqlite3")
+    return ResponseCache(
+        max_entries=int(conf.get("max_entries", 1024)),
+        ttls={k: float(v) for k, v in (conf.get("ttl") or {}).items()},
+        disk_path=disk_path,
+    )
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover
+    faiss = None  # type: ignore
+
+from .embedding import Embedder
+
+Hits = List[Tuple[int, float]]
+
+
+class VectorMatrix:
+    """Float32 (n, dim) matrix in a memory-mapped .npy file, grown by doubling.
+
+    The row count lives in a sidecar json because the .npy shape is the capacity.
+    """
+
+    def __init__(self, path: str | Path, dim: int, capacity: int = 1024) -> None:
+        if np is None:
+            raise ImportError("VectorMatrix requires numpy")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.meta_path = self.path.with_suffix(".json")
+        self.dim = dim
+        if self.path.exists():
+            self._mm = np.load(self.path, mmap_mode="r+")
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8")) if self.meta_path.exists() else {}
+            self.count = int(meta.get("count", 0))
+            if self._mm.shape[1] != dim:
+                raise ValueError(f"{self.path} has dim {self._mm.shape[1]}, expected {dim}")
+        else:
+            self._mm = np.lib.format.open_memmap(self.path, mode="w+", dtype=np.float32, shape=(capacity, dim))
+            self.count = 0
+            self._write_meta()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _write_meta(self) -> None:
+        tmp = self.meta_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"count": self.count, "dim": self.dim}), encoding="utf-8")
+        os.replace(tmp, self.meta_path)
+
+    def _grow(self, need: int) -> None:
+        cap = self._mm.shape[0]
+        while cap < need:
+            cap *= 2
+        tmp = self.path.with_suffix(".grow.npy")
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(cap, self.dim))
+        grown[: self.count] = self._mm[: self.count]
+        grown.flush()
+        del grown
+        del self._mm
+        os.replace(tmp, self.path)
+        self._mm = np.load(self.path, mmap_mode="r+")
+
+    def append(self, rows) -> int:
+        """Append rows; returns the id of the first one."""
+        first = self.count
+        need = first + len(rows)
+        if need > self._mm.shape[0]:
+            self._grow(need)
+        self._mm[first:need] = rows
+        self.count = need
+        self._mm.flush()
+        self._write_meta()
+        return first
+
+    def truncate(self, count: int) -> None:
+        """Drop rows past ``count`` (e.g. vectors written before a crash lost their record)."""
+        self.count = min(self.count, count)
+        self._write_meta()
+
+    def view(self):
+        return self._mm[: self.count]
+
+
+def brute_force(matrix, query, k: int, ids=None) -> Hits:
+    """Exact inner-product top-k over ``matrix`` rows (optionally a subset ``ids``)."""
+    rows = matrix if ids is None else matrix[ids]
+    if len(rows) == 0 or k <= 0:
+        return []
+    scores = rows @ query
+    kk = min(k, len(scores))
+    top = np.argpartition(-scores, kk - 1)[:kk]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    if ids is not None:
+        return [(int(ids[i]), float(scores[i])) for i in top]
+    return [(int(i), float(scores[i])) for i in top]
+
+
+class IVFIndex:
+    """Inverted-file ANN index (spherical k-means coarse quantizer).
+
+    Below ``train_min`` vectors it searches exactly. Inserts are assigned to the
+    nearest centroid; centroids are retrained whenever the corpus has grown
+    ``retrain_factor`` times since the last training, so insert cost stays
+    amortized O(nlist * dim).
+    """
+
+    name = "ivf"
+
+    def __init__(self, matrix: VectorMatrix, nprobe: int = 8, train_min: int = 2048, retrain_factor: float = 4.0) -> None:
+        self.matrix = matrix
+        self.nprobe = nprobe
+        self.train_min = train_min
+        self.retrain_factor = retrain_factor
+        self.centroids = None
+        self.lists: List[List[int]] = []
+        self.trained_size = 0
+
+    def _assign(self, vecs):
+        return np.argmax(vecs @ self.centroids.T, axis=1)
+
+    def train(self, iters: int = 10, seed: int = 0) -> None:
+        data = self.matrix.view()
+        n = len(data)
+        nlist = max(1, int(math.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = data[rng.choice(n, size=min(n, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        self.centroids = centroids.astype(np.float32)
+        self.lists = [[] for _ in range(nlist)]
+        for lo in range(0, n, 65536):
+            for offset, c in enumerate(self._assign(data[lo:lo + 65536])):
+                self.lists[c].append(lo + offset)
+        self.trained_size = n
+
+    def add(self, first_id: int, vecs) -> None:
+        if self.centroids is not None:
+            for offset, c in enumerate(self._assign(vecs)):
+                self.lists[c].append(first_id + offset)
+        n = len(self.matrix)
+        if n >= self.train_min and n >= self.trained_size * self.retrain_factor:
+            self.train()
+
+    def search(self, query, k: int) -> Hits:
+        data = self.matrix.view()
+        if self.centroids is None:
+            return brute_force(data, query, k)
+        probes = np.argsort(-(self.centroids @ query))[: self.nprobe]
+        cand = [i for c in probes for i in self.lists[c]]
+        if not cand:
+            return []
+        return brute_force(data, query, k, ids=np.asarray(cand, dtype=np.int64))
+
+
+class FaissHNSWIndex:
+    """HNSW graph from faiss (inner product); supports incremental inserts natively."""
+
+    name = "hnsw"
+
+    def __init__(self, matrix: VectorMatrix, m: int = 32, ef_search: int = 64) -> None:
+        self.matrix = matrix
+        self.index = faiss.IndexHNSWFlat(matrix.dim, m, faiss.METRIC_INNER_PRODUCT)
+        self.index.hnsw.efSearch = ef_search
+
+    def add(self, first_id: int, vecs) -> None:
+        self.index.add(np.ascontiguousarray(vecs, dtype=np.float32))
+
+    def search(self, query, k: int) -> Hits:
+        if self.index.ntotal == 0:
+            return []
+        scores, ids = self.index.search(query.reshape(1, -1).astype(np.float32), k)
+        return [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i >= 0]
+
+
+def make_ann_index(vector_store: str, matrix: VectorMatrix, nprobe: int = 8):
+    """ANN index for ``rag.vector_store``.
+
+    ``faiss`` uses an HNSW graph when faiss is installed. chroma and pgvector
+    are external services; until a client is configured they run on the
+    built-in IVF index over the same memory-mapped matrix.
+    """
+    if (vector_store or "").lower() == "faiss" and faiss is not None:
+        return FaissHNSWIndex(matrix)
+    return IVFIndex(matrix, nprobe=nprobe)
+
+
+class DenseRetriever:
+    """Embedding tier for MemoryManager: embedder + mmap'd matrix + ANN index."""
+
+    def __init__(self, root: str | Path, embedder: Embedder, vector_store: str = "faiss", nprobe: int = 8) -> None:
+        self.root = Path(root)
+        self.embedder = embedder
+        self.matrix = VectorMatrix(self.root / "vectors.npy", embedder.dim)
+        self.vector_store = vector_store
+        self.nprobe = nprobe
+        self._build_index()
+
+    def _build_index(self) -> None:
+        self.index = make_ann_index(self.vector_store, self.matrix, nprobe=self.nprobe)
+        if len(self.matrix):
+            self.index.add(0, self.matrix.view())
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def reset(self) -> None:
+        """Drop every row, e.g. before re-embedding a rewritten store."""
+        self.matrix.truncate(0)
+        self._build_index()
+
+    def sync(self, total: int, texts: Iterable[Tuple[int, str]], batch: int = 256) -> None:
+        """Make the matrix hold exactly ``total`` rows, embedding store records it is missing."""
+        if len(self.matrix) > total:
+            self.matrix.truncate(total)
+            self._build_index()
+        if len(self.matrix) == total:
+            return
+        pending: List[str] = []
+        for doc_id, text in texts:
+            if doc_id < len(self.matrix):
+                continue
+            pending.append(text)
+            if len(pending) >= batch:
+                self.add_texts(pending)
+                pending = []
+        if pending:
+            self.add_texts(pending)
+
+    def add_texts(self, texts: Sequence[str]) -> int:
+        return self.add_vectors(self.embedder.embed_batch(list(texts)))
+
+    def add_vectors(self, vecs) -> int:
+        """Append rows embedded beforehand (e.g. outside the caller's lock)."""
+        first = self.matrix.append(vecs)
+        self.index.add(first, vecs)
+        return first
+
+    def embed(self, text: str):
+        return self.embedder.embed(text)
+
+    def search(self, query, k: int) -> Hits:
+        """``query`` is text or an already embedded vector."""
+        qvec = self.embed(query) if isinstance(query, str) else query
+        return self.index.search(qvec, k)
+
+    def exact_search(self, query, k: int) -> Hits:
+        qvec = self.embed(query) if isinstance(query, str) else query
+        return brute_force(self.matrix.view(), qvec, k)
+
+    def score(self, qvec, doc_ids: Sequence[int]) -> List[float]:
+        if not doc_ids:
+            return []
+        return [float(s) for s in self.matrix.view()[np.asarray(doc_ids, dtype=np.int64)] @ qvec]
+
+
+def make_dense_retriever(root: str | Path, embedder: Optional[Embedder], vector_store: str = "faiss", nprobe: int = 8):
+    """Returns None when numpy is missing so callers fall back to lexical retrieval."""
+    if np is None or embedder is None:
+        return None
+    return DenseRetriever(root, embedder, vector_store=vector_store, nprobe=nprobe)
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import zlib
+from typing import List, Optional
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+from .tokenizer import Tokenizer, get_tokenizer
+
+
+class Embedder:
+    """Maps texts to L2-normalized float32 vectors of size ``dim``."""
+
+    name = "base"
+    dim = 0
+
+    def embed_batch(self, texts: List[str]):
+        raise NotImplementedError
+
+    def embed(self, text: str):
+        return self.embed_batch([text])[0]
+
+    def close(self) -> None:
+        pass
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic local embedder: signed feature hashing of tokens.
+
+    Needs no model download or API key, so retrieval and benchmarks run
+    offline; quality is roughly that of a hashed bag-of-words.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 256, tokenizer: Optional[Tokenizer] = None) -> None:
+        if np is None:
+            raise ImportError("HashingEmbedder requires numpy")
+        self.dim = dim
+        self.tokenizer = tokenizer or get_tokenizer("cjk")
+
+    def embed_batch(self, texts: List[str]):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for tok in self.tokenizer.tokenize(text):
+                h = zlib.crc32(tok.encode("utf-8"))
+                out[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+
+def embedding_available() -> bool:
+    return np is not None
+
+
+def get_embedder(model: str = "hashing", dim: int = 256, tokenizer: Optional[Tokenizer] = None) -> Embedder:
+    """Create the embedder for ``rag.embedding_model``.
+
+    Hosted models (e.g. text-embedding-3-small) need the provider transport,
+    which this placeholder build does not ship; they use the hashing embedder
+    with the configured dimension, mirroring ``LLMManager``'s local fallback.
+    """
+    return HashingEmbedder(dim=dim, tokenizer=tokenizer)
@@ -1,27 +1,93 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List
+import asyncio
+import importlib
+import threading
+import time
+from typing import AsyncIterator, Dict, Any, Iterator, List, Optional
 
-from .state import AgentState
+from .state import AgentState, estimate_tokens
 from .llm_manager import LLMManager
 from .memory_manager import MemoryManager
-from .reasoning import ToolRouter, run_tool
-from .tools.web_search import WebSearchTool
-from .tools.summarize import SummarizeTool
-from .tools.emotion_detect import EmotionDetectTool
+from .memory_writer import MemoryWriter
+from .reasoning import ToolRouter
+from .instrumentation import Instrumentation, count_tokens
+from .cache import ResponseCache, messages_key
+from .keyword_matcher import KeywordRules
+from .planner import Planner
+from .batching import MicroBatcher
+from .memory_policy import MemoryPolicy
+from .checkpoint import SessionCheckpointer
+
+
+# name -> (module, class); a tool's module is imported on its first call
+TOOLS = {
+    "web_search": (".tools.web_search", "WebSearchTool"),
+    "summarize": (".tools.summarize", "SummarizeTool"),
+    "emotion_detect": (".tools.emotion_detect", "EmotionDetectTool"),
+}
+
+
+class LazyTools(dict):
+    """Tool name -> instance, importing and constructing each tool on first lookup."""
+
+    def __init__(self, keyword_rules: Optional[KeywordRules] = None) -> None:
+        super().__init__()
+        self.keyword_rules = keyword_rules
+        self._lock = threading.Lock()
+
+    def __missing__(self, name: str) -> Any:
+        if name not in TOOLS:
+            raise KeyError(name)
+        with self._lock:  # steps may look up the same tool from parallel threads
+            if not dict.__contains__(self, name):
+                module, cls = TOOLS[name]
+                tool_cls = getattr(importlib.import_module(module, __package__), cls)
+                self[name] = tool_cls(self.keyword_rules) if name == "emotion_detect" else tool_cls()
+            return dict.__getitem__(self, name)
+
+    def load_all(self) -> None:
+        for name in TOOLS:
+            self[name]
 
 
 class DialogueGraph:
-    def __init__(self, llm: LLMManager, memory: MemoryManager, prompts: Dict[str, str]) -> None:
+    def __init__(
+        self,
+        llm: LLMManager,
+        memory: MemoryManager,
+        prompts: Dict[str, str],
+        memory_writer: Optional[MemoryWriter] = None,
+        cache: Optional[ResponseCache] = None,
+        keyword_rules: Optional[KeywordRules] = None,
+        router: Optional[Any] = None,
+        planner: Optional[Planner] = None,
+        summarizer: Optional[MicroBatcher] = None,
+        memory_policy: Optional[MemoryPolicy] = None,
+        checkpointer: Optional[SessionCheckpointer] = None,
+    ) -> None:
         self.llm = llm
         self.memory = memory
         self.prompts = prompts
-        self.router = ToolRouter()
-        self.tools = {
-            "web_search": WebSearchTool(),
-            "summarize": SummarizeTool(),
-            "emotion_detect": EmotionDetectTool(),
-        }
+        # When set, long-term memory writes are queued instead of blocking the turn
+        self.memory_writer = memory_writer
+        # Optional reply/tool-result cache; None always calls through
+        self.cache = cache
+        # Bullet points kept in the rolling summary of evicted short-term messages
+        self.summary_points = 10
+        # Micro-batches summarize_for_memory across concurrent sessions; None calls the LLM directly
+        self.summarizer = summarizer
+        # Extracts/dedups facts before they reach long-term memory; None keeps the length/keyword rule
+        self.memory_policy = memory_policy
+        # Saves states carrying extra["session_id"] after every turn; None keeps sessions in RAM only
+        self.checkpointer = checkpointer
+        # Set by Instrumentation.instrument(); None keeps the turn path untimed
+        self.instrumentation: Optional[Instrumentation] = None
+        # Anything with route(text) -> (label, steps); see core.tool_classifier
+        self.router = router if router is not None else ToolRouter(keyword_rules)
+        self.tools = LazyTools(keyword_rules)
+        # Expands the routed tool into steps of (possibly parallel) calls within reasoning.max_steps
+        self.planner = planner if planner is not None else Planner(ToolRouter(keyword_rules))
 
     # [1] SpeechInput -> [2] STT(Whisper)
     def node_stt(self, state: AgentState) -> AgentState:
@@ -33,71 +99,125 @@ class DialogueGraph:
     # [3] ShortTermMemoryUpdate
     def node_short_term_memory(self, state: AgentState) -> AgentState:
         if state.stt_text:
+            # Dropped by the window if the caller already added the same user message
             state.add_user_message(state.stt_text, source="stt")
+            state.stt_text = None
+        self._fold_evicted(state)
         return state
 
+    def _fold_evicted(self, state: AgentState) -> None:
+        """Fold messages that fell out of the window into the running summary."""
+        evicted = state.messages.take_evicted()
+        if not evicted:
+            return
+        # summarize_for_memory splits on "。", so keep one message per sentence
+        text = "。".join(f"{m.role}: {m.content.replace('。', '，')}" for m in evicted)
+        if self.summarizer is not None:
+            points = self.summarizer(text)
+        else:
+            points = self.llm.summarize_for_memory(text, self.prompts.get("memory", ""))
+        prior = [p for p in state.messages.summary.split("\n") if p]
+        state.messages.summary = "\n".join((prior + points)[-self.summary_points:])
+
     # [4] ContextRetrieval(RAG)
     def node_rag(self, state: AgentState) -> AgentState:
         q = state.last_user_text() or ""
-        state.retrieved_context = self.memory.search(q) if q else []
+        state.retrieved_context = self.memory.search(q, user=state.extra.get("user_id")) if q else []
         return state
 
     # [5a] ToolSelection - Select the tool to use
     def node_tool_selection(self, state: AgentState) -> AgentState:
         user_text = state.last_user_text() or ""
-        decision = self.router.select(user_text)
+        decision, steps = self.router.route(user_text)
         state.extra["decision"] = decision
+        # Reasoning steps spent so far this turn (an LLM routing call costs one)
+        state.extra["steps"] = steps
+        state.extra["plan"] = self.planner.plan(user_text, decision) if self.planner.budget(steps) > 0 else []
+        state.extra["step_index"] = 0
+        state.extra["tool_results"] = []
+        state.extra.pop("tool_output", None)
         return state
 
-    # [5b] Direct LLM response (no tools needed)
-    def node_llm_direct(self, state: AgentState) -> AgentState:
+    def _direct_messages(self, state: AgentState) -> List[Dict[str, str]]:
         system_prompt = self.prompts.get("system", "你是一个助理。")
-        messages = [
-            {"role": "system", "content": system_prompt},
-        ] + [{"role": m.role, "content": m.content} for m in state.messages[-10:]]
+        messages = [{"role": "system", "content": system_prompt}]
+        if state.messages.summary:
+            messages.append({"role": "system", "content": "此前对话摘要：\n" + state.messages.summary})
+        messages += [{"role": m.role, "content": m.content} for m in state.messages.recent(10)]
         if state.retrieved_context:
             messages.append({"role": "system", "content": "相关上下文：\n" + "\n".join(state.retrieved_context)})
-        reply = self.llm.chat(system_prompt, messages)
+        return messages
+
+    def _cached_reply(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        if self.cache is None:
+            return None
+        # The whole prompt is the key: the same question in another context is a different reply
+        return self.cache.get("llm", messages_key(messages), messages_key(messages, normalize=True))
+
+    def _cache_reply(self, messages: List[Dict[str, str]], reply: str) -> None:
+        if self.cache is not None:
+            self.cache.put("llm", messages_key(messages), reply, messages_key(messages, normalize=True))
+
+    def _chat(self, messages: List[Dict[str, str]]) -> str:
+        reply = self._cached_reply(messages)
+        if reply is None:
+            reply = self.llm.chat(self.prompts.get("system", "你是一个助理。"), messages)
+            self._cache_reply(messages, reply)
+        return reply
+
+    # [5b] Direct LLM response (no tools needed)
+    def node_llm_direct(self, state: AgentState) -> AgentState:
+        reply = self._chat(self._direct_messages(state))
         state.response_text = reply
         state.add_assistant_message(reply, mode="llm")
         return state
 
-    # [5c] WebSearch tool node
-    def node_web_search(self, state: AgentState) -> AgentState:
+    # [5c] Tool step: runs the next planned step; its calls run concurrently
+    def node_tool_step(self, state: AgentState) -> AgentState:
+        plan = state.extra.get("plan") or []
+        index = state.extra.get("step_index", 0)
+        if index >= len(plan):
+            return state
         user_text = state.last_user_text() or ""
-        tool_output, meta = run_tool("web_search", self.tools, user_text, state.retrieved_context)
-        state.tool_calls.append(meta)
-        state.extra["tool_output"] = tool_output
+        results = list(state.extra.get("tool_results") or [])
+        # Later steps see earlier tool outputs as context (e.g. summarize the search results)
+        context = state.retrieved_context + [out for _, out in results]
+        outputs, traces = self.planner.executor.run_step(index + 1, plan[index], self.tools, user_text, context, self.cache)
+        state.tool_calls.extend(traces)
+        results += outputs
+        state.extra["tool_results"] = results
+        state.extra["tool_output"] = "\n\n".join(out for _, out in results)
+        state.extra["step_index"] = index + 1
+        state.extra["steps"] = state.extra.get("steps", 0) + 1
         return state
 
-    # [5d] Summarize tool node
-    def node_summarize(self, state: AgentState) -> AgentState:
-        user_text = state.last_user_text() or ""
-        tool_output, meta = run_tool("summarize", self.tools, user_text, state.retrieved_context)
-        state.tool_calls.append(meta)
-        state.extra["tool_output"] = tool_output
-        return state
+    def has_next_step(self, state: AgentState) -> bool:
+        plan = state.extra.get("plan") or []
+        return state.extra.get("step_index", 0) < len(plan) and self.planner.budget(state.extra.get("steps", 0)) > 0
 
-    # [5e] EmotionDetect tool node
-    def node_emotion_detect(self, state: AgentState) -> AgentState:
-        user_text = state.last_user_text() or ""
-        tool_output, meta = run_tool("emotion_detect", self.tools, user_text, state.retrieved_context)
-        state.tool_calls.append(meta)
-        state.extra["tool_output"] = tool_output
-        return state
+    def _uses_tools(self, state: AgentState) -> bool:
+        return bool(state.extra.get("plan"))
 
-    # [5f] Merge tool results and generate LLM response
-    def node_merge_tool_result(self, state: AgentState) -> AgentState:
+    def _merge_messages(self, state: AgentState) -> List[Dict[str, str]]:
         user_text = state.last_user_text() or ""
         tool_name = state.extra.get("decision", "unknown")
         tool_output = state.extra.get("tool_output", "")
         system_prompt = self.prompts.get("system", "你是一个助理。")
-        messages = [
+        results = state.extra.get("tool_results") or []
+        if len(results) > 1:
+            outputs = [{"role": "system", "content": f"工具[{name}] 输出：\n{out}"} for name, out in results]
+        else:
+            outputs = [{"role": "system", "content": f"工具[{tool_name}] 输出：\n{tool_output}"}]
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_text},
-            {"role": "system", "content": f"工具[{tool_name}] 输出：\n{tool_output}"},
+            *outputs,
         ]
-        reply = self.llm.chat(system_prompt, messages)
+
+    # [5d] Merge tool results and generate LLM response
+    def node_merge_tool_result(self, state: AgentState) -> AgentState:
+        tool_name = state.extra.get("decision", "unknown")
+        reply = self._chat(self._merge_messages(state))
         state.response_text = reply
         state.add_assistant_message(reply, mode=tool_name)
         return state
@@ -105,27 +225,80 @@ class DialogueGraph:
     # [5] Backward compatibility: sequential reasoning execution (for fallback mode)
     def node_reasoning(self, state: AgentState) -> AgentState:
         state = self.node_tool_selection(state)
-        decision = state.extra.get("decision", "llm")
-        if decision == "llm":
-            state = self.node_llm_direct(state)
-        else:
-            if decision == "web_search":
-                state = self.node_web_search(state)
-            elif decision == "summarize":
-                state = self.node_summarize(state)
-            elif decision == "emotion_detect":
-                state = self.node_emotion_detect(state)
-            state = self.node_merge_tool_result(state)
+        return self.node_respond(state)
+
+    def _run_selected_tool(self, state: AgentState) -> AgentState:
+        while self.has_next_step(state):
+            state = self.node_tool_step(state)
+        return state
+
+    # [5a'] Run the planned tool steps (if any) and produce the reply
+    def node_respond(self, state: AgentState) -> AgentState:
+        if not self._uses_tools(state):
+            return self.node_llm_direct(state)
+        state = self._run_selected_tool(state)
+        return self.node_merge_tool_result(state)
+
+    def _reply_messages(self, state: AgentState) -> List[Dict[str, str]]:
+        if not self._uses_tools(state):
+            return self._direct_messages(state)
+        return self._merge_messages(state)
+
+    def _finish_reply(self, state: AgentState, reply: str) -> AgentState:
+        state.response_text = reply
+        state.add_assistant_message(reply, mode=state.extra.get("decision", "llm"))
+        state = self.node_memory_decision_and_write(state)
+        state = self.node_tts(state)
+        self.save_checkpoint(state)
         return state
 
+    def save_checkpoint(self, state: AgentState) -> None:
+        """Persist this turn's changes to the session's checkpoint log (see ``core.checkpoint``)."""
+        session_id = state.extra.get("session_id")
+        if self.checkpointer is not None and session_id:
+            self.checkpointer.save(str(session_id), state)
+
+    def resume(self, state: AgentState) -> bool:
+        """Load the checkpoint of ``state.extra["session_id"]`` into a fresh ``state``; False when there is none."""
+        session_id = state.extra.get("session_id")
+        if self.checkpointer is None or not session_id:
+            return False
+        return self.checkpointer.restore(str(session_id), state)
+
+    def ensure_memory_writer(self) -> MemoryWriter:
+        """Background writer for the async paths; it feeds the memory policy when there is one."""
+        if self.memory_writer is None:
+            self.memory_writer = MemoryWriter(self.memory_policy or self.memory)
+        return self.memory_writer
+
     # [6] LongTermMemoryStoreDecision
     def node_memory_decision_and_write(self, state: AgentState) -> AgentState:
+        if self.memory_policy is not None:
+            return self._write_through_policy(state)
         # Simple heuristic: write when response is long or contains preference keywords
         text = (state.last_user_text() or "") + "\n" + (state.response_text or "")
         should = len(text) > 80 or any(k in text for k in ["我喜欢", "我的目标", "我的生日", "我的城市"])
         state.should_write_memory = should
         if should:
-            self.memory.add_memory(text, meta={"type": "dialogue"})
+            meta = {"type": "dialogue"}
+            if state.extra.get("user_id"):
+                meta["user"] = state.extra["user_id"]
+            if self.memory_writer is not None:
+                self.memory_writer.submit(text, meta=meta)
+            else:
+                self.memory.add_memory(text, meta=meta)
+        return state
+
+    def _write_through_policy(self, state: AgentState) -> AgentState:
+        # Every user turn is a candidate; the policy keeps only salient, new facts
+        text = state.last_user_text() or ""
+        state.should_write_memory = bool(text.strip())
+        if state.should_write_memory:
+            meta = {"user": state.extra["user_id"]} if state.extra.get("user_id") else {}
+            if self.memory_writer is not None:
+                self.memory_writer.submit(text, meta=meta)
+            else:
+                self.memory_policy.add_memories([(text, meta)])
         return state
 
     # [7] TTS(voice output) -> No audio processing here, delegated to voice subsystem; placeholder return
@@ -140,9 +313,135 @@ class DialogueGraph:
         state = self.node_reasoning(state)
         state = self.node_memory_decision_and_write(state)
         state = self.node_tts(state)
+        self.save_checkpoint(state)
+        return state
+
+    async def arun_turn(self, state: AgentState) -> AgentState:
+        """Async turn: RAG and tool selection run concurrently, blocking work runs
+        in the default executor and the memory write is handed to a background
+        writer, so the reply is returned without waiting on disk."""
+        self.ensure_memory_writer()
+        loop = asyncio.get_running_loop()
+        state = self.node_stt(state)
+        state = self.node_short_term_memory(state)
+        # Both only read the user text and write disjoint fields
+        await asyncio.gather(
+            loop.run_in_executor(None, self.node_rag, state),
+            loop.run_in_executor(None, self.node_tool_selection, state),
+        )
+        state = await loop.run_in_executor(None, self.node_respond, state)
+        state = self.node_memory_decision_and_write(state)
+        state = self.node_tts(state)
+        await loop.run_in_executor(None, self.save_checkpoint, state)
         return state
 
+    def stream_turn(self, state: AgentState) -> Iterator[str]:
+        """Streaming run_turn: yields reply deltas; ``state`` is updated in place
+        and complete (reply, memory write, tts) once the iterator is exhausted."""
+        state = self.node_stt(state)
+        state = self.node_short_term_memory(state)
+        state = self.node_rag(state)
+        state = self.node_tool_selection(state)
+        state = self._run_selected_tool(state)
+        messages = self._reply_messages(state)
+        t0 = time.perf_counter()
+        parts: List[str] = []
+        cached = self._cached_reply(messages)
+        if cached is not None:
+            parts.append(cached)
+            yield cached
+        else:
+            for delta in self.llm.stream_chat(self.prompts.get("system", "你是一个助理。"), messages):
+                parts.append(delta)
+                yield delta
+            self._cache_reply(messages, "".join(parts))
+        self._record_stream(state, messages, parts, t0)
+        self._finish_reply(state, "".join(parts))
+
+    async def astream_turn(self, state: AgentState) -> AsyncIterator[str]:
+        """Async counterpart of ``stream_turn`` with the ``arun_turn`` concurrency."""
+        self.ensure_memory_writer()
+        loop = asyncio.get_running_loop()
+        state = self.node_stt(state)
+        state = self.node_short_term_memory(state)
+        await asyncio.gather(
+            loop.run_in_executor(None, self.node_rag, state),
+            loop.run_in_executor(None, self.node_tool_selection, state),
+        )
+        state = await loop.run_in_executor(None, self._run_selected_tool, state)
+        messages = self._reply_messages(state)
+        t0 = time.perf_counter()
+        parts: List[str] = []
+        cached = self._cached_reply(messages)
+        if cached is not None:
+            parts.append(cached)
+            yield cached
+        else:
+            async for delta in self.llm.astream_chat(self.prompts.get("system", "你是一个助理。"), messages):
+                parts.append(delta)
+                yield delta
+            self._cache_reply(messages, "".join(parts))
+        self._record_stream(state, messages, parts, t0)
+        self._finish_reply(state, "".join(parts))
+
+    def _record_stream(self, state: AgentState, messages: List[Dict[str, str]], parts: List[str], t0: float) -> None:
+        if self.instrumentation is not None:
+            self.instrumentation.record(
+                state,
+                "llm_stream",
+                time.perf_counter() - t0,
+                tokens_in=count_tokens(messages),
+                tokens_out=sum(estimate_tokens(p) for p in parts),
+            )
+
+    def warm(self) -> None:
+        """Load everything deferred to first use (tools), for long-lived processes."""
+        self.tools.load_all()
+
+    def close(self) -> None:
+        """Flush queued memory writes (and the metrics dump when instrumented)."""
+        if self.memory_writer is not None:
+            self.memory_writer.close()
+            self.memory_writer = None
+        if self.instrumentation is not None:
+            self.instrumentation.close()
+        if self.cache is not None:
+            self.cache.close()
+        self.planner.executor.close()
+        if self.summarizer is not None:
+            self.summarizer.close()
+        if self.memory_policy is not None:
+            self.memory_policy.close()
+        if self.checkpointer is not None:
+            self.checkpointer.close()
+
 
-def build_graph(llm: LLMManager, memory: MemoryManager, prompts: Dict[str, str]) -> DialogueGraph:
-    return DialogueGraph(llm=llm, memory=memory, prompts=prompts)
+def build_graph(
+    llm: LLMManager,
+    memory: MemoryManager,
+    prompts: Dict[str, str],
+    instrumentation: Optional[Instrumentation] = None,
+    cache: Optional[ResponseCache] = None,
+    keyword_rules: Optional[KeywordRules] = None,
+    router: Optional[Any] = None,
+    planner: Optional[Planner] = None,
+    summarizer: Optional[MicroBatcher] = None,
+    memory_policy: Optional[MemoryPolicy] = None,
+    checkpointer: Optional[SessionCheckpointer] = None,
+) -> DialogueGraph:
+    graph = DialogueGraph(
+        llm=llm,
+        memory=memory,
+        prompts=prompts,
+        cache=cache,
+        keyword_rules=keyword_rules,
+        router=router,
+        planner=planner,
+        summarizer=summarizer,
+        memory_policy=memory_policy,
+        checkpointer=checkpointer,
+    )
+    if instrumentation is not None:
+        instrumentation.instrument(graph)
+    return graph
 
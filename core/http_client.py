@@ -0,0 +1,528 @@
+from __future__ import annotations
+
+import hashlib
+import json as jsonlib
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:  # pragma: no cover
+    import http.client
+
+
+def _httpx():
+    # Imported when an HTTP/2 client is built: httpx (and http.client's ssl/email) would
+    # otherwise load on every start, even with ``http.enabled`` off
+    try:
+        import httpx  # type: ignore
+    except Exception:  # pragma: no cover
+        return None
+    return httpx
+
+
+# Statuses worth retrying: throttling, timeouts and transient server errors
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+PROVIDER_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "groq": "https://api.groq.com/openai/v1",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class Response:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return jsonlib.loads(self.body.decode("utf-8"))
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", "replace")
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: ``rate`` requests/second on average, bursts up to ``burst``."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until ``tokens`` are available; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.waited += waited
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class _Stream:
+    """An open response: read it whole or line by line, then ``close`` it."""
+
+    def __init__(self, status: int, headers: Dict[str, str], read, lines, close) -> None:
+        self.status = status
+        self.headers = headers
+        self.read = read
+        self.iter_lines = lines
+        self.close = close
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections per (scheme, host, port).
+
+    Idle connections are reused LIFO (the most recently used is the least
+    likely to have been closed by the server) and dropped after
+    ``idle_timeout``; at most ``max_per_host`` idle ones are kept.
+    """
+
+    def __init__(self, max_per_host: int = 8, idle_timeout: float = 60.0) -> None:
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[Tuple[str, str, int], Deque[Tuple[float, http.client.HTTPConnection]]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get(self, scheme: str, host: str, port: int, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """A connection and whether it was reused."""
+        key = (scheme, host, port)
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                stamp, conn = idle.pop()
+                if now - stamp <= self.idle_timeout:
+                    self.reused += 1
+                    conn.timeout = timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    return conn, True
+                conn.close()
+            self.created += 1
+        import http.client
+
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=timeout), False
+
+    def put(self, scheme: str, host: str, port: int, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault((scheme, host, port), deque())
+            if len(idle) < self.max_per_host:
+                idle.append((time.monotonic(), conn))
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            for idle in self._idle.values():
+                for _, conn in idle:
+                    conn.close()
+            self._idle.clear()
+
+
+class _PooledTransport:
+    """Standard-library HTTP/1.1 transport over a ConnectionPool."""
+
+    http2 = False
+
+    def __init__(self, max_per_host: int, idle_timeout: float) -> None:
+        self.pool = ConnectionPool(max_per_host, idle_timeout)
+
+    def open(self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes], timeout: float) -> _Stream:
+        import http.client
+
+        # Raised by a kept-alive connection the server already closed; retried once on a fresh one
+        stale_errors = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        host = parts.hostname or ""
+        port = parts.port or (443 if scheme == "https" else 80)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        while True:
+            conn, reused = self.pool.get(scheme, host, port, timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                break
+            except stale_errors:
+                conn.close()
+                if not reused:
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+        state = {"done": False}
+
+        def release() -> None:
+            if state["done"]:
+                return
+            state["done"] = True
+            # Only a fully read response leaves the connection reusable
+            if resp.isclosed() and not resp.will_close:
+                self.pool.put(scheme, host, port, conn)
+            else:
+                conn.close()
+
+        def read() -> bytes:
+            try:
+                return resp.read()
+            finally:
+                release()
+
+        def lines() -> Iterator[bytes]:
+            try:
+                for line in iter(resp.readline, b""):
+                    yield line.rstrip(b"\r\n")
+            finally:
+                release()
+
+        return _Stream(resp.status, {k.lower(): v for k, v in resp.getheaders()}, read, lines, release)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"http2": False, "connections_created": self.pool.created, "connections_reused": self.pool.reused}
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class _HttpxTransport:
+    """httpx transport; negotiates HTTP/2 (one multiplexed connection per host) when ``h2`` is installed."""
+
+    def __init__(self, max_per_host: int, idle_timeout: float, http2: bool) -> None:
+        httpx = _httpx()
+        limits = httpx.Limits(max_keepalive_connections=max_per_host, keepalive_expiry=idle_timeout)
+        self.http2 = http2
+        self.client = httpx.Client(http2=http2, limits=limits)
+
+    def open(self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes], timeout: float) -> _Stream:
+        request = self.client.build_request(method, url, headers=headers, content=body, timeout=timeout)
+        resp = self.client.send(request, stream=True)
+
+        def read() -> bytes:
+            try:
+                return resp.read()
+            finally:
+                resp.close()
+
+        def lines() -> Iterator[bytes]:
+            try:
+                for line in resp.iter_lines():
+                    yield line.encode("utf-8")
+            finally:
+                resp.close()
+
+        return _Stream(resp.status_code, {k.lower(): v for k, v in resp.headers.items()}, read, lines, resp.close)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"http2": self.http2}
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class HttpClient:
+    """Shared HTTP client for the provider engines (LLM, STT, TTS).
+
+    - keep-alive connection pooling (HTTP/2 through httpx when ``http2`` is set
+      and httpx with h2 is installed, otherwise pooled HTTP/1.1);
+    - a token bucket per ``limit_key`` (e.g. "openai:gpt-4o-mini"), taken for
+      every attempt, so retries and hedges are rate limited too;
+    - retries on connection errors and 408/425/429/5xx with exponential backoff
+      and full jitter, never shorter than a ``Retry-After`` header;
+    - ``hedge=True``: when no answer arrived after ``hedge_after`` seconds, a
+      second identical request is sent and the first answer wins (only for
+      cheap idempotent calls such as transcription, never chat completions);
+    - ``coalesce=True``: identical requests in flight at the same time share
+      one upstream call.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 30.0,
+        retries: int = 3,
+        backoff: float = 0.25,
+        max_backoff: float = 8.0,
+        hedge_after: Optional[float] = None,
+        max_per_host: int = 8,
+        idle_timeout: float = 60.0,
+        http2: bool = False,
+        rate_limits: Optional[Dict[str, Dict[str, float]]] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.hedge_workers = max(8, 4 * max_per_host)
+        self.transport: Any = None
+        if http2 and _httpx() is not None:
+            try:
+                self.transport = _HttpxTransport(max_per_host, idle_timeout, http2=True)
+            except ImportError:
+                print("未安装 h2，HTTP/2 不可用，改用 HTTP/1.1 连接池。")
+        if self.transport is None:
+            self.transport = _PooledTransport(max_per_host, idle_timeout)
+        self.rate_limits = dict(rate_limits or {})
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._hedger: Optional[ThreadPoolExecutor] = None
+        self.counters = {"requests": 0, "attempts": 0, "retries": 0, "hedged": 0, "hedge_wins": 0, "coalesced": 0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += n
+
+    def limiter(self, key: Optional[str]) -> Optional[TokenBucket]:
+        """Bucket for ``key``: its own ``rate_limits`` entry, else the provider's ("openai"), else "default"."""
+        if not key:
+            return None
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                conf = self.rate_limits.get(key) or self.rate_limits.get(key.split(":")[0]) or self.rate_limits.get("default")
+                if not conf or float(conf.get("rps", 0)) <= 0:
+                    return None
+                burst = conf.get("burst")
+                bucket = self._buckets[key] = TokenBucket(float(conf["rps"]), float(burst) if burst is not None else None)
+            return bucket
+
+    def _delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        delay = random.uniform(0.0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass  # HTTP-date form; keep the jittered delay
+        return delay
+
+    def _open(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        body: Optional[bytes],
+        timeout: float,
+        limit_key: Optional[str],
+    ) -> _Stream:
+        """Open a response with a 2xx-4xx status that is not retryable, retrying the rest."""
+        import http.client
+
+        bucket = self.limiter(limit_key)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                bucket.acquire()
+            self._count("attempts")
+            try:
+                stream = self.transport.open(method, url, headers, body, timeout)
+            except (OSError, http.client.HTTPException):
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self._delay(attempt, None))
+            else:
+                if stream.status < 400:
+                    return stream
+                if stream.status not in RETRY_STATUSES or attempt >= self.retries:
+                    message = stream.read().decode("utf-8", "replace")[:500]
+                    raise HttpError(stream.status, message)
+                stream.read()
+                time.sleep(self._delay(attempt, stream.headers.get("retry-after")))
+            attempt += 1
+            self._count("retries")
+
+    def _fetch(self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes], timeout: float, limit_key: Optional[str]) -> Response:
+        stream = self._open(method, url, headers, body, timeout, limit_key)
+        return Response(stream.status, stream.headers, stream.read())
+
+    def _hedged(self, *args: Any) -> Response:
+        if self._hedger is None:
+            with self._lock:
+                if self._hedger is None:
+                    # Primary and hedge both run here, so leave room for every caller to hedge
+                    self._hedger = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix="hedge")
+        first = self._hedger.submit(self._fetch, *args)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+        self._count("hedged")
+        second = self._hedger.submit(self._fetch, *args)
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    # The slower request finishes in the background; its answer is dropped
+                    return future.result()
+                error = future.exception()
+        raise error  # type: ignore[misc]
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        json: Any = None,
+        data: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        limit_key: Optional[str] = None,
+        hedge: bool = False,
+        coalesce: bool = False,
+    ) -> Response:
+        """Send a request and read the whole response; raises HttpError for a final >= 400 status."""
+        self._count("requests")
+        headers = dict(headers or {})
+        body = data
+        if json is not None:
+            body = jsonlib.dumps(json, ensure_ascii=False).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        args = (method, url, headers, body, timeout or self.timeout, limit_key)
+        call = self._hedged if hedge and self.hedge_after else self._fetch
+        if not coalesce:
+            return call(*args)
+
+        key = hashlib.sha1(repr((method, url, sorted(headers.items()), body, limit_key)).encode("utf-8")).hexdigest()
+        with self._lock:
+            leader = self._inflight.get(key)
+            if leader is None:
+                future: Future = Future()
+                self._inflight[key] = future
+        if leader is not None:
+            self._count("coalesced")
+            return leader.result()
+        try:
+            result = call(*args)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stream_lines(
+        self,
+        method: str,
+        url: str,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        limit_key: Optional[str] = None,
+    ) -> Iterator[bytes]:
+        """Response body line by line (server-sent events); retried only until the first byte."""
+        self._count("requests")
+        headers = dict(headers or {})
+        body = None
+        if json is not None:
+            body = jsonlib.dumps(json, ensure_ascii=False).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        stream = self._open(method, url, headers, body, timeout or self.timeout, limit_key)
+        return stream.iter_lines()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self.counters)
+            out["rate_limit_wait_s"] = {k: round(b.waited, 3) for k, b in self._buckets.items()}
+        out.update(self.transport.stats())
+        return out
+
+    def close(self) -> None:
+        if self._hedger is not None:
+            self._hedger.shutdown(wait=False)
+            self._hedger = None
+        self.transport.close()
+
+
+def provider_endpoint(
+    provider: str,
+    path: str,
+    model: str,
+    api_key: str,
+    base_url: str = "",
+    api_version: str = "2024-06-01",
+) -> Tuple[str, Dict[str, str]]:
+    """URL and auth headers for an OpenAI-style ``path`` ("/chat/completions", ...).
+
+    Azure addresses the deployment named ``model`` under ``base_url`` and
+    authenticates with ``api-key``; openai/groq (and any OpenAI-compatible
+    ``base_url``, such as a local mock server) use a bearer token.
+    """
+    if provider == "azure":
+        url = f"{base_url.rstrip('/')}/openai/deployments/{model}{path}?api-version={api_version}"
+        return url, {"api-key": api_key}
+    url = (base_url or PROVIDER_URLS.get(provider, PROVIDER_URLS["openai"])).rstrip("/") + path
+    return url, {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+
+def encode_multipart(fields: Dict[str, str], files: Dict[str, Tuple[str, Any, str]]) -> Tuple[bytes, str]:
+    """multipart/form-data body and its Content-Type.
+
+    ``files`` maps name -> (filename, data, mime); ``data`` is bytes-like or
+    a list of bytes-like chunks (e.g. a header and a memoryview), copied
+    once into the body.
+    """
+    boundary = uuid.uuid4().hex
+    parts: List[Any] = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8"))
+    for name, (filename, data, mime) in files.items():
+        head = f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\nContent-Type: {mime}\r\n\r\n'
+        parts.append(head.encode("utf-8"))
+        parts.extend(data if isinstance(data, (list, tuple)) else [data])
+        parts.append(b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def make_http_client(config: Dict) -> Optional[HttpClient]:
+    """Shared client from the ``http`` config section, or None (engines stay placeholders)."""
+    conf = config.get("http") or {}
+    if not conf.get("enabled", False):
+        return None
+    hedge_after = conf.get("hedge_after")
+    return HttpClient(
+        timeout=float(conf.get("timeout", 30.0)),
+        retries=int(conf.get("retries", 3)),
+        backoff=float(conf.get("backoff", 0.25)),
+        max_backoff=float(conf.get("max_backoff", 8.0)),
+        hedge_after=float(hedge_after) if hedge_after else None,
+        max_per_host=int(conf.get("max_connections_per_host", 8)),
+        idle_timeout=float(conf.get("idle_timeout", 60.0)),
+        http2=bool(conf.get("http2", False)),
+        rate_limits=conf.get("rate_limits") or {},
+    )
@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from .state import AgentState, estimate_tokens
+
+# Leaf nodes of the dialogue pipeline; composites (node_reasoning, node_respond) are not timed
+NODES = (
+    "node_stt",
+    "node_short_term_memory",
+    "node_rag",
+    "node_tool_selection",
+    "node_llm_direct",
+    "node_tool_step",
+    "node_merge_tool_result",
+    "node_memory_decision_and_write",
+    "node_tts",
+)
+_LLM_NODES = {"llm_direct", "merge_tool_result"}
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    """HDR-style log-linear histogram of non-negative integers.
+
+    Values below ``2**bits`` are counted exactly; above that each power of two
+    is split into ``2**(bits-1)`` buckets, so the relative error is bounded by
+    ``2**(1-bits)`` (under 1% with the default) at any magnitude. Buckets are
+    stored sparsely.
+    """
+
+    def __init__(self, bits: int = 8) -> None:
+        self.bits = bits
+        self._half = 1 << (bits - 1)
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        shift = value.bit_length() - self.bits
+        if shift <= 0:
+            return value
+        return shift * self._half + (value >> shift)
+
+    def _upper(self, index: int) -> int:
+        if index < 2 * self._half:
+            return index
+        shift = index // self._half - 1
+        return ((index - shift * self._half + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        value = max(0, int(value))
+        idx = self._index(value)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def merge(self, other: "Histogram") -> None:
+        for idx, n in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + n
+        if other.count:
+            self.min = other.min if self.count == 0 else min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, q: float) -> int:
+        """Highest value equivalent to the ``q`` quantile (0 < q <= 1)."""
+        if self.count == 0:
+            return 0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= rank:
+                return min(self._upper(idx), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class TurnTrace:
+    __slots__ = ("turn", "user", "started", "spans")
+
+    def __init__(self, turn: int, user: Optional[str]) -> None:
+        self.turn = turn
+        self.user = user
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+
+class Instrumentation:
+    """Per-node timing for ``DialogueGraph`` and ``LangGraphRunner``.
+
+    ``instrument(graph)`` wraps the node methods and turn entry points on the
+    instance, so nothing is timed (or even wrapped) unless an Instrumentation
+    is attached. Each turn records wall time per node plus corpus size, tokens
+    in/out and tool used where they apply; turns are appended to a JSONL trace
+    file and node latencies aggregate into microsecond histograms exported as
+    Prometheus text.
+    """
+
+    def __init__(self, log_dir: Optional[str] = None, trace_file: str = "traces.jsonl", metrics_file: str = "metrics.prom") -> None:
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, Dict[str, float]] = {"tokens_in": {}, "tokens_out": {}, "tool_calls": {}}
+        self.last_turn: Optional[Dict[str, Any]] = None
+        self.turns = 0
+        self._lock = threading.Lock()
+        self._trace = None
+        self.metrics_path = None
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+            self._trace = open(os.path.join(log_dir, trace_file), "a", encoding="utf-8", buffering=1)
+            self.metrics_path = os.path.join(log_dir, metrics_file)
+
+    # -- wiring -------------------------------------------------------------
+    def instrument(self, graph: Any) -> Any:
+        """Wrap the nodes and turn methods of a ``DialogueGraph`` in place."""
+        for attr in NODES:
+            setattr(graph, attr, self._wrap_node(graph, attr[len("node_"):], getattr(graph, attr)))
+        graph.memory.add_memories = self._wrap_timer("memory_append", graph.memory.add_memories)
+        graph.instrumentation = self
+        self.wrap_turns(graph)
+        return graph
+
+    def wrap_turns(self, runner: Any, names: tuple = ("run_turn", "arun_turn", "stream_turn", "astream_turn")) -> Any:
+        wrappers = {
+            "run_turn": self._wrap_run,
+            "arun_turn": self._wrap_arun,
+            "stream_turn": self._wrap_stream,
+            "astream_turn": self._wrap_astream,
+        }
+        for name in names:
+            setattr(runner, name, wrappers[name](getattr(runner, name)))
+        return runner
+
+    def _wrap_node(self, graph: Any, name: str, fn: Callable[[AgentState], AgentState]) -> Callable[[AgentState], AgentState]:
+        @functools.wraps(fn)
+        def node(state: AgentState) -> AgentState:
+            tokens_in = count_tokens(graph._reply_messages(state)) if name in _LLM_NODES else None
+            t0 = time.perf_counter()
+            out = fn(state)
+            elapsed = time.perf_counter() - t0
+            fields: Dict[str, Any] = {}
+            if name == "rag":
+                fields["corpus"] = graph.memory.corpus_size(state.extra.get("user_id"))
+                fields["hits"] = len(out.retrieved_context)
+            elif name == "tool_selection":
+                fields["tool"] = out.extra.get("decision", "llm")
+            elif name == "tool_step":
+                # Tools of the step just run, joined with "+" when they ran in parallel
+                step = out.extra.get("step_index", 0)
+                fields["tool"] = "+".join(out.extra["plan"][step - 1]) if step else ""
+            elif tokens_in is not None:
+                fields["tokens_in"] = tokens_in
+                fields["tokens_out"] = estimate_tokens(out.response_text or "")
+            self.record(out, name, elapsed, **fields)
+            return out
+
+        return node
+
+    def _wrap_timer(self, name: str, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._observe(name, time.perf_counter() - t0)
+
+        return timed
+
+    def _wrap_run(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def run_turn(state: AgentState) -> AgentState:
+            trace = self.begin(state)
+            out = state
+            try:
+                out = fn(state)
+                return out
+            finally:
+                self.end(trace, state, out)
+
+        return run_turn
+
+    def _wrap_arun(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def arun_turn(state: AgentState) -> AgentState:
+            trace = self.begin(state)
+            out = state
+            try:
+                out = await fn(state)
+                return out
+            finally:
+                self.end(trace, state, out)
+
+        return arun_turn
+
+    def _wrap_stream(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def stream_turn(state: AgentState) -> Iterator[str]:
+            trace = self.begin(state)
+            try:
+                yield from fn(state)
+            finally:
+                self.end(trace, state, state)
+
+        return stream_turn
+
+    def _wrap_astream(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def astream_turn(state: AgentState) -> AsyncIterator[str]:
+            trace = self.begin(state)
+            try:
+                async for delta in fn(state):
+                    yield delta
+            finally:
+                self.end(trace, state, state)
+
+        return astream_turn
+
+    # -- recording ----------------------------------------------------------
+    def begin(self, state: AgentState) -> TurnTrace:
+        with self._lock:
+            self.turns += 1
+            trace = TurnTrace(self.turns, state.extra.get("user_id"))
+        # Carried on the state so nodes running in executor threads find it
+        state.extra["trace"] = trace
+        return trace
+
+    def end(self, trace: TurnTrace, state: AgentState, out: AgentState) -> None:
+        elapsed = time.perf_counter() - trace.started
+        state.extra.pop("trace", None)
+        out.extra.pop("trace", None)
+        self._observe("turn", elapsed)
+        record = {
+            "ts": round(time.time(), 3),
+            "turn": trace.turn,
+            "user": trace.user,
+            "total_ms": round(elapsed * 1000, 3),
+            "decision": out.extra.get("decision", "llm"),
+            "nodes": trace.spans,
+        }
+        self.last_turn = record
+        if self._trace is not None:
+            with self._lock:
+                self._trace.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def record(self, state: AgentState, node: str, seconds: float, **fields: Any) -> None:
+        """Add one node span to the state's current turn and the aggregates."""
+        self._observe(node, seconds)
+        with self._lock:
+            for key in ("tokens_in", "tokens_out"):
+                if key in fields:
+                    bucket = self.counters[key]
+                    bucket[node] = bucket.get(node, 0) + fields[key]
+            if node == "tool_step":
+                calls = self.counters["tool_calls"]
+                for tool in filter(None, fields.get("tool", "").split("+")):
+                    calls[tool] = calls.get(tool, 0) + 1
+        trace = state.extra.get("trace")
+        if trace is not None:
+            trace.spans.append({"node": node, "ms": round(seconds * 1000, 3), **fields})
+
+    def _observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.record(int(seconds * 1_000_000))
+
+    # -- output -------------------------------------------------------------
+    def prometheus(self) -> str:
+        """Prometheus text exposition: latency summaries (seconds) and counters."""
+        lines = [
+            "# HELP her_node_latency_seconds Wall time per dialogue node, turn and memory append.",
+            "# TYPE her_node_latency_seconds summary",
+        ]
+        with self._lock:
+            for name in sorted(self.histograms):
+                hist = self.histograms[name]
+                for q in QUANTILES:
+                    lines.append(f'her_node_latency_seconds{{node="{name}",quantile="{q}"}} {hist.percentile(q) / 1e6:.6f}')
+                lines.append(f'her_node_latency_seconds_sum{{node="{name}"}} {hist.total / 1e6:.6f}')
+                lines.append(f'her_node_latency_seconds_count{{node="{name}"}} {hist.count}')
+            for key, label in (("tokens_in", "node"), ("tokens_out", "node"), ("tool_calls", "tool")):
+                lines.append(f"# TYPE her_{key}_total counter")
+                for name, value in sorted(self.counters[key].items()):
+                    lines.append(f'her_{key}_total{{{label}="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {
+                    "count": h.count,
+                    "mean_ms": round(h.mean() / 1000, 3),
+                    **{f"p{int(q * 100)}_ms": round(h.percentile(q) / 1000, 3) for q in QUANTILES},
+                    "max_ms": round(h.max / 1000, 3),
+                }
+                for name, h in sorted(self.histograms.items())
+            }
+
+    def close(self) -> None:
+        if self.metrics_path:
+            with open(self.metrics_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus())
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+
+
+def format_turn(record: Dict[str, Any]) -> str:
+    """One-turn breakdown for ``--profile``: a line per node, slowest share first."""
+    total = record.get("total_ms") or 0.0
+    lines = [f"[profile] turn {record.get('turn')}  total {total:.2f} ms  decision={record.get('decision')}"]
+    for span in sorted(record.get("nodes", []), key=lambda s: -s["ms"]):
+        share = 100.0 * span["ms"] / total if total else 0.0
+        extras = " ".join(f"{k}={v}" for k, v in span.items() if k not in {"node", "ms"})
+        lines.append(f"  {span['node']:<26}{span['ms']:>10.3f} ms {share:5.1f}%  {extras}".rstrip())
+    return "\n".join(lines)
+
+
+def count_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(m.get("content", "")) for m in messages)
+
+
+def make_instrumentation(config: Dict, profile: bool = False) -> Optional[Instrumentation]:
+    """Instrumentation from ``instrumentation`` config, or None when disabled."""
+    conf = config.get("instrumentation") or {}
+    if not (profile or conf.get("enabled", False)):
+        return None
+    log_dir = ((config.get("app") or {}).get("log_dir")) or "data/logs"
+    return Instrumentation(
+        log_dir=log_dir,
+        trace_file=conf.get("trace_file", "traces.jsonl"),
+        metrics_file=conf.get("metrics_file", "metrics.prom"),
+    )
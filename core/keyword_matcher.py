@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .startup import load_yaml
+
+
+class KeywordRule(NamedTuple):
+    pattern: str
+    label: str
+    priority: int = 0
+    weight: float = 1.0
+    index: int = 0  # position in the rule list; earlier rules win ties
+
+
+class Match(NamedTuple):
+    start: int
+    end: int
+    rule: KeywordRule
+
+
+def parse_rules(spec: Any) -> List[KeywordRule]:
+    """Rules from config: ``{label: [pattern | {pattern, priority, weight}, ...]}``
+    or a list of ``{pattern, label, priority, weight}`` / ``(pattern, label)``."""
+    entries: List[Tuple[str, str, int, float]] = []
+    if isinstance(spec, dict):
+        for label, patterns in spec.items():
+            for p in patterns or []:
+                if isinstance(p, dict):
+                    entries.append((str(p["pattern"]), str(label), int(p.get("priority", 0)), float(p.get("weight", 1.0))))
+                else:
+                    entries.append((str(p), str(label), 0, 1.0))
+    else:
+        for item in spec or []:
+            if isinstance(item, dict):
+                entries.append((str(item["pattern"]), str(item["label"]), int(item.get("priority", 0)), float(item.get("weight", 1.0))))
+            else:
+                entries.append((str(item[0]), str(item[1]), 0, 1.0))
+    return [KeywordRule(p, label, prio, w, i) for i, (p, label, prio, w) in enumerate(entries) if p]
+
+
+class KeywordMatcher:
+    """Aho–Corasick automaton over a keyword rule set.
+
+    One left-to-right scan of the text reports every occurrence of every
+    pattern, overlapping ones included, in O(len(text) + matches) regardless
+    of how many rules there are. Matching is case-insensitive for Latin text;
+    positions index the lowercased text, which only differs in length from the
+    input for a few exotic characters.
+    """
+
+    def __init__(self, rules: Iterable[KeywordRule], ignore_case: bool = True) -> None:
+        self.rules = list(rules)
+        self.ignore_case = ignore_case
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[KeywordRule, ...]] = [()]
+        for rule in self.rules:
+            self._insert(rule)
+        self._link()
+
+    def _insert(self, rule: KeywordRule) -> None:
+        state = 0
+        for ch in rule.pattern.lower() if self.ignore_case else rule.pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += (rule,)
+
+    def _link(self) -> None:
+        # BFS so every state's failure target is already final when it is visited
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def finditer(self, text: str) -> Iterator[Match]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text.lower() if self.ignore_case else text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for rule in out[state]:
+                yield Match(i + 1 - len(rule.pattern), i + 1, rule)
+
+    def matches(self, text: str) -> List[Match]:
+        return list(self.finditer(text or ""))
+
+    def best(self, text: str) -> Optional[KeywordRule]:
+        """Highest-priority matching rule; among equal priorities the earliest rule."""
+        best: Optional[KeywordRule] = None
+        for m in self.finditer(text or ""):
+            r = m.rule
+            if best is None or (r.priority, -r.index) > (best.priority, -best.index):
+                best = r
+        return best
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Summed match weight per label, in order of each label's first rule."""
+        totals: Dict[str, float] = {}
+        first: Dict[str, int] = {}
+        for m in self.finditer(text or ""):
+            totals[m.rule.label] = totals.get(m.rule.label, 0.0) + m.rule.weight
+            first[m.rule.label] = min(first.get(m.rule.label, m.rule.index), m.rule.index)
+        return {label: totals[label] for label in sorted(totals, key=first.__getitem__)}
+
+
+class KeywordRules:
+    """Named rule sets from the ``keywords`` section of a YAML settings file.
+
+    The file's mtime is checked at most every ``reload_interval`` seconds when
+    a matcher is requested; on change the automata are rebuilt and swapped in.
+    A file that fails to parse keeps the previous rules (see ``last_error``).
+    """
+
+    def __init__(self, path: Optional[str], reload_interval: float = 2.0) -> None:
+        self.path = path
+        self.reload_interval = reload_interval
+        self.last_error: Optional[Exception] = None
+        self._matchers: Dict[str, KeywordMatcher] = {}
+        self._mtime: Optional[int] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._reload()
+
+    def matcher(self, name: str) -> Optional[KeywordMatcher]:
+        """Current automaton for rule set ``name``, or None if the file has no such set."""
+        if self.reload_interval > 0 and time.monotonic() - self._checked >= self.reload_interval:
+            self._reload()
+        return self._matchers.get(name)
+
+    def _reload(self) -> None:
+        with self._lock:
+            self._checked = time.monotonic()
+            if not self.path:
+                return
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                # Shares the parse (and its on-disk cache) with the settings loader
+                section = (load_yaml(self.path) or {}).get("keywords") or {}
+                matchers = {
+                    name: KeywordMatcher(parse_rules(spec))
+                    for name, spec in section.items()
+                    if isinstance(spec, (dict, list))
+                }
+            except Exception as exc:
+                self.last_error = exc
+                return
+            self._matchers = matchers
+            self._mtime = mtime
+            self.last_error = None
+
+
+def make_keyword_rules(config: Dict) -> Optional[KeywordRules]:
+    """Hot-reloaded rules from ``keywords.rules_file`` (default: config/settings.yaml)."""
+    conf = config.get("keywords")
+    if not conf:
+        return None
+    return KeywordRules(
+        conf.get("rules_file", "config/settings.yaml"),
+        reload_interval=float(conf.get("reload_interval", 2.0)),
+    )
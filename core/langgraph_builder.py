@@ -1,41 +1,167 @@
 from __future__ import annotations
 
-from typing import Dict, Any
-
-try:
-    from langgraph.graph import StateGraph, END  # type: ignore
-except Exception:  # pragma: no cover
-    StateGraph = None  # type: ignore
-    END = None  # type: ignore
+import asyncio
+import importlib.util
+import threading
+from typing import AsyncIterator, Callable, Dict, Any, Iterator, Optional
 
 from .state import AgentState
 from .llm_manager import LLMManager
 from .memory_manager import MemoryManager
 from .graph_builder import DialogueGraph
+from .instrumentation import Instrumentation
+from .cache import ResponseCache
+from .keyword_matcher import KeywordRules
+from .planner import Planner
+from .batching import MicroBatcher
+from .memory_policy import MemoryPolicy
+from .checkpoint import SessionCheckpointer
+
+
+def langgraph_available() -> bool:
+    # Checks for the package without importing it (the import is the slow part)
+    try:
+        return importlib.util.find_spec("langgraph") is not None
+    except (ImportError, ValueError):  # pragma: no cover
+        return False
 
 
 class LangGraphRunner:
-    def __init__(self, app: Any) -> None:
-        self.app = app
+    """Runs turns through the compiled StateGraph.
+
+    With ``compile`` instead of a compiled ``app``, langgraph is imported and
+    the graph compiled on the first ``run_turn`` / ``arun_turn`` (or
+    ``warm``), once per runner. Streaming goes through the DialogueGraph
+    nodes directly and never needs it.
+
+    Each turn's result is saved to the graph's session checkpointer. With
+    ``checkpointed`` the compiled graph also has a LangGraph checkpointer,
+    and turns run on thread ``extra["session_id"]``.
+    """
+
+    def __init__(
+        self,
+        app: Any = None,
+        graph: DialogueGraph | None = None,
+        compile: Callable[[], Any] | None = None,
+        checkpointed: bool = False,
+    ) -> None:
+        self._app = app
+        self._compile = compile
+        self._lock = threading.Lock()
+        self.graph = graph
+        self.checkpointed = checkpointed
+
+    @property
+    def app(self) -> Any:
+        if self._compile is not None:
+            with self._lock:
+                if self._compile is not None:
+                    self._app = self._compile()
+                    self._compile = None
+        return self._app
+
+    @staticmethod
+    def _as_state(result: Any) -> AgentState:
+        # Depending on the LangGraph version, invoke returns the state object or a dict of its fields
+        if isinstance(result, AgentState):
+            return result
+        return AgentState(**dict(result))
+
+    def _config(self, state: AgentState) -> Optional[Dict[str, Any]]:
+        if not self.checkpointed:
+            return None
+        return {"configurable": {"thread_id": str(state.extra.get("session_id") or "default")}}
 
     def run_turn(self, state: AgentState) -> AgentState:
-        # LangGraph's invoke returns the merged state; return it directly
-        return self.app.invoke(state)
+        state = self._as_state(self.app.invoke(state, config=self._config(state)))
+        if self.graph is not None:
+            self.graph.save_checkpoint(state)
+        return state
 
+    async def arun_turn(self, state: AgentState) -> AgentState:
+        # ainvoke runs the sync nodes in an executor; memory writes go to the background writer
+        if self.graph is not None:
+            self.graph.ensure_memory_writer()
+        state = self._as_state(await self.app.ainvoke(state, config=self._config(state)))
+        if self.graph is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.graph.save_checkpoint, state)
+        return state
 
-def route_after_tool_selection(state: AgentState) -> str:
-    """Conditional routing function: route to different nodes based on tool selection decision"""
-    decision = state.extra.get("decision", "llm")
-    return decision
+    def resume(self, state: AgentState) -> bool:
+        return self.graph is not None and self.graph.resume(state)
+
+    def stream_turn(self, state: AgentState) -> Iterator[str]:
+        # The compiled graph only streams node updates, not LLM tokens; stream through the same nodes directly
+        return self.graph.stream_turn(state)
+
+    def astream_turn(self, state: AgentState) -> AsyncIterator[str]:
+        return self.graph.astream_turn(state)
+
+    def warm(self) -> None:
+        self.app
+        if self.graph is not None:
+            self.graph.warm()
+
+    def close(self) -> None:
+        if self.graph is not None:
+            self.graph.close()
 
 
-def build_graph(llm: LLMManager, memory: MemoryManager, prompts: Dict[str, str]):
+def route_after_tool_selection(state: AgentState) -> str:
+    """Conditional routing function: tool steps when a plan was made, otherwise a direct reply"""
+    return "tools" if state.extra.get("plan") else "llm"
+
+
+def build_graph(
+    llm: LLMManager,
+    memory: MemoryManager,
+    prompts: Dict[str, str],
+    instrumentation: Instrumentation | None = None,
+    cache: ResponseCache | None = None,
+    keyword_rules: KeywordRules | None = None,
+    router: Any = None,
+    planner: Planner | None = None,
+    summarizer: MicroBatcher | None = None,
+    memory_policy: MemoryPolicy | None = None,
+    checkpointer: SessionCheckpointer | None = None,
+    langgraph_saver: Callable[[], Any] | None = None,
+):
+    """``langgraph_saver`` builds the compiled graph's checkpointer (see ``core.checkpoint``) when LangGraph is used."""
+    seq = DialogueGraph(
+        llm=llm,
+        memory=memory,
+        prompts=prompts,
+        cache=cache,
+        keyword_rules=keyword_rules,
+        router=router,
+        planner=planner,
+        summarizer=summarizer,
+        memory_policy=memory_policy,
+        checkpointer=checkpointer,
+    )
+    if instrumentation is not None:
+        # Nodes must be wrapped before they are registered by compile_graph
+        instrumentation.instrument(seq)
     # Fallback to sequential DialogueGraph if LangGraph is not installed
-    if StateGraph is None:
-        return DialogueGraph(llm=llm, memory=memory, prompts=prompts)
+    if not langgraph_available():
+        return seq
 
     # Use LangGraph, wrap node functions as graph nodes
-    seq = DialogueGraph(llm=llm, memory=memory, prompts=prompts)
+    runner = LangGraphRunner(
+        graph=seq,
+        compile=lambda: compile_graph(seq, langgraph_saver() if langgraph_saver is not None else None),
+        checkpointed=langgraph_saver is not None,
+    )
+    if instrumentation is not None:
+        # Streaming delegates to seq, whose turn methods are already wrapped
+        instrumentation.wrap_turns(runner, ("run_turn", "arun_turn"))
+    return runner
+
+
+def compile_graph(seq: DialogueGraph, checkpointer: Any = None) -> Any:
+    """The StateGraph over ``seq``'s nodes, compiled (with ``checkpointer`` as its LangGraph saver)."""
+    from langgraph.graph import StateGraph, END  # type: ignore
 
     graph = StateGraph(AgentState)
 
@@ -45,9 +171,7 @@ def build_graph(llm: LLMManager, memory: MemoryManager, prompts: Dict[str, str])
     graph.add_node("rag", seq.node_rag)
     graph.add_node("tool_selection", seq.node_tool_selection)
     graph.add_node("llm_direct", seq.node_llm_direct)
-    graph.add_node("web_search", seq.node_web_search)
-    graph.add_node("summarize", seq.node_summarize)
-    graph.add_node("emotion_detect", seq.node_emotion_detect)
+    graph.add_node("tool_step", seq.node_tool_step)
     graph.add_node("merge_tool_result", seq.node_merge_tool_result)
     graph.add_node("memory", seq.node_memory_decision_and_write)
     graph.add_node("tts", seq.node_tts)
@@ -60,22 +184,19 @@ def build_graph(llm: LLMManager, memory: MemoryManager, prompts: Dict[str, str])
     graph.add_edge("short_term", "rag")
     graph.add_edge("rag", "tool_selection")
 
-    # Conditional routing: tool_selection -> route to different nodes based on decision
+    # Conditional routing: tool_selection -> direct reply or the planned tool steps
     graph.add_conditional_edges(
         "tool_selection",
         route_after_tool_selection,
-        {
-            "llm": "llm_direct",
-            "web_search": "web_search",
-            "summarize": "summarize",
-            "emotion_detect": "emotion_detect",
-        },
+        {"llm": "llm_direct", "tools": "tool_step"},
     )
 
-    # All tool nodes route to merge_tool_result after completion
-    graph.add_edge("web_search", "merge_tool_result")
-    graph.add_edge("summarize", "merge_tool_result")
-    graph.add_edge("emotion_detect", "merge_tool_result")
+    # tool_step loops while the plan has steps left within reasoning.max_steps, then merges
+    graph.add_conditional_edges(
+        "tool_step",
+        lambda state: "next" if seq.has_next_step(state) else "merge",
+        {"next": "tool_step", "merge": "merge_tool_result"},
+    )
 
     # Both llm_direct and merge_tool_result route to memory
     graph.add_edge("llm_direct", "memory")
@@ -85,6 +206,5 @@ def build_graph(llm: LLMManager, memory: MemoryManager, prompts: Dict[str, str])
     graph.add_edge("memory", "tts")
     graph.add_edge("tts", END)
 
-    app = graph.compile()
-    return LangGraphRunner(app)
+    return graph.compile(checkpointer=checkpointer)
 
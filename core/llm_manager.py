@@ -1,28 +1,144 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import os
-from typing import List, Dict, Any
+import re
+import time
+from typing import AsyncIterator, Iterator, List, Dict, Any, Optional
+
+from .http_client import HttpClient, provider_endpoint
+
+# Placeholder "tokens": one CJK char, or a Latin word with its trailing space
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+\s*|\s+|.", re.S)
 
 
 class LLMManager:
-    """Multimodal LLM wrapper (minimal runnable placeholder)"""
+    """Multimodal LLM wrapper.
+
+    With an ``HttpClient`` it calls the provider's OpenAI-style chat
+    completions endpoint (``base_url`` overrides the provider default, e.g. to
+    point at scripts/mock_provider.py); without one it is a local placeholder.
+    """
 
-    def __init__(self, provider: str, model: str, temperature: float = 0.7, api_key_env: str = "OPENAI_API_KEY") -> None:
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        temperature: float = 0.7,
+        api_key_env: str = "OPENAI_API_KEY",
+        stream_token_delay: float = 0.0,
+        client: Optional[HttpClient] = None,
+        base_url: str = "",
+    ) -> None:
         self.provider = provider
         self.model = model
         self.temperature = temperature
         self.api_key = os.getenv(api_key_env, "")
+        # Simulated per-token latency of the placeholder stream, for time-to-first-token measurements
+        self.stream_token_delay = stream_token_delay
+        self.client = client
+        self.base_url = base_url
+
+    def _payload(self, system_prompt: str, messages: List[Dict[str, str]], stream: bool) -> Dict[str, Any]:
+        if system_prompt and not any(m["role"] == "system" for m in messages):
+            messages = [{"role": "system", "content": system_prompt}] + list(messages)
+        return {"model": self.model, "messages": messages, "temperature": self.temperature, "stream": stream}
+
+    def _endpoint(self):
+        return provider_endpoint(self.provider, "/chat/completions", self.model, self.api_key, self.base_url)
 
     def chat(self, system_prompt: str, messages: List[Dict[str, str]]) -> str:
         """
-        Minimal placeholder: local response concatenation for running without API keys.
-        Can be replaced with OpenAI/other SDKs for real integration.
+        Provider call through the shared client, or a local placeholder
+        (response concatenation) for running without one.
         """
-        last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
-        return f"（占位回复）我已理解：{last_user[:200]}"
+        if self.client is None:
+            last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+            return f"（占位回复）我已理解：{last_user[:200]}"
+        url, headers = self._endpoint()
+        # Identical prompts in flight at once share one upstream call. Never hedged: a generation is
+        # slow, paid and not idempotent, and the losing duplicate would still spend the rate limit
+        resp = self.client.request(
+            "POST",
+            url,
+            json=self._payload(system_prompt, messages, stream=False),
+            headers=headers,
+            limit_key=f"{self.provider}:{self.model}",
+            coalesce=True,
+        )
+        return resp.json()["choices"][0]["message"]["content"] or ""
+
+    def stream_chat(self, system_prompt: str, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """Yield the reply as text deltas (placeholder: the chat() reply in token-sized chunks)."""
+        if self.client is not None:
+            yield from self._stream_remote(system_prompt, messages)
+            return
+        for token in _TOKEN_RE.findall(self.chat(system_prompt, messages)):
+            if self.stream_token_delay:
+                time.sleep(self.stream_token_delay)
+            yield token
+
+    def _stream_remote(self, system_prompt: str, messages: List[Dict[str, str]]) -> Iterator[str]:
+        url, headers = self._endpoint()
+        lines = self.client.stream_lines(
+            "POST",
+            url,
+            json=self._payload(system_prompt, messages, stream=True),
+            headers=headers,
+            limit_key=f"{self.provider}:{self.model}",
+        )
+        # Server-sent events: "data: {chunk}" lines, ended by "data: [DONE]"
+        for line in lines:
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
+
+    async def astream_chat(self, system_prompt: str, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        if self.client is not None:
+            # The client is blocking; pull each delta on the default executor
+            loop = asyncio.get_running_loop()
+            it = self._stream_remote(system_prompt, messages)
+            while True:
+                delta = await loop.run_in_executor(None, next, it, None)
+                if delta is None:
+                    return
+                yield delta
+        for token in _TOKEN_RE.findall(self.chat(system_prompt, messages)):
+            if self.stream_token_delay:
+                await asyncio.sleep(self.stream_token_delay)
+            yield token
 
     def summarize_for_memory(self, text: str, memory_prompt: str) -> List[str]:
-        # Simple sentence splitting placeholder
-        points = [p.strip() for p in text.split("。") if p.strip()]
-        return points[:5]
+        return self.summarize_batch([text], memory_prompt)[0]
+
+    def summarize_batch(self, texts: List[str], memory_prompt: str) -> List[List[str]]:
+        """Key points per text; with a client, one provider call covers the whole batch."""
+        if self.client is not None and texts:
+            points = self._summarize_remote(texts, memory_prompt)
+            if points is not None:
+                return points
+        # Simple sentence splitting placeholder (also the fallback for an unusable reply)
+        return [[p.strip() for p in text.split("。") if p.strip()][:5] for text in texts]
+
+    def _summarize_remote(self, texts: List[str], memory_prompt: str) -> Optional[List[List[str]]]:
+        numbered = "\n\n".join(f"[{i + 1}]\n{t}" for i, t in enumerate(texts))
+        instruction = (
+            f"{memory_prompt}\n下面有 {len(texts)} 段对话，请分别提炼不超过 5 条要点，"
+            "只输出 JSON 数组，第 i 项是第 i 段的要点字符串数组。"
+        )
+        reply = self.chat(instruction, [{"role": "system", "content": instruction}, {"role": "user", "content": numbered}])
+        try:
+            points = json.loads(reply[reply.index("["): reply.rindex("]") + 1])
+        except ValueError:
+            return None
+        if not isinstance(points, list) or len(points) != len(texts):
+            return None
+        return [[str(p).strip() for p in (item if isinstance(item, list) else [item]) if str(p).strip()][:5] for item in points]
 
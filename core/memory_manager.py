@@ -3,16 +3,24 @@ from __future__ import annotations
 import json
 import math
 import os
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Set, Tuple
+
+from .scoring import BM25, ScoringBackend, make_backend
+from .segment_store import SegmentStore, migrate_jsonl
+from .dense_index import DenseRetriever
+from .time_index import TierSpec, TimePartitionedIndex
+from .tokenizer import Tokenizer, get_tokenizer
 
 
 def _tokenize(text: str) -> List[str]:
     return [t for t in text.lower().split() if t.strip()]
 
 
-def _tf(text: str) -> Dict[str, float]:
-    tokens = _tokenize(text)
+def _tf(text: str, tokenizer: Tokenizer | None = None) -> Dict[str, float]:
+    tokens = tokenizer.tokenize(text) if tokenizer is not None else _tokenize(text)
     counts: Dict[str, int] = {}
     for t in tokens:
         counts[t] = counts.get(t, 0) + 1
@@ -30,39 +38,432 @@ def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
     return dot / (na * nb)
 
 
-class MemoryManager:
-    """Simplest RAG: local jsonl with bag-of-words cosine similarity.
-    Convenient for running the flow without external dependencies.
+def _ts_of(record: Dict) -> float | None:
+    try:
+        return float((record.get("meta") or {})["ts"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class JsonlStore:
+    """Append-only memories.jsonl; records are kept in RAM after the first read.
+
+    ``tail`` picks up lines appended by other processes since the last read,
+    so several processes can share one file when their appends are serialized
+    (see ``core.sharded_memory``).
     """
 
-    def __init__(self, persist_path: str, top_k: int = 4) -> None:
-        self.persist_path = Path(persist_path)
-        self.persist_path.parent.mkdir(parents=True, exist_ok=True)
-        self.top_k = top_k
-        if not self.persist_path.exists():
-            self.persist_path.touch()
+    def __init__(self, path: Path, vectorize) -> None:
+        self.path = path
+        self.vectorize = vectorize
+        if not self.path.exists():
+            self.path.touch()
+        self._records: List[Dict] = []
+        self._size = 0  # bytes of the file consumed into ``_records``
+        self._ino = 0
+        self.tail()
 
-    def add_memory(self, text: str, meta: Dict[str, str] | None = None) -> None:
-        record = {"text": text, "meta": meta or {}}
-        with self.persist_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-    def search(self, query: str) -> List[str]:
-        qvec = _tf(query)
-        results: List[tuple[float, str]] = []
-        with self.persist_path.open("r", encoding="utf-8") as f:
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def iter_records(self) -> Iterable[Dict]:
+        with self.path.open("r", encoding="utf-8") as f:
             for line in f:
                 line = line.strip()
                 if not line:
                     continue
                 try:
-                    obj = json.loads(line)
+                    yield json.loads(line)
                 except json.JSONDecodeError:
                     continue
-                text = obj.get("text", "")
-                score = _cosine(qvec, _tf(text))
-                if score > 0:
-                    results.append((score, text))
-        results.sort(key=lambda x: x[0], reverse=True)
-        return [t for _, t in results[: self.top_k]]
 
+    def tail(self) -> List[Dict] | None:
+        """Read complete lines appended since the last read and return their records.
+
+        Returns None when the file was replaced or truncated; ``_records`` then
+        holds the new contents from the start.
+        """
+        with self.path.open("rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._ino or st.st_size < self._size:
+                self._records, self._size, self._ino = [], 0, st.st_ino
+                fresh = True
+            else:
+                fresh = False
+            if st.st_size == self._size and not fresh:
+                return []
+            f.seek(self._size)
+            data = f.read()
+        # A line still being written has no newline yet; leave it for the next read
+        end = data.rfind(b"\n") + 1
+        new: List[Dict] = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                new.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        self._size += end
+        self._records.extend(new)
+        return None if fresh else new
+
+    def iter_vectors(self) -> Iterable[tuple[int, Dict[str, float]]]:
+        for doc_id, record in enumerate(self._records):
+            yield doc_id, self.vectorize(record.get("text", ""))
+
+    def record(self, doc_id: int) -> Dict:
+        return self._records[doc_id]
+
+    def text(self, doc_id: int) -> str:
+        return self._records[doc_id].get("text", "")
+
+    def vector(self, doc_id: int) -> Dict[str, float]:
+        return self.vectorize(self.text(doc_id))
+
+    def append(self, record: Dict) -> int:
+        return self.append_many([record])[0]
+
+    def append_many(self, records: Sequence[Dict]) -> List[int]:
+        # One write of whole lines, so a concurrent reader never parses half a record
+        with self.path.open("ab") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"))
+            self._size = f.tell()
+        first = len(self._records)
+        self._records.extend(records)
+        return list(range(first, len(self._records)))
+
+    def replace(self, records: Sequence[Dict]) -> None:
+        """Rewrite the file with ``records`` (atomic rename); doc ids are renumbered."""
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"))
+            self._size = f.tell()
+            self._ino = os.fstat(f.fileno()).st_ino
+        os.replace(tmp, self.path)
+        self._records = list(records)
+
+    def close(self) -> None:
+        pass
+
+
+class _Partition:
+    """One lexical index plus its local -> global doc id mapping."""
+
+    __slots__ = ("index", "doc_ids")
+
+    def __init__(self, backend: str) -> None:
+        self.index: ScoringBackend = make_backend(backend)
+        self.doc_ids: List[int] = []
+
+    def add(self, doc_id: int, vec: Dict[str, float]) -> None:
+        self.index.add(len(self.doc_ids), vec)
+        self.doc_ids.append(doc_id)
+
+
+class MemoryManager:
+    """Simplest RAG: local jsonl with bag-of-words cosine similarity.
+    Convenient for running the flow without external dependencies.
+
+    Memories are read once on startup into an in-memory scoring backend
+    (see ``core.scoring``); ``add_memory`` appends to both the store and the index.
+    ``storage="segment"`` keeps memories in mmap'd binary segments next to
+    ``persist_path`` (see ``core.segment_store``), importing an existing jsonl once.
+    ``retrieval`` selects lexical, dense (``core.dense_index``) or hybrid ranking;
+    hybrid reranks the union of both candidate sets by BM25 blended with the
+    dense score. Without a dense retriever it stays lexical.
+    With ``partition_key`` (e.g. "user"), memories are indexed per value of
+    that meta field and ``search(..., user=...)`` only sees its own partition.
+    ``retire`` hides superseded memories from search until ``rewrite``
+    (consolidation, see ``core.memory_policy``) drops them from the store.
+    Every memory is stamped with ``meta["ts"]``; with ``tiers`` (lexical
+    retrieval only) the index is split by time, see ``core.time_index``.
+    """
+
+    def __init__(
+        self,
+        persist_path: str,
+        top_k: int = 4,
+        backend: str = "auto",
+        tokenizer: str | Tokenizer = "cjk",
+        storage: str = "jsonl",
+        retrieval: str = "lexical",
+        dense: DenseRetriever | None = None,
+        hybrid_alpha: float = 0.5,
+        partition_key: str | None = None,
+        tiers: TierSpec | None = None,
+    ) -> None:
+        self.persist_path = Path(persist_path)
+        self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+        self.top_k = top_k
+        self.backend = backend
+        self.tokenizer = get_tokenizer(tokenizer) if isinstance(tokenizer, str) else tokenizer
+        self.storage = storage
+        self._store = self._open_store()
+        self.partition_key = partition_key
+        self._partitions: Dict[str, _Partition] = {}
+        self._owners: List[str] = []
+        self._bm25 = BM25()
+        self.dense = dense
+        self.retrieval = retrieval if dense is not None else "lexical"
+        self.hybrid_alpha = hybrid_alpha
+        self.tiers = tiers if self.retrieval == "lexical" else None
+        self._time_index: TimePartitionedIndex | None = None
+        # Guards the store and index against the background MemoryWriter
+        self._lock = threading.RLock()
+        # Retired doc ids, persisted one per line next to the store until the next rewrite
+        self._retired_path = self.persist_path.with_suffix(".retired")
+        self._retired: Set[int] = self._read_retired()
+        # Bumped by every reload, i.e. whenever doc ids may have been renumbered
+        self._generation = 0
+        self.reload()
+
+    def _read_retired(self) -> Set[int]:
+        try:
+            with self._retired_path.open("r", encoding="utf-8") as f:
+                return {int(line) for line in f if line.strip().isdigit()}
+        except OSError:
+            return set()
+
+    def _vectorize(self, text: str) -> Dict[str, float]:
+        return _tf(text, self.tokenizer)
+
+    def _open_store(self):
+        if self.storage == "jsonl":
+            return JsonlStore(self.persist_path, self._vectorize)
+        if self.storage == "segment":
+            store = SegmentStore(
+                self.persist_path.with_suffix(".segments"),
+                self._vectorize,
+                vector_tag=self.tokenizer.signature(),
+            )
+            if not store.imported and self.persist_path.exists():
+                if len(store):
+                    store.import_records([])  # migrated before the marker existed
+                else:
+                    migrate_jsonl(self.persist_path, store)
+            return store
+        raise ValueError(f"Unknown memory storage: {self.storage}")
+
+    def reload(self) -> None:
+        """Rebuild the in-memory index from the store."""
+        with self._lock:
+            self._reload()
+
+    def _reload(self) -> None:
+        self._generation += 1
+        self._partitions = {}
+        self._owners = []
+        self._bm25 = BM25()
+        if self.tiers is not None:
+            self._reload_tiered()
+            return
+        for doc_id, vec in self._store.iter_vectors():
+            # Records are only parsed at load time when partitioning needs their meta
+            owner = self._owner_of(self._store.record(doc_id)) if self.partition_key else ""
+            self._index_vector(doc_id, vec, owner)
+        if self.dense is not None:
+            self.dense.sync(len(self._store), ((i, self._store.text(i)) for i in range(len(self.dense), len(self._store))))
+
+    def _reload_tiered(self) -> None:
+        # Only hot memories are vectorized (or read from segments) now; cold partitions wait for a search
+        index = self._time_index = TimePartitionedIndex(self.backend, self.tiers, self._store.vector)
+        for doc_id in range(len(self._store)):
+            record = self._store.record(doc_id)
+            owner, ts = self._owner_of(record), _ts_of(record)
+            index.add(doc_id, owner, ts, self._store.vector(doc_id) if index.needs_vector(owner, ts) else None)
+
+    def sync(self) -> int:
+        """Index memories other processes appended to a jsonl store since the last sync.
+
+        A store replaced by another process's ``rewrite`` is reloaded whole, and
+        its retired list is re-read. Returns the number of new memories seen.
+        """
+        with self._lock:
+            tail = getattr(self._store, "tail", None)
+            if tail is None:
+                return 0
+            first = len(self._store)
+            new = tail()
+            self._retired = self._read_retired()
+            if new is None:
+                if self.dense is not None:
+                    self.dense.reset()
+                self._reload()
+                return len(self._store)
+            for doc_id, record in enumerate(new, start=first):
+                self._index_vector(doc_id, self._vectorize(record.get("text", "")), self._owner_of(record), _ts_of(record))
+            if new and self.dense is not None:
+                self.dense.sync(len(self._store), ((i, self._store.text(i)) for i in range(len(self.dense), len(self._store))))
+            return len(new)
+
+    def _owner_of(self, record: Dict) -> str:
+        if not self.partition_key:
+            return ""
+        return str((record.get("meta") or {}).get(self.partition_key) or "")
+
+    def _index_vector(self, doc_id: int, vec: Dict[str, float], owner: str, ts: float | None = None) -> None:
+        if self._time_index is not None:
+            self._time_index.add(doc_id, owner, ts, vec)
+            return
+        part = self._partitions.get(owner)
+        if part is None:
+            part = self._partitions[owner] = _Partition(self.backend)
+        part.add(doc_id, vec)
+        if self.partition_key:
+            self._owners.append(owner)
+        self._bm25.add(vec)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def corpus_size(self, user: str | None = None) -> int:
+        """Number of memories a search for ``user`` ranks against."""
+        if not self.partition_key:
+            return len(self._store)
+        if self._time_index is not None:
+            return self._time_index.count(user or "")
+        part = self._partitions.get(user or "")
+        return len(part.doc_ids) if part is not None else 0
+
+    def add_memory(self, text: str, meta: Dict[str, str] | None = None) -> None:
+        self.add_memories([(text, meta)])
+
+    def add_memories(self, items: Sequence[Tuple[str, Dict[str, Any] | None]]) -> List[int]:
+        """Persist several memories with one store write; returns their doc ids."""
+        if not items:
+            return []
+        now = round(time.time(), 3)
+        records = [{"text": text, "meta": {"ts": now, **(meta or {})}} for text, meta in items]
+        vecs = [self._vectorize(r["text"]) for r in records]
+        # Embed before taking the lock so concurrent writers and searches can share a batch
+        dense_vecs = self.dense.embedder.embed_batch([r["text"] for r in records]) if self.dense is not None else None
+        with self._lock:
+            if hasattr(self._store, "append_many"):
+                doc_ids = self._store.append_many(records)
+            else:
+                doc_ids = [self._store.append(r) for r in records]
+            for doc_id, vec, record in zip(doc_ids, vecs, records):
+                self._index_vector(doc_id, vec, self._owner_of(record), record["meta"]["ts"])
+            if self.dense is not None:
+                self.dense.add_vectors(dense_vecs)
+        return doc_ids
+
+    def retire(self, doc_ids: Iterable[int]) -> None:
+        """Hide memories from search (e.g. facts superseded by an update)."""
+        with self._lock:
+            new = [d for d in doc_ids if d not in self._retired]
+            if not new:
+                return
+            self._retired.update(new)
+            with self._retired_path.open("a", encoding="utf-8") as f:
+                f.write("".join(f"{d}\n" for d in new))
+
+    def id_generation(self) -> int:
+        """Changes whenever doc ids may have been renumbered (a reload or rewrite)."""
+        return self._generation
+
+    def live_records(self) -> List[Tuple[int, Dict]]:
+        """(doc id, record) of every memory not retired."""
+        with self._lock:
+            return [(d, self._store.record(d)) for d in range(len(self._store)) if d not in self._retired]
+
+    def rewrite(self, transform: Callable[[List[Tuple[int, Dict]]], List[Dict]]) -> int:
+        """Replace the store with ``transform(live_records)`` and rebuild the indexes.
+
+        Runs under the lock, so writers wait; doc ids are renumbered and the
+        retired set is cleared. Returns the new memory count.
+        """
+        with self._lock:
+            records = transform(self.live_records())
+            self._store.replace(records)
+            self._retired = set()
+            self._retired_path.unlink(missing_ok=True)
+            if self.dense is not None:
+                self.dense.reset()
+            self._reload()
+            return len(self._store)
+
+    def _lexical(self, query: str, k: int, owner: str) -> List[Tuple[int, float]]:
+        if self._time_index is not None:
+            return self._time_index.search(owner, self._vectorize(query), k)
+        part = self._partitions.get(owner)
+        if part is None:
+            return []
+        return [(part.doc_ids[i], score) for i, score in part.index.search(self._vectorize(query), k)]
+
+    def _dense(self, qvec, k: int, owner: str) -> List[Tuple[int, float]]:
+        if not self.partition_key:
+            return self.dense.search(qvec, k)
+        # The ANN index is shared across partitions: over-fetch, then keep this owner's hits
+        hits = self.dense.search(qvec, k * 8)
+        return [(d, score) for d, score in hits if self._owners[d] == owner][:k]
+
+    def _hybrid(self, query: str, k: int, owner: str, qvec=None) -> List[Tuple[int, float]]:
+        pool = max(4 * k, 20)
+        qvec = self.dense.embed(query) if qvec is None else qvec
+        cand: Dict[int, None] = dict.fromkeys(d for d, _ in self._lexical(query, pool, owner))
+        cand.update(dict.fromkeys(d for d, _ in self._dense(qvec, pool, owner)))
+        if not cand:
+            return []
+        ids = list(cand)
+        qtokens = self.tokenizer.tokenize(query)
+        lexical = [self._bm25.score(qtokens, self.tokenizer.tokenize(self._store.text(d))) for d in ids]
+        top = max(lexical) or 1.0
+        dense = self.dense.score(qvec, ids)
+        a = self.hybrid_alpha
+        scored = [(a * lx / top + (1 - a) * dn, d) for d, lx, dn in zip(ids, lexical, dense)]
+        scored = [x for x in scored if x[0] > 0]
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [(d, score) for score, d in scored[:k]]
+
+    def search_scored(self, query: str, k: int | None = None, user: str | None = None, qvec=None) -> List[Tuple[int, float]]:
+        """(doc id, score) of the top hits, best first; ``qvec`` is the query's dense embedding when the caller already has it."""
+        k = self.top_k if k is None else k
+        # Over-fetch by the retired count so filtering them out still leaves k hits
+        fetch = k + len(self._retired)
+        owner = (user or "") if self.partition_key else ""
+        if self.retrieval == "dense":
+            hits = [(d, score) for d, score in self._dense(self.dense.embed(query) if qvec is None else qvec, fetch, owner) if score > 0]
+        elif self.retrieval == "hybrid":
+            hits = self._hybrid(query, fetch, owner, qvec)
+        else:
+            hits = self._lexical(query, fetch, owner)
+        if self._retired:
+            hits = [(d, score) for d, score in hits if d not in self._retired]
+        return hits[:k]
+
+    def search_ids(self, query: str, k: int | None = None, user: str | None = None, qvec=None) -> List[int]:
+        return [d for d, _ in self.search_scored(query, k, user, qvec)]
+
+    def search(self, query: str, user: str | None = None) -> List[str]:
+        # The query embedding is computed outside the lock so concurrent searches can be batched
+        qvec = self.dense.embed(query) if self.retrieval != "lexical" else None
+        with self._lock:
+            return [self._store.text(doc_id) for doc_id in self.search_ids(query, user=user, qvec=qvec)]
+
+    def search_batch(self, queries: List[str], user: str | None = None) -> List[List[str]]:
+        if self.retrieval != "lexical":
+            # One embedding call for all queries
+            qvecs = self.dense.embedder.embed_batch(list(queries)) if queries else []
+            with self._lock:
+                return [[self._store.text(d) for d in self.search_ids(q, user=user, qvec=v)] for q, v in zip(queries, qvecs)]
+        if self._time_index is not None:
+            # Each query walks the time partitions on its own, stopping early where it can
+            with self._lock:
+                return [[self._store.text(d) for d in self.search_ids(q, user=user)] for q in queries]
+        qvecs = [self._vectorize(q) for q in queries]
+        with self._lock:
+            part = self._partitions.get((user or "") if self.partition_key else "")
+            if part is None:
+                return [[] for _ in queries]
+            batch = part.index.search_batch(qvecs, self.top_k + len(self._retired))
+            ids = [[part.doc_ids[i] for i, _ in hits] for hits in batch]
+            if self._retired:
+                ids = [[d for d in hits if d not in self._retired][: self.top_k] for hits in ids]
+            return [[self._store.text(d) for d in hits] for hits in ids]
+
+    def close(self) -> None:
+        self._store.close()
+        if self.dense is not None:
+            self.dense.embedder.close()
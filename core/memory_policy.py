@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .llm_manager import LLMManager
+from .memory_manager import MemoryManager
+from .tokenizer import Tokenizer
+
+# Cues of stable, reusable facts (profile, preferences, goals); a fact without one is rarely worth keeping
+SALIENT_CUES = (
+    "我喜欢", "我不喜欢", "我讨厌", "我爱", "我习惯", "我过敏", "我的目标", "我想要", "我计划",
+    "我的生日", "我叫", "我的名字", "我住在", "我的城市", "我来自", "我今年", "我的工作", "我的职业",
+    "我是一名", "我的家人", "我的孩子", "我的爱好",
+    "i like", "i love", "i hate", "my name", "my birthday", "i live", "my goal", "i work", "i am allergic",
+)
+# Single-valued facts: a newer statement replaces the older one instead of adding to it.
+# Each cue must be followed by a value ("我叫了一份外卖" is not a name); text is casefolded first.
+_NAME = r"([\u4e00-\u9fff·]{1,6}|[a-z][a-z .'-]{0,30})(?:[，。！,.!\s]|$)"
+_PLACE = r"([\u4e00-\u9fff]{2,12}|[a-z][a-z .'-]{1,30})"
+_DATE = r"(\d{1,2}\s*月\s*\d{1,2}\s*[日号]|[一二三四五六七八九十]{1,2}月[一二三四五六七八九十]{1,3}[日号]|[a-z]+ \d{1,2}|\d{1,2}[/-]\d{1,2})"
+SLOT_PATTERNS = [
+    (re.compile(r"我叫(?![了过着醒起来去他她它你])\s*" + _NAME), "name"),
+    (re.compile(r"我的名字(?:是|叫)\s*" + _NAME), "name"),
+    (re.compile(r"\bmy name is " + _NAME), "name"),
+    (re.compile(r"我的生日(?:是|在)?\s*" + _DATE), "birthday"),
+    (re.compile(r"\bmy birthday is (?:on )?" + _DATE), "birthday"),
+    (re.compile(r"我住在(?![过了着])\s*" + _PLACE), "city"),
+    (re.compile(r"我的城市(?:是|在)\s*" + _PLACE), "city"),
+    (re.compile(r"\bi live in " + _PLACE), "city"),
+    (re.compile(r"我来自\s*" + _PLACE), "hometown"),
+    (re.compile(r"我今年\s*(\d{1,3}|[一二三四五六七八九十]{1,3})\s*岁"), "age"),
+    (re.compile(r"我的(?:工作|职业)(?:是)\s*(\S{2,})"), "job"),
+    (re.compile(r"我是一名\s*(\S{2,})"), "job"),
+    (re.compile(r"\bi work (?:as|at|for) (\S{2,})"), "job"),
+    (re.compile(r"我的目标(?:是)\s*(\S{2,})"), "goal"),
+    (re.compile(r"\bmy goal is (\S{2,})"), "goal"),
+]
+SIMHASH_BITS = 64
+
+
+@lru_cache(maxsize=65536)
+def _feature_hash(feature: str) -> int:
+    # Stable across processes (unlike hash()), so fingerprints can be stored with the record
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(tokens: Sequence[str]) -> int:
+    """64-bit SimHash over tokens and token bigrams; near-identical texts differ in few bits."""
+    weights: Dict[str, int] = {}
+    for i, tok in enumerate(tokens):
+        weights[tok] = weights.get(tok, 0) + 1
+        if i:
+            bigram = tokens[i - 1] + "\x1f" + tok
+            weights[bigram] = weights.get(bigram, 0) + 1
+    acc = [0] * SIMHASH_BITS
+    for feature, w in weights.items():
+        h = _feature_hash(feature)
+        for bit in range(SIMHASH_BITS):
+            acc[bit] += w if (h >> bit) & 1 else -w
+    out = 0
+    for bit, v in enumerate(acc):
+        if v > 0:
+            out |= 1 << bit
+    return out
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class SimHashIndex:
+    """Near-duplicate lookup for 64-bit fingerprints, per owner.
+
+    Fingerprints are split into ``bands`` exact-match tables. Two fingerprints
+    within ``bands - 1`` bits of each other agree on at least one band
+    (pigeonhole), so a lookup only compares candidates sharing a band.
+    """
+
+    def __init__(self, bands: int = 4) -> None:
+        self.bands = bands
+        self.width = SIMHASH_BITS // bands
+        self._tables: Dict[Tuple[str, int, int], List[int]] = {}
+        self._hashes: Dict[int, Tuple[str, int]] = {}
+
+    def _keys(self, owner: str, h: int) -> Iterable[Tuple[str, int, int]]:
+        mask = (1 << self.width) - 1
+        for band in range(self.bands):
+            yield owner, band, (h >> (band * self.width)) & mask
+
+    def add(self, owner: str, doc_id: int, h: int) -> None:
+        self._hashes[doc_id] = (owner, h)
+        for key in self._keys(owner, h):
+            self._tables.setdefault(key, []).append(doc_id)
+
+    def remove(self, doc_id: int) -> None:
+        owner, h = self._hashes.pop(doc_id, ("", 0))
+        for key in self._keys(owner, h):
+            ids = self._tables.get(key)
+            if ids and doc_id in ids:
+                ids.remove(doc_id)
+
+    def nearest(self, owner: str, h: int, max_distance: int) -> Optional[Tuple[int, int]]:
+        """(doc id, distance) of the closest fingerprint within ``max_distance`` (< bands), or None."""
+        best: Optional[Tuple[int, int]] = None
+        seen = set()
+        for key in self._keys(owner, h):
+            for doc_id in self._tables.get(key, ()):
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                d = hamming(h, self._hashes[doc_id][1])
+                if d <= max_distance and (best is None or d < best[1]):
+                    best = (doc_id, d)
+        return best
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+
+class Fact(NamedTuple):
+    text: str
+    importance: float
+    slot: Optional[str]
+
+
+class MemoryPolicy:
+    """Decides what reaches long-term memory, and keeps the store small.
+
+    ``add_memories`` takes user turns (the same ``(text, meta)`` items as
+    ``MemoryManager.add_memories``, so a MemoryWriter can drive it) and:
+
+    - extracts facts with ``LLMManager.summarize_batch`` and the memory prompt,
+      one call per batch;
+    - scores each fact's importance; facts below ``min_importance`` are dropped;
+    - skips near-duplicates of a memory of the same user (SimHash within
+      ``dup_distance`` bits), refreshing the existing one instead;
+    - treats single-valued facts (name, city, ...) as updates: the previous
+      value is retired from search.
+
+    The dedup and slot indexes hold doc ids, so they are rebuilt whenever the
+    store's ``id_generation`` changes (a rewrite, possibly by another process
+    sharing a sharded store).
+
+    ``consolidate`` rewrites the store: retired and superseded memories are
+    dropped, near-duplicates are folded into the newest copy, and each user
+    keeps at most ``max_per_user`` memories. Importance halves every
+    ``half_life_days`` since last seen; that only ranks memories unless
+    ``drop_below`` > 0, which also drops scored facts that decay below it.
+    The current value of a single-valued fact (a user's name) is never
+    decay-dropped, nor is a memory the policy did not score.
+    ``start`` runs it every ``interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        memory: MemoryManager,
+        llm: LLMManager,
+        memory_prompt: str = "",
+        min_importance: float = 0.5,
+        dup_distance: int = 3,
+        half_life_days: float = 30.0,
+        drop_below: float = 0.0,
+        max_per_user: int = 0,
+    ) -> None:
+        self.memory = memory
+        self.llm = llm
+        self.memory_prompt = memory_prompt
+        self.tokenizer: Tokenizer = memory.tokenizer
+        self.min_importance = min_importance
+        self.dup_distance = dup_distance
+        self.half_life = half_life_days * 86400.0
+        self.drop_below = drop_below
+        self.max_per_user = max_per_user
+        self.stats: Dict[str, Any] = {"turns": 0, "facts": 0, "written": 0, "duplicates": 0, "updated": 0, "dropped": 0, "consolidations": 0}
+        self._lock = threading.RLock()
+        # Reinforcements (last_seen, hits) of stored memories, persisted by the next consolidation
+        self._touched: Dict[int, Tuple[float, int]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rebuild()
+
+    # -- facts ----------------------------------------------------------------
+    def fingerprint(self, text: str) -> int:
+        return simhash(self.tokenizer.tokenize(text))
+
+    @staticmethod
+    def importance(text: str) -> float:
+        """Heuristic salience in [0, 1]: stable-fact cues, first person, some substance."""
+        lowered = text.casefold()
+        score = 0.1
+        if any(cue in lowered for cue in SALIENT_CUES):
+            score += 0.5
+        if "我" in text or lowered.startswith("i ") or " my " in f" {lowered} ":
+            score += 0.1
+        score += min(0.3, len(text) / 100)
+        return min(1.0, round(score, 3))
+
+    def fact(self, point: str) -> Optional[Fact]:
+        text = point.strip().lstrip("-•*0123456789.、) ").strip()
+        if not text:
+            return None
+        return Fact(text, self.importance(text), self.slot(text))
+
+    @staticmethod
+    def slot(text: str) -> Optional[str]:
+        """The single-valued fact ``text`` states, or None when there is none or it is ambiguous."""
+        lowered = text.casefold()
+        found = {name for pattern, name in SLOT_PATTERNS if pattern.search(lowered)}
+        # Two different slots in one fact: retiring either could lose the other, so update neither
+        return found.pop() if len(found) == 1 else None
+
+    def score(self, meta: Dict[str, Any], now: float) -> float:
+        """Importance decayed by the time since the memory was last seen."""
+        seen = float(meta.get("last_seen", meta.get("ts", now)))
+        return float(meta.get("importance", 0.5)) * 0.5 ** (max(0.0, now - seen) / self.half_life)
+
+    # -- writes ---------------------------------------------------------------
+    def _rebuild(self) -> None:
+        # Read before the records: a rewrite racing the rebuild then triggers another one
+        self._generation = self.memory.id_generation()
+        self._index = SimHashIndex()
+        self._slots: Dict[Tuple[str, str], int] = {}
+        for doc_id, record in self.memory.live_records():
+            meta = record.get("meta") or {}
+            owner = str(meta.get("user", ""))
+            fp = meta.get("simhash")
+            self._index.add(owner, doc_id, int(fp, 16) if fp else self.fingerprint(record.get("text", "")))
+            if meta.get("slot"):
+                self._slots[(owner, meta["slot"])] = doc_id
+
+    def _reinforce(self, doc_id: int, now: float) -> None:
+        hits = self._touched.get(doc_id, (now, 0))[1]
+        self._touched[doc_id] = (now, hits + 1)
+
+    def add_memories(self, items: Sequence[Tuple[str, Optional[Dict[str, Any]]]]) -> List[int]:
+        """Extract, dedup and store the facts of user turns; returns the new doc ids."""
+        if not items:
+            return []
+        extracted = self.llm.summarize_batch([text for text, _ in items], self.memory_prompt)
+        now = time.time()
+        with self._lock:
+            if self.memory.id_generation() != self._generation:
+                self._rebuild()
+                self._touched.clear()  # keyed by the old doc ids
+            self.stats["turns"] += len(items)
+            batch = SimHashIndex()
+            writes: List[Tuple[str, Dict[str, Any]]] = []
+            pending: List[Tuple[str, int, Optional[str]]] = []
+            retired: List[int] = []
+            for (_, meta), points in zip(items, extracted):
+                owner = str((meta or {}).get("user", ""))
+                for point in points:
+                    fact = self.fact(point)
+                    if fact is None:
+                        continue
+                    self.stats["facts"] += 1
+                    if fact.importance < self.min_importance:
+                        self.stats["dropped"] += 1
+                        continue
+                    fp = self.fingerprint(fact.text)
+                    near = self._index.nearest(owner, fp, self.dup_distance)
+                    if near is not None:
+                        self._reinforce(near[0], now)
+                        self.stats["duplicates"] += 1
+                        continue
+                    if batch.nearest(owner, fp, self.dup_distance) is not None:
+                        self.stats["duplicates"] += 1
+                        continue
+                    if fact.slot:
+                        old = self._slots.get((owner, fact.slot))
+                        if old is not None:
+                            retired.append(old)
+                            self.stats["updated"] += 1
+                    record_meta = dict(meta or {})
+                    record_meta.update({"type": "fact", "importance": fact.importance, "ts": round(now, 3), "simhash": f"{fp:016x}"})
+                    if fact.slot:
+                        record_meta["slot"] = fact.slot
+                    batch.add(owner, len(writes), fp)
+                    writes.append((fact.text, record_meta))
+                    pending.append((owner, fp, fact.slot))
+            doc_ids = self.memory.add_memories(writes)
+            if self.memory.id_generation() != self._generation:
+                # Renumbered by a rewrite while writing: the ids in ``retired`` may now name other
+                # memories, so leave superseded values to consolidation (it keeps the newest per slot)
+                self._rebuild()
+                self.stats["written"] += len(doc_ids)
+                return doc_ids
+            if retired:
+                self.memory.retire(retired)
+                for doc_id in retired:
+                    self._index.remove(doc_id)
+            for doc_id, (owner, fp, slot) in zip(doc_ids, pending):
+                self._index.add(owner, doc_id, fp)
+                if slot:
+                    self._slots[(owner, slot)] = doc_id
+            self.stats["written"] += len(doc_ids)
+            return doc_ids
+
+    # -- consolidation ----------------------------------------------------------
+    def consolidate(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Rewrite the store without retired, decayed, duplicate or over-cap memories."""
+        now = time.time() if now is None else now
+        report = {"before": 0, "after": 0, "decayed": 0, "duplicates": 0, "superseded": 0, "capped": 0}
+
+        def transform(live: List[Tuple[int, Dict]]) -> List[Dict]:
+            report["before"] = len(live)
+            kept: List[Dict] = []
+            index = SimHashIndex()
+            slots = set()
+            # Newest first, so the latest wording of a fact is the one kept
+            for doc_id, record in reversed(live):
+                meta = dict(record.get("meta") or {})
+                owner = str(meta.get("user", ""))
+                if doc_id in self._touched:
+                    seen, hits = self._touched[doc_id]
+                    meta["last_seen"] = round(seen, 3)
+                    meta["hits"] = int(meta.get("hits", 0)) + hits
+                slot = meta.get("slot")
+                if slot and (owner, slot) in slots:
+                    report["superseded"] += 1
+                    continue
+                # Only facts this policy scored may decay away; the newest value of a slot stays
+                if not slot and "importance" in meta and self.score(meta, now) < self.drop_below:
+                    report["decayed"] += 1
+                    continue
+                fp = int(meta["simhash"], 16) if meta.get("simhash") else self.fingerprint(record.get("text", ""))
+                near = index.nearest(owner, fp, self.dup_distance)
+                if near is not None:
+                    other = kept[near[0]]["meta"]
+                    other["hits"] = int(other.get("hits", 0)) + int(meta.get("hits", 0)) + 1
+                    report["duplicates"] += 1
+                    continue
+                meta["simhash"] = f"{fp:016x}"
+                if slot:
+                    slots.add((owner, slot))
+                index.add(owner, len(kept), fp)
+                kept.append({"text": record.get("text", ""), "meta": meta})
+            kept.reverse()
+            if self.max_per_user > 0:
+                kept = self._cap(kept, now, report)
+            report["after"] = len(kept)
+            return kept
+
+        with self._lock:
+            if self.memory.id_generation() != self._generation:
+                self._rebuild()
+                self._touched.clear()
+            self.memory.rewrite(transform)
+            self._touched.clear()
+            self._rebuild()
+            self.stats["consolidations"] += 1
+            self.stats["last_consolidation"] = dict(report)
+        return report
+
+    def _cap(self, records: List[Dict], now: float, report: Dict[str, int]) -> List[Dict]:
+        by_owner: Dict[str, List[int]] = {}
+        for i, record in enumerate(records):
+            by_owner.setdefault(str(record["meta"].get("user", "")), []).append(i)
+        drop = set()
+        for positions in by_owner.values():
+            if len(positions) > self.max_per_user:
+                # Current single-valued facts (name, birthday, ...) outrank everything else
+                ranked = sorted(positions, key=lambda i: (bool(records[i]["meta"].get("slot")), self.score(records[i]["meta"], now)), reverse=True)
+                drop.update(ranked[self.max_per_user:])
+        report["capped"] = len(drop)
+        return [r for i, r in enumerate(records) if i not in drop]
+
+    def start(self, interval: float) -> None:
+        """Consolidate every ``interval`` seconds on a daemon thread."""
+        if interval <= 0 or self._thread is not None:
+            return
+
+        def loop() -> None:
+            while not self._stop.wait(interval):
+                try:
+                    self.consolidate()
+                except Exception as exc:  # keep the job alive; surface via stats
+                    self.stats["last_error"] = repr(exc)
+
+        self._thread = threading.Thread(target=loop, name="memory-consolidation", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def make_memory_policy(config: Dict, memory: MemoryManager, llm: LLMManager, memory_prompt: str) -> Optional[MemoryPolicy]:
+    """MemoryPolicy from the ``memory_policy`` section (started when ``consolidate_interval`` > 0), or None."""
+    conf = config.get("memory_policy") or {}
+    if not conf.get("enabled", False):
+        return None
+    policy = MemoryPolicy(
+        memory,
+        llm,
+        memory_prompt,
+        min_importance=float(conf.get("min_importance", 0.5)),
+        dup_distance=int(conf.get("dup_distance", 3)),
+        half_life_days=float(conf.get("half_life_days", 30)),
+        drop_below=float(conf.get("drop_below", 0)),
+        max_per_user=int(conf.get("max_per_user", 0)),
+    )
+    policy.start(float(conf.get("consolidate_interval", 0)))
+    return policy
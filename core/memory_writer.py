@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import queue
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+from .memory_manager import MemoryManager
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .memory_policy import MemoryPolicy
+
+_STOP = object()
+
+
+class MemoryWriter:
+    """Background writer that batches ``add_memory`` calls off the reply path.
+
+    Items are flushed when ``batch_size`` are queued or ``flush_interval``
+    seconds pass, whichever comes first. ``flush()`` blocks until everything
+    submitted so far is persisted. ``memory`` is anything with
+    ``add_memories(items)``: a MemoryManager or a MemoryPolicy in front of one.
+    """
+
+    def __init__(self, memory: Union[MemoryManager, "MemoryPolicy"], batch_size: int = 16, flush_interval: float = 0.5) -> None:
+        self.memory = memory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.last_error: Optional[BaseException] = None
+        self._queue: "queue.Queue[object]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        self._queue.put((text, meta))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+            batch: List[Tuple[str, Optional[Dict[str, str]]]] = [item]  # type: ignore[list-item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)  # type: ignore[arg-type]
+            try:
+                self.memory.add_memories(batch)
+            except Exception as exc:  # keep the writer alive; surface via last_error
+                self.last_error = exc
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache import ResponseCache
+from .reasoning import ToolRouter, run_tool
+
+TOOLS = ("web_search", "summarize", "emotion_detect")
+# Words that order tool calls: whatever follows one runs in a later step
+_SEQUENCE_RE = re.compile(r"然后|接着|之后|随后|再|\b(?:and then|after that|then)\b", re.I)
+
+DEFAULT_TIMEOUTS = {"web_search": 5.0, "summarize": 2.0, "emotion_detect": 1.0}
+
+Plan = List[List[str]]
+
+
+class Planner:
+    """Turns one user message into ordered steps of tool calls.
+
+    Tool keywords are found with the router's automaton (same rules as
+    routing). Calls separated by a sequencing word ("然后", "then", ...) go to
+    successive steps; calls within one clause are independent and share a
+    step, so they run concurrently on ``executor``. ``max_steps`` counts every
+    reasoning step of the turn, the final reply included.
+    """
+
+    def __init__(self, router: Optional[ToolRouter] = None, max_steps: int = 3, executor: Optional["ToolExecutor"] = None) -> None:
+        self.router = router or ToolRouter()
+        self.max_steps = max_steps
+        self.executor = executor or ToolExecutor()
+
+    def plan(self, text: str, decision: str) -> Plan:
+        if decision == "llm":
+            return []
+        cuts = [m.start() for m in _SEQUENCE_RE.finditer(text or "")]
+        steps: Plan = []
+        clause = -1
+        for m in sorted(self.router.matcher.matches(text or ""), key=lambda m: m.start):
+            tool = m.rule.label
+            if tool not in TOOLS:
+                continue
+            current = sum(1 for c in cuts if c < m.start)
+            if current != clause or not steps:
+                steps.append([])
+                clause = current
+            if tool not in steps[-1]:
+                steps[-1].append(tool)
+        if not any(decision in step for step in steps):
+            # The router (e.g. the classifier) chose a tool the keywords do not show
+            steps = [[decision]]
+        return steps
+
+    def budget(self, steps_used: int) -> int:
+        """Tool steps still allowed, keeping one step for the reply."""
+        return max(0, self.max_steps - 1 - steps_used)
+
+
+class ToolExecutor:
+    """Runs the calls of one step concurrently with per-tool timeouts.
+
+    A call that times out is reported as such and its result dropped; the
+    worker thread itself cannot be interrupted and finishes in the background.
+    """
+
+    def __init__(self, timeouts: Optional[Dict[str, float]] = None, workers: int = 4) -> None:
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+        self.workers = workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _submit(self, fn, *args):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tool")
+        return self._pool.submit(fn, *args)
+
+    @staticmethod
+    def _timed(tool: str, tools: Dict[str, Any], query: str, context: List[str], cache: Optional[ResponseCache]):
+        t0 = time.perf_counter()
+        output, meta = run_tool(tool, tools, query, context, cache)
+        return output, meta, time.perf_counter() - t0
+
+    def run_step(
+        self,
+        step: int,
+        calls: List[str],
+        tools: Dict[str, Any],
+        query: str,
+        context: List[str],
+        cache: Optional[ResponseCache] = None,
+    ) -> Tuple[List[Tuple[str, str]], List[Dict[str, Any]]]:
+        """Outputs ``[(tool, output)]`` of the calls that finished, and one trace per call."""
+        started = time.perf_counter()
+        futures = [(tool, self._submit(self._timed, tool, tools, query, context, cache)) for tool in calls]
+        outputs: List[Tuple[str, str]] = []
+        traces: List[Dict[str, Any]] = []
+        for tool, future in futures:
+            deadline = self.timeouts.get(tool, self.timeouts.get("default", 5.0))
+            remaining = max(0.0, deadline - (time.perf_counter() - started))
+            try:
+                output, meta, elapsed = future.result(timeout=remaining)
+            except FutureTimeout:
+                traces.append({"tool": tool, "step": step, "status": "timeout", "ms": round(deadline * 1000, 3)})
+                continue
+            except Exception as exc:
+                traces.append({"tool": tool, "step": step, "status": "error", "error": str(exc)})
+                continue
+            outputs.append((tool, output))
+            traces.append({**meta, "step": step, "status": "ok", "ms": round(elapsed * 1000, 3)})
+        return outputs, traces
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+def make_planner(config: Dict, router: ToolRouter) -> Planner:
+    """Planner from the ``reasoning`` config; ``router`` supplies the tool keywords."""
+    conf = config.get("reasoning") or {}
+    executor = ToolExecutor(
+        timeouts={k: float(v) for k, v in (conf.get("tool_timeouts") or {}).items()},
+        workers=int(conf.get("tool_workers", 4)),
+    )
+    return Planner(router, max_steps=int(conf.get("max_steps", 3)), executor=executor)
@@ -1,38 +1,67 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+
+from .cache import ResponseCache, normalize_key
+from .keyword_matcher import KeywordMatcher, KeywordRules, parse_rules
+
+
+# Earlier rules win when several match; config rules may add priorities
+DEFAULT_ROUTER_RULES = {
+    "web_search": ["搜索", "查", "新闻"],
+    "summarize": ["总结", "概括"],
+    "emotion_detect": ["心情", "情绪"],
+}
 
 
 class ToolRouter:
     """Simple heuristic tool selection:
     - Select web_search/summarize/emotion_detect when keywords are present
     - Otherwise use direct LLM response
+    Keywords are scanned in one pass by a shared Aho–Corasick automaton; with
+    ``rules`` the ``router`` set from settings.yaml replaces the defaults.
     """
 
-    def __init__(self) -> None:
-        self.rules = [
-            ("搜索", "web_search"), ("查", "web_search"), ("新闻", "web_search"),
-            ("总结", "summarize"), ("概括", "summarize"),
-            ("心情", "emotion_detect"), ("情绪", "emotion_detect"),
-        ]
+    def __init__(self, rules: Optional[KeywordRules] = None) -> None:
+        self.keyword_rules = rules
+        self._default = KeywordMatcher(parse_rules(DEFAULT_ROUTER_RULES))
+
+    @property
+    def matcher(self) -> KeywordMatcher:
+        matcher = self.keyword_rules.matcher("router") if self.keyword_rules is not None else None
+        return matcher if matcher is not None else self._default
 
     def select(self, user_text: str) -> str:
-        text = user_text or ""
-        for kw, tool in self.rules:
-            if kw in text:
-                return tool
-        return "llm"
+        rule = self.matcher.best(user_text or "")
+        return rule.label if rule is not None else "llm"
+
+    def route(self, user_text: str) -> Tuple[str, int]:
+        """Label plus reasoning steps spent on routing (always 0 here)."""
+        return self.select(user_text), 0
 
 
-def run_tool(tool_name: str, tools: Dict[str, Any], query: str, context: List[str]) -> Tuple[str, Dict[str, Any]]:
-    if tool_name == "web_search":
-        result = tools["web_search"].run(query)
-        return result, {"tool": tool_name}
+def _tool_input(tool_name: str, query: str, context: List[str]) -> str:
     if tool_name == "summarize":
-        result = tools["summarize"].run("\n".join(context) or query)
-        return result, {"tool": tool_name}
-    if tool_name == "emotion_detect":
-        result = tools["emotion_detect"].run(query)
-        return result, {"tool": tool_name}
-    return "", {"tool": "none"}
+        return "\n".join(context) or query
+    return query
+
 
+def run_tool(
+    tool_name: str,
+    tools: Dict[str, Any],
+    query: str,
+    context: List[str],
+    cache: Optional[ResponseCache] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    if tool_name not in {"web_search", "summarize", "emotion_detect"}:
+        return "", {"tool": "none"}
+    tool_input = _tool_input(tool_name, query, context)
+    if cache is not None:
+        normalized = normalize_key(tool_input)
+        result = cache.get(tool_name, tool_input, normalized)
+        if result is not None:
+            return result, {"tool": tool_name, "cached": True}
+    result = tools[tool_name].run(tool_input)
+    if cache is not None:
+        cache.put(tool_name, tool_input, result, normalized)
+    return result, {"tool": tool_name}
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import heapq
+import math
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+Hits = List[Tuple[int, float]]
+
+
+def _norm(vec: Dict[str, float]) -> float:
+    return math.sqrt(sum(v * v for v in vec.values()))
+
+
+def _rank_key(score: float) -> float:
+    # Scores within 1e-12 count as ties so both backends agree on ordering
+    return round(score, 12)
+
+
+class ScoringBackend:
+    """Cosine scoring over term-frequency vectors keyed by dense doc ids."""
+
+    name = "base"
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def add(self, doc_id: int, vec: Dict[str, float]) -> None:
+        raise NotImplementedError
+
+    def search(self, qvec: Dict[str, float], k: int) -> Hits:
+        return self.search_batch([qvec], k)[0]
+
+    def search_batch(self, qvecs: Sequence[Dict[str, float]], k: int) -> List[Hits]:
+        return [self.search(q, k) for q in qvecs]
+
+
+class PythonBackend(ScoringBackend):
+    """Term -> posting list index over precomputed term vectors and norms.
+
+    Scoring only touches the postings of query terms, so a query costs
+    O(sum of posting lengths) instead of O(corpus).
+    """
+
+    name = "python"
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        self.norms: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self.norms)
+
+    def add(self, doc_id: int, vec: Dict[str, float]) -> None:
+        for term, weight in vec.items():
+            self.postings.setdefault(term, []).append((doc_id, weight))
+        self.norms.extend([0.0] * (doc_id + 1 - len(self.norms)))
+        self.norms[doc_id] = _norm(vec)
+
+    def search(self, qvec: Dict[str, float], k: int) -> Hits:
+        qnorm = _norm(qvec)
+        if qnorm == 0:
+            return []
+        dots: Dict[int, float] = {}
+        for term, qw in qvec.items():
+            for doc_id, dw in self.postings.get(term, ()):
+                dots[doc_id] = dots.get(doc_id, 0.0) + qw * dw
+        norms = self.norms
+        scored = ((doc_id, dot / (qnorm * norms[doc_id])) for doc_id, dot in dots.items() if norms[doc_id])
+        # doc_id in the key: ties resolve to the earlier memory, like a stable sort over file order
+        top = heapq.nlargest(k, scored, key=lambda x: (_rank_key(x[1]), -x[0]))
+        return [(doc_id, score) for doc_id, score in top if score > 0]
+
+    def search_batch(self, qvecs: Sequence[Dict[str, float]], k: int) -> List[Hits]:
+        return [self.search(q, k) for q in qvecs]
+
+
+class _Growable:
+    """Append-only numpy array with capacity doubling."""
+
+    def __init__(self, dtype, capacity: int = 1024) -> None:
+        self.buf = np.zeros(capacity, dtype=dtype)
+        self.n = 0
+
+    def extend(self, values) -> None:
+        need = self.n + len(values)
+        if need > len(self.buf):
+            cap = len(self.buf)
+            while cap < need:
+                cap *= 2
+            grown = np.zeros(cap, dtype=self.buf.dtype)
+            grown[: self.n] = self.buf[: self.n]
+            self.buf = grown
+        self.buf[self.n:need] = values
+        self.n = need
+
+    def view(self):
+        return self.buf[: self.n]
+
+
+class NumpyBackend(ScoringBackend):
+    """Corpus stored as a CSR term-frequency matrix with precomputed row norms.
+
+    A batch of queries is scored as one sparse mat-vec against the query-term
+    columns, and the top-k is selected with ``argpartition``.
+    """
+
+    name = "numpy"
+
+    def __init__(self) -> None:
+        if np is None:
+            raise ImportError("NumpyBackend requires numpy")
+        self.vocab: Dict[str, int] = {}
+        self._indptr = _Growable(np.int64)
+        self._indptr.extend([0])
+        self._indices = _Growable(np.int64)
+        # Row id of each nonzero (CSR indptr expanded) for bincount reductions
+        self._rows = _Growable(np.int64)
+        self._data = _Growable(np.float64)
+        self._norms = _Growable(np.float64)
+
+    def __len__(self) -> int:
+        return self._norms.n
+
+    def add(self, doc_id: int, vec: Dict[str, float]) -> None:
+        # Docs without an id slot yet (e.g. skipped records) become empty rows
+        while len(self) < doc_id:
+            self._indptr.extend([self._indices.n])
+            self._norms.extend([0.0])
+        cols = [self.vocab.setdefault(t, len(self.vocab)) for t in vec]
+        self._indices.extend(cols)
+        self._rows.extend([doc_id] * len(cols))
+        self._data.extend(list(vec.values()))
+        self._indptr.extend([self._indices.n])
+        self._norms.extend([_norm(vec)])
+
+    def search_batch(self, qvecs: Sequence[Dict[str, float]], k: int) -> List[Hits]:
+        n = len(self)
+        results: List[Hits] = [[] for _ in qvecs]
+        live = [i for i, q in enumerate(qvecs) if _norm(q) > 0 and any(t in self.vocab for t in q)]
+        if n == 0 or k <= 0 or not live:
+            return results
+
+        # Dense query block restricted to query terms: row 0 is the zero row for
+        # corpus terms that no query uses.
+        remap = np.zeros(len(self.vocab), dtype=np.int64)
+        terms: Dict[str, int] = {}
+        for i in live:
+            for t in qvecs[i]:
+                if t in self.vocab and t not in terms:
+                    terms[t] = len(terms) + 1
+                    remap[self.vocab[t]] = terms[t]
+        qmat = np.zeros((len(terms) + 1, len(live)), dtype=np.float64)
+        qnorms = np.zeros(len(live), dtype=np.float64)
+        for j, i in enumerate(live):
+            for t, w in qvecs[i].items():
+                if t in terms:
+                    qmat[terms[t], j] = w
+            qnorms[j] = _norm(qvecs[i])
+
+        indices = self._indices.view()
+        # Only nonzeros in query-term columns contribute to the mat-vec
+        sel = np.nonzero(remap[indices])[0]
+        rows = self._rows.view()[sel]
+        contrib = self._data.view()[sel, None] * qmat[remap[indices[sel]]]
+        norms = self._norms.view()
+        for j, i in enumerate(live):
+            dots = np.bincount(rows, weights=contrib[:, j], minlength=n)
+            denom = norms * qnorms[j]
+            scores = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+            results[i] = self._top_k(scores, k)
+        return results
+
+    @staticmethod
+    def _top_k(col, k: int) -> Hits:
+        kk = min(k, len(col))
+        kth = col[np.argpartition(-col, kk - 1)[kk - 1]]
+        # Keep every doc tied with the k-th score, then order stably by doc id
+        cand = np.nonzero((col >= kth - 1e-12) & (col > 0))[0]
+        order = np.lexsort((cand, -np.round(col[cand], 12)))
+        return [(int(d), float(col[d])) for d in cand[order][:k]]
+
+
+class BM25:
+    """Okapi BM25 corpus statistics, fed from the same term vectors as the index.
+
+    Document length is measured in distinct terms so the statistics can be
+    rebuilt from stored vectors without re-reading memory texts.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.df: Dict[str, int] = {}
+        self.n = 0
+        self.total_len = 0
+
+    def add(self, vec: Dict[str, float]) -> None:
+        for term in vec:
+            self.df[term] = self.df.get(term, 0) + 1
+        self.n += 1
+        self.total_len += len(vec)
+
+    def score(self, query_tokens: Sequence[str], doc_tokens: Sequence[str]) -> float:
+        if not self.n:
+            return 0.0
+        counts: Dict[str, int] = {}
+        for t in doc_tokens:
+            counts[t] = counts.get(t, 0) + 1
+        dl = len(counts)
+        avgdl = self.total_len / self.n or 1.0
+        score = 0.0
+        for term in set(query_tokens):
+            f = counts.get(term, 0)
+            if not f:
+                continue
+            df = self.df.get(term, 0)
+            idf = math.log(1 + (self.n - df + 0.5) / (df + 0.5))
+            score += idf * f * (self.k1 + 1) / (f + self.k1 * (1 - self.b + self.b * dl / avgdl))
+        return score
+
+
+BACKENDS = {"python": PythonBackend, "numpy": NumpyBackend}
+
+
+def make_backend(name: str = "auto") -> ScoringBackend:
+    """Create a scoring backend; NumPy backends fall back to pure Python when NumPy is missing."""
+    name = (name or "auto").lower()
+    if name == "auto":
+        name = "numpy" if np is not None else "python"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown scoring backend: {name}")
+    if name == "numpy" and np is None:
+        return PythonBackend()
+    return BACKENDS[name]()
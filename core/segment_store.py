@@ -0,0 +1,469 @@
+"""Binary segment storage for long-term memories.
+
+Layout of a segment file (little endian)::
+
+    header   : magic(8s) count(u32) records_off(u64) offsets_off(u64) vectors_off(u64)
+    records  : [len(u32) utf-8 json bytes] * count
+    offsets  : [record_off(u64) vector_off(u64)] * count
+    vectors  : [nterms(u32) [term_len(u16) term bytes weight(f64)] * nterms] * count
+
+Segments are immutable and opened with mmap, so nothing is parsed until a
+record or vector is actually requested. New memories go to a write-ahead log
+and are sealed into a segment every ``seal_every`` records.
+``MANIFEST`` lists live segments in doc-id order plus the current WAL, and is
+replaced atomically. Sealing switches to a fresh WAL before publishing the
+MANIFEST, so after a crash either the old WAL and no new segment, or the new
+segment and an empty WAL, are live; records are never replayed twice.
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+MAGIC = b"HERSEG01"
+HEADER = struct.Struct("<8sIQQQ")
+U32 = struct.Struct("<I")
+OFFSET = struct.Struct("<QQ")
+TERM_HEAD = struct.Struct("<H")
+WEIGHT = struct.Struct("<d")
+WAL_FRAME = struct.Struct("<II")  # payload length, crc32
+
+Vectorize = Callable[[str], Dict[str, float]]
+
+
+def _encode_record(record: Dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False).encode("utf-8")
+
+
+def _encode_vector(vec: Dict[str, float]) -> bytes:
+    parts = [U32.pack(len(vec))]
+    for term, weight in vec.items():
+        raw = term.encode("utf-8")
+        parts.append(TERM_HEAD.pack(len(raw)))
+        parts.append(raw)
+        parts.append(WEIGHT.pack(weight))
+    return b"".join(parts)
+
+
+def write_segment(path: Path, records: Iterable[bytes], vectors: Iterable[bytes]) -> int:
+    """Write encoded records/vectors to ``path`` atomically; returns the record count."""
+    records = list(records)
+    vectors = list(vectors)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("wb") as f:
+        f.write(b"\0" * HEADER.size)
+        records_off = f.tell()
+        rec_offsets = []
+        for raw in records:
+            rec_offsets.append(f.tell())
+            f.write(U32.pack(len(raw)))
+            f.write(raw)
+        offsets_off = f.tell()
+        f.write(b"\0" * (OFFSET.size * len(records)))
+        vectors_off = f.tell()
+        vec_offsets = []
+        for raw in vectors:
+            vec_offsets.append(f.tell())
+            f.write(raw)
+        f.seek(offsets_off)
+        f.write(b"".join(OFFSET.pack(r, v) for r, v in zip(rec_offsets, vec_offsets)))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(records), records_off, offsets_off, vectors_off))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(records)
+
+
+class Segment:
+    """Read-only, mmap-backed view of one segment file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = path.open("rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, _, self._offsets_off, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a memory segment: {path}")
+        self._view = memoryview(self._mm)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _offsets(self, i: int) -> Tuple[int, int]:
+        return OFFSET.unpack_from(self._mm, self._offsets_off + i * OFFSET.size)
+
+    def raw_record(self, i: int) -> memoryview:
+        """Zero-copy view of the encoded record bytes."""
+        off, _ = self._offsets(i)
+        (size,) = U32.unpack_from(self._mm, off)
+        return self._view[off + U32.size: off + U32.size + size]
+
+    def raw_vector(self, i: int) -> memoryview:
+        _, off = self._offsets(i)
+        end = self._offsets(i + 1)[1] if i + 1 < self.count else len(self._mm)
+        return self._view[off:end]
+
+    def record(self, i: int) -> Dict:
+        return json.loads(bytes(self.raw_record(i)).decode("utf-8"))
+
+    def vector(self, i: int) -> Dict[str, float]:
+        _, off = self._offsets(i)
+        mm = self._mm
+        (nterms,) = U32.unpack_from(mm, off)
+        off += U32.size
+        vec: Dict[str, float] = {}
+        for _ in range(nterms):
+            (size,) = TERM_HEAD.unpack_from(mm, off)
+            off += TERM_HEAD.size
+            term = mm[off:off + size].decode("utf-8")
+            off += size
+            (vec[term],) = WEIGHT.unpack_from(mm, off)
+            off += WEIGHT.size
+        return vec
+
+    def close(self) -> None:
+        try:
+            self._view.release()
+            self._mm.close()
+        except (BufferError, ValueError):
+            # Still referenced by an outstanding memoryview; let GC reclaim it
+            pass
+        self._file.close()
+
+
+class WriteAheadLog:
+    """Append-only log of crc-framed records; a torn tail is dropped on replay."""
+
+    def __init__(self, path: Path, fsync: bool = False) -> None:
+        self.path = path
+        self.fsync = fsync
+        self.path.touch(exist_ok=True)
+
+    def append(self, payload: bytes) -> None:
+        with self.path.open("ab") as f:
+            f.write(WAL_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def replay(self) -> List[bytes]:
+        data = self.path.read_bytes()
+        out: List[bytes] = []
+        pos = 0
+        while pos + WAL_FRAME.size <= len(data):
+            size, crc = WAL_FRAME.unpack_from(data, pos)
+            payload = data[pos + WAL_FRAME.size: pos + WAL_FRAME.size + size]
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                break
+            out.append(payload)
+            pos += WAL_FRAME.size + size
+        if pos != len(data):
+            with self.path.open("r+b") as f:
+                f.truncate(pos)
+        return out
+
+
+class SegmentStore:
+    """Immutable mmap'd segments plus a small write-ahead log.
+
+    Doc ids are positions in (segments in manifest order) + (WAL records), and
+    stay stable across sealing and compaction because both preserve order.
+    ``vector_tag`` names the tokenizer that produced the stored vectors; when it
+    changes, vectors are recomputed from text instead of read from disk.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        vectorize: Vectorize,
+        vector_tag: str = "",
+        seal_every: int = 1024,
+        max_segments: int = 8,
+        fsync: bool = False,
+    ) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.vectorize = vectorize
+        self.vector_tag = vector_tag
+        self.seal_every = seal_every
+        self.max_segments = max_segments
+        self._lock = threading.RLock()
+        self._compactor: Optional[threading.Thread] = None
+        self.fsync = fsync
+        self._manifest = self._read_manifest()
+        # Stores written before WAL rotation name no WAL in the MANIFEST
+        self._wal = WriteAheadLog(self.root / self._manifest.get("wal", "wal.log"), fsync=fsync)
+        # Iterations in progress, and replaced segments waiting for them to finish before closing
+        self._readers = 0
+        self._closing: List[Segment] = []
+        self._segments: List[Segment] = [Segment(self.root / name) for name in self._manifest["segments"]]
+        self._starts: List[int] = []
+        self._recount()
+        self._remove_orphans()
+        self._pending: List[bytes] = self._wal.replay()
+        if self._segments and self._manifest.get("vector_tag") != self.vector_tag:
+            # Tokenizer changed: rewrite stored vectors in the background
+            self.compact(background=True)
+
+    # -- manifest -----------------------------------------------------------
+    def _read_manifest(self) -> Dict:
+        path = self.root / "MANIFEST"
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))
+        return {"segments": [], "next_seq": 1, "vector_tag": self.vector_tag}
+
+    def _write_manifest(self) -> None:
+        path = self.root / "MANIFEST"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._manifest), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _remove_orphans(self) -> None:
+        live = set(self._manifest["segments"])
+        live.add(self._wal.path.name)
+        for p in list(self.root.glob("seg-*")) + list(self.root.glob("wal*.log")):
+            if p.name not in live:
+                p.unlink(missing_ok=True)
+
+    def _publish(self, segments: List[Segment], new_wal: bool) -> None:
+        """Make ``segments`` the live set in the MANIFEST, optionally with a fresh, empty WAL."""
+        old_wal = None
+        if new_wal:
+            old_wal = self._wal
+            wal = WriteAheadLog(self.root / f"wal-{self._manifest['next_seq']:08d}.log", fsync=self.fsync)
+            self._manifest["next_seq"] += 1
+            self._manifest["wal"] = wal.path.name
+        self._segments = segments
+        self._manifest["segments"] = [seg.path.name for seg in segments]
+        self._write_manifest()
+        if old_wal is not None:
+            self._wal = wal
+            self._pending = []
+            old_wal.path.unlink(missing_ok=True)
+        self._recount()
+
+    def _release(self, segments: List[Segment]) -> None:
+        """Delete and close segments no longer in the MANIFEST (after any running iteration)."""
+        for seg in segments:
+            try:
+                seg.path.unlink(missing_ok=True)
+            except OSError:
+                pass
+        with self._lock:
+            self._closing.extend(segments)
+            if not self._readers:
+                self._close_released()
+
+    def _close_released(self) -> None:
+        for seg in self._closing:
+            seg.close()
+        self._closing = []
+
+    def _recount(self) -> None:
+        self._starts = []
+        total = 0
+        for seg in self._segments:
+            self._starts.append(total)
+            total += len(seg)
+        self._sealed = total
+
+    def _next_name(self) -> str:
+        seq = self._manifest["next_seq"]
+        self._manifest["next_seq"] = seq + 1
+        return f"seg-{seq:08d}.seg"
+
+    # -- reads --------------------------------------------------------------
+    def __len__(self) -> int:
+        return self._sealed + len(self._pending)
+
+    @property
+    def imported(self) -> bool:
+        """Whether ``import_records`` ran, so a one-shot import is not repeated on an emptied store."""
+        return bool(self._manifest.get("imported"))
+
+    def _locate(self, doc_id: int) -> Tuple[Optional[Segment], int]:
+        if doc_id >= self._sealed:
+            return None, doc_id - self._sealed
+        i = bisect.bisect_right(self._starts, doc_id) - 1
+        return self._segments[i], doc_id - self._starts[i]
+
+    def record(self, doc_id: int) -> Dict:
+        with self._lock:
+            seg, i = self._locate(doc_id)
+            raw = seg.raw_record(i) if seg is not None else self._pending[i]
+            return json.loads(bytes(raw).decode("utf-8"))
+
+    def text(self, doc_id: int) -> str:
+        return self.record(doc_id).get("text", "")
+
+    def vector(self, doc_id: int) -> Dict[str, float]:
+        """Term vector of one memory, read from its segment when the tokenizer matches."""
+        with self._lock:
+            seg, i = self._locate(doc_id)
+            if seg is not None and self._manifest.get("vector_tag") == self.vector_tag:
+                return seg.vector(i)
+        return self.vectorize(self.text(doc_id))
+
+    def iter_records(self) -> Iterator[Dict]:
+        for doc_id in range(len(self)):
+            yield self.record(doc_id)
+
+    def iter_vectors(self) -> Iterator[Tuple[int, Dict[str, float]]]:
+        with self._lock:
+            segments = list(self._segments)
+            pending = list(self._pending)
+            self._readers += 1
+        try:
+            stored = self._manifest.get("vector_tag") == self.vector_tag
+            doc_id = 0
+            for seg in segments:
+                for i in range(len(seg)):
+                    if stored:
+                        yield doc_id, seg.vector(i)
+                    else:
+                        yield doc_id, self.vectorize(seg.record(i).get("text", ""))
+                    doc_id += 1
+            for raw in pending:
+                yield doc_id, self.vectorize(json.loads(raw.decode("utf-8")).get("text", ""))
+                doc_id += 1
+        finally:
+            with self._lock:
+                self._readers -= 1
+                if not self._readers:
+                    self._close_released()
+
+    # -- writes -------------------------------------------------------------
+    def append(self, record: Dict) -> int:
+        payload = _encode_record(record)
+        with self._lock:
+            self._wal.append(payload)
+            self._pending.append(payload)
+            doc_id = len(self) - 1
+            if len(self._pending) >= self.seal_every:
+                self.seal()
+        return doc_id
+
+    def seal(self) -> None:
+        """Move WAL records into a new immutable segment."""
+        with self._lock:
+            if not self._pending:
+                return
+            texts = [json.loads(raw.decode("utf-8")).get("text", "") for raw in self._pending]
+            name = self._next_name()
+            write_segment(
+                self.root / name,
+                self._pending,
+                (_encode_vector(self.vectorize(t)) for t in texts),
+            )
+            self._publish(self._segments + [Segment(self.root / name)], new_wal=True)
+            if len(self._segments) > self.max_segments:
+                self.compact(background=True)
+
+    def compact(self, background: bool = False) -> None:
+        """Merge all sealed segments into one; raw bytes are copied without re-parsing."""
+        if background:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self.compact, name="segment-compactor", daemon=True)
+            self._compactor.start()
+            return
+        with self._lock:
+            segments = list(self._segments)
+            retag = self._manifest.get("vector_tag") != self.vector_tag
+            if len(segments) < 2 and not (segments and retag):
+                return
+            name = self._next_name()
+        # Heavy copying happens outside the lock; sealed segments are immutable
+        records = (bytes(seg.raw_record(i)) for seg in segments for i in range(len(seg)))
+        if retag:
+            vectors = [
+                _encode_vector(self.vectorize(seg.record(i).get("text", ""))) for seg in segments for i in range(len(seg))
+            ]
+        else:
+            vectors = [bytes(seg.raw_vector(i)) for seg in segments for i in range(len(seg))]
+        write_segment(self.root / name, records, vectors)
+        with self._lock:
+            # Segments sealed while merging stay after the merged one
+            tail = self._segments[len(segments):]
+            self._manifest["vector_tag"] = self.vector_tag
+            self._publish([Segment(self.root / name)] + tail, new_wal=False)
+        self._release(segments)
+
+    def replace(self, records: Sequence[Dict]) -> None:
+        """Swap the whole contents for ``records`` in one new segment; doc ids are renumbered."""
+        self.wait_for_compaction()
+        with self._lock:
+            old = list(self._segments)
+            name = self._next_name()
+            write_segment(
+                self.root / name,
+                (_encode_record(r) for r in records),
+                (_encode_vector(self.vectorize(r.get("text", ""))) for r in records),
+            )
+            self._manifest["vector_tag"] = self.vector_tag
+            self._publish([Segment(self.root / name)], new_wal=True)
+        self._release(old)
+
+    def import_records(self, records: Iterable[Dict]) -> int:
+        """Append ``records`` as one new segment and mark the store imported; returns records written."""
+        encoded: List[bytes] = []
+        vectors: List[bytes] = []
+        for record in records:
+            encoded.append(_encode_record(record))
+            vectors.append(_encode_vector(self.vectorize(record.get("text", ""))))
+        with self._lock:
+            self.seal()
+            segments = list(self._segments)
+            if encoded:
+                name = self._next_name()
+                write_segment(self.root / name, encoded, vectors)
+                segments.append(Segment(self.root / name))
+            # Published with the segment in one MANIFEST write: a crash leaves neither
+            self._manifest["imported"] = True
+            self._publish(segments, new_wal=False)
+        return len(encoded)
+
+    def wait_for_compaction(self) -> None:
+        if self._compactor is not None:
+            self._compactor.join()
+
+    def close(self) -> None:
+        self.wait_for_compaction()
+        with self._lock:
+            for seg in self._segments:
+                seg.close()
+            self._segments = []
+            self._close_released()
+
+
+def migrate_jsonl(jsonl_path: str | Path, store: SegmentStore) -> int:
+    """One-shot import of a memories.jsonl file into a single segment; returns records written."""
+    records: List[Dict] = []
+    with Path(jsonl_path).open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return store.import_records(records)
+
+
+def export_jsonl(store: SegmentStore, jsonl_path: str | Path) -> int:
+    """Write every stored record back out as jsonl; returns records written."""
+    n = 0
+    with Path(jsonl_path).open("w", encoding="utf-8") as f:
+        for obj in store.iter_records():
+            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            n += 1
+    return n
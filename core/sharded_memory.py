@@ -0,0 +1,246 @@
+"""Long-term memory split into shards that several processes can share.
+
+Memories hash to one of ``shards`` jsonl stores by a meta field
+(``shard_key``, e.g. the user), so one user's memories live in one shard
+and writers to different shards never contend. Each shard directory holds a
+``LOCK`` file: appends, retires and rewrites take it exclusively (after
+catching up on what other processes wrote), and readers take it shared
+while they pick up new lines. Searches scoped to a user touch only that
+user's shard; unscoped searches fan out across shards on a thread pool and
+the per-shard top-k lists are merged with a heap.
+
+Doc ids are global: ``local_id * shards + shard``. Lexical scores are
+computed per shard, so merged rankings use per-shard corpus statistics.
+Shards are always jsonl with lexical retrieval; the segment store and the
+dense vector files are single-writer.
+"""
+from __future__ import annotations
+
+import contextlib
+import heapq
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover
+    fcntl = None  # Not POSIX: locks only serialize threads of this process
+
+from .memory_manager import MemoryManager
+from .time_index import TierSpec
+from .tokenizer import Tokenizer, get_tokenizer
+
+
+class _Shard:
+    """One shard's MemoryManager plus its inter-process lock."""
+
+    def __init__(self, root: Path, memory: MemoryManager) -> None:
+        self.root = root
+        self.memory = memory
+        self._mutex = threading.RLock()  # flock is per open file, so threads need their own lock
+        self._fd = os.open(root / "LOCK", os.O_RDWR | os.O_CREAT, 0o644)
+        self._seen: Tuple[int, ...] = ()
+
+    def _signature(self) -> Tuple[int, ...]:
+        sig = []
+        for path in (self.memory.persist_path, self.memory.persist_path.with_suffix(".retired")):
+            try:
+                st = os.stat(path)
+                sig += [st.st_ino, st.st_size, st.st_mtime_ns]
+            except OSError:
+                sig += [0, -1, 0]
+        return tuple(sig)
+
+    @contextlib.contextmanager
+    def locked(self, exclusive: bool = True) -> Iterator[None]:
+        with self._mutex:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def catch_up(self) -> None:
+        """Index other processes' writes; call with the lock held."""
+        self.memory.sync()
+        self._seen = self._signature()
+
+    def refresh(self) -> None:
+        # A stat per file when nothing changed; the lock is only taken to read new data
+        if self._signature() == self._seen:
+            return
+        with self.locked(exclusive=False):
+            self.catch_up()
+
+    def close(self) -> None:
+        self.memory.close()
+        os.close(self._fd)
+
+
+class ShardedMemory:
+    """MemoryManager-compatible store over ``shards`` process-shared shards."""
+
+    def __init__(
+        self,
+        root: str,
+        shards: int = 4,
+        shard_key: str = "user",
+        top_k: int = 4,
+        backend: str = "auto",
+        tokenizer: str | Tokenizer = "cjk",
+        partition_key: str | None = None,
+        search_threads: int = 0,
+        tiers: TierSpec | None = None,
+    ) -> None:
+        self.root = Path(root)
+        self.num_shards = max(1, shards)
+        self.shard_key = shard_key
+        self.top_k = top_k
+        self.tokenizer = get_tokenizer(tokenizer) if isinstance(tokenizer, str) else tokenizer
+        self.partition_key = partition_key
+        self._shards: List[_Shard] = []
+        for i in range(self.num_shards):
+            shard_root = self.root / f"shard-{i:02d}"
+            shard_root.mkdir(parents=True, exist_ok=True)
+            memory = MemoryManager(
+                str(shard_root / "memories.jsonl"),
+                top_k=top_k,
+                backend=backend,
+                tokenizer=self.tokenizer,
+                partition_key=partition_key,
+                tiers=tiers,
+            )
+            self._shards.append(_Shard(shard_root, memory))
+        for shard in self._shards:
+            shard.refresh()
+        threads = search_threads or min(self.num_shards, os.cpu_count() or 1)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="memory-shard") if threads > 1 else None
+
+    # -- ids and routing ------------------------------------------------------
+    def shard_of(self, meta: Optional[Dict[str, Any]]) -> int:
+        key = str((meta or {}).get(self.shard_key) or "")
+        return zlib.crc32(key.encode("utf-8")) % self.num_shards
+
+    def _gid(self, shard: int, local: int) -> int:
+        return local * self.num_shards + shard
+
+    def _split(self, doc_id: int) -> Tuple[int, int]:
+        return doc_id % self.num_shards, doc_id // self.num_shards
+
+    def _targets(self, user: str | None) -> List[int]:
+        if self.partition_key and self.partition_key == self.shard_key:
+            return [self.shard_of({self.shard_key: user})]
+        return list(range(self.num_shards))
+
+    # -- reads ----------------------------------------------------------------
+    def __len__(self) -> int:
+        return sum(len(s.memory) for s in self._shards)
+
+    def corpus_size(self, user: str | None = None) -> int:
+        return sum(self._shards[i].memory.corpus_size(user) for i in self._targets(user))
+
+    def reload(self) -> None:
+        for shard in self._shards:
+            with shard.locked(exclusive=False):
+                shard.memory.reload()
+                shard.catch_up()
+
+    def _search_shard(self, i: int, query: str, k: int, user: str | None) -> List[Tuple[float, int, str]]:
+        shard = self._shards[i]
+        shard.refresh()
+        memory = shard.memory
+        with memory._lock:
+            return [(score, self._gid(i, d), memory._store.text(d)) for d, score in memory.search_scored(query, k, user=user)]
+
+    def search_scored(self, query: str, k: int | None = None, user: str | None = None) -> List[Tuple[int, float, str]]:
+        """(global doc id, score, text) of the top hits across shards, best first."""
+        k = self.top_k if k is None else k
+        targets = self._targets(user)
+        if self._pool is None or len(targets) == 1:
+            lists = [self._search_shard(i, query, k, user) for i in targets]
+        else:
+            lists = list(self._pool.map(lambda i: self._search_shard(i, query, k, user), targets))
+        # Each list is sorted best first; ties break on the lower doc id
+        merged = heapq.merge(*lists, key=lambda hit: (-hit[0], hit[1]))
+        return [(doc_id, score, text) for score, doc_id, text in list(merged)[:k]]
+
+    def search_ids(self, query: str, k: int | None = None, user: str | None = None) -> List[int]:
+        return [doc_id for doc_id, _, _ in self.search_scored(query, k, user)]
+
+    def search(self, query: str, user: str | None = None) -> List[str]:
+        return [text for _, _, text in self.search_scored(query, user=user)]
+
+    def search_batch(self, queries: List[str], user: str | None = None) -> List[List[str]]:
+        return [self.search(q, user=user) for q in queries]
+
+    # -- writes ---------------------------------------------------------------
+    def add_memory(self, text: str, meta: Dict[str, str] | None = None) -> None:
+        self.add_memories([(text, meta)])
+
+    def add_memories(self, items: Sequence[Tuple[str, Dict[str, Any] | None]]) -> List[int]:
+        """Persist memories, one locked append per shard touched; returns global doc ids in input order."""
+        groups: Dict[int, List[int]] = {}
+        for pos, (_, meta) in enumerate(items):
+            groups.setdefault(self.shard_of(meta), []).append(pos)
+        out: List[int] = [0] * len(items)
+        for i, positions in sorted(groups.items()):
+            shard = self._shards[i]
+            with shard.locked():
+                shard.catch_up()  # doc ids follow whatever other processes appended first
+                local = shard.memory.add_memories([items[p] for p in positions])
+                shard._seen = shard._signature()
+            for pos, d in zip(positions, local):
+                out[pos] = self._gid(i, d)
+        return out
+
+    def retire(self, doc_ids: Sequence[int]) -> None:
+        groups: Dict[int, List[int]] = {}
+        for doc_id in doc_ids:
+            i, local = self._split(doc_id)
+            groups.setdefault(i, []).append(local)
+        for i, local in sorted(groups.items()):
+            shard = self._shards[i]
+            with shard.locked():
+                shard.catch_up()
+                shard.memory.retire(local)
+                shard._seen = shard._signature()
+
+    def id_generation(self) -> int:
+        """Changes whenever doc ids may have been renumbered, here or by another process's rewrite."""
+        for shard in self._shards:
+            shard.refresh()
+        return sum(s.memory.id_generation() for s in self._shards)
+
+    def live_records(self) -> List[Tuple[int, Dict]]:
+        out: List[Tuple[int, Dict]] = []
+        for i, shard in enumerate(self._shards):
+            shard.refresh()
+            out.extend((self._gid(i, d), record) for d, record in shard.memory.live_records())
+        return out
+
+    def rewrite(self, transform: Callable[[List[Tuple[int, Dict]]], List[Dict]]) -> int:
+        """Like ``MemoryManager.rewrite``, across all shards with every shard lock held."""
+        with contextlib.ExitStack() as stack:
+            for shard in self._shards:  # always in shard order, so rewriters cannot deadlock
+                stack.enter_context(shard.locked())
+                shard.catch_up()
+            live = [(self._gid(i, d), r) for i, s in enumerate(self._shards) for d, r in s.memory.live_records()]
+            parts: List[List[Dict]] = [[] for _ in self._shards]
+            for record in transform(live):
+                parts[self.shard_of(record.get("meta"))].append(record)
+            for shard, part in zip(self._shards, parts):
+                shard.memory.rewrite(lambda _live, part=part: part)
+                shard._seen = shard._signature()
+        return len(self)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        for shard in self._shards:
+            shard.close()
@@ -0,0 +1,239 @@
+"""Cold-start helpers: cached config/prompt reads and the ``--startup-profile`` report.
+
+``load_yaml`` keeps the parsed file per process and as JSON under
+``__pycache__`` beside it, keyed by mtime and size, so a warm launch skips
+both importing PyYAML and parsing. ``read_text`` caches small files
+(prompts) per process the same way. ``PROFILE`` times named init phases
+and, once enabled, every module import, for a breakdown printed when the
+UI is ready.
+"""
+from __future__ import annotations
+
+import contextlib
+import importlib.abc
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_files: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+_files_lock = threading.Lock()
+
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _cached(key: str, stamp: Tuple[int, int]) -> Tuple[bool, Any]:
+    with _files_lock:
+        hit = _files.get(key)
+    if hit is not None and hit[0] == stamp:
+        return True, hit[1]
+    return False, None
+
+
+def _remember(key: str, stamp: Tuple[int, int], value: Any) -> None:
+    with _files_lock:
+        _files[key] = (stamp, value)
+
+
+def read_text(path: str) -> str:
+    """File contents, or "" when missing; re-read only when mtime or size changes."""
+    stamp = _stamp(path)
+    if stamp is None:
+        return ""
+    hit, value = _cached("text:" + path, stamp)
+    if hit:
+        return value
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            value = f.read()
+    except FileNotFoundError:
+        return ""
+    _remember("text:" + path, stamp, value)
+    return value
+
+
+def _json_cache_path(path: str) -> str:
+    head, name = os.path.split(os.path.abspath(path))
+    return os.path.join(head, "__pycache__", name + ".json")
+
+
+def load_yaml(path: str) -> Optional[Dict[str, Any]]:
+    """Parsed YAML mapping ({} when empty), None when the file is missing or PyYAML is not installed."""
+    stamp = _stamp(path)
+    if stamp is None:
+        return None
+    hit, value = _cached("yaml:" + path, stamp)
+    if hit:
+        return value
+    cache = _json_cache_path(path)
+    try:
+        with open(cache, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        if tuple(entry.get("stamp", ())) == stamp:
+            _remember("yaml:" + path, stamp, entry["data"])
+            return entry["data"]
+    except (OSError, ValueError, AttributeError, KeyError):
+        pass
+    try:
+        import yaml  # type: ignore
+    except Exception:  # pragma: no cover
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        value = yaml.safe_load(f) or {}
+    _remember("yaml:" + path, stamp, value)
+    try:
+        raw = json.dumps({"stamp": list(stamp), "data": value}, ensure_ascii=False)
+        # Only cache what survives JSON unchanged (no dates, no non-string keys)
+        if json.loads(raw)["data"] == value:
+            os.makedirs(os.path.dirname(cache), exist_ok=True)
+            tmp = f"{cache}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(raw)
+            os.replace(tmp, cache)
+    except (OSError, TypeError, ValueError):
+        pass  # read-only checkout or unserializable values: parse again next launch
+    return value
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader: Any, timer: "ImportTimer", name: str) -> None:
+        self._loader = loader
+        self._timer = timer
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._loader, attr)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        with self._timer.timing(self._name):
+            self._loader.exec_module(module)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """Times each module's first import (self time, excluding nested imports)."""
+
+    def __init__(self) -> None:
+        self.self_ms: Dict[str, float] = {}
+        self._local = threading.local()
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self._local, "busy", False):
+            return None
+        self._local.busy = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                        spec.loader = _TimedLoader(spec.loader, self, name)
+                    return spec
+            return None
+        finally:
+            self._local.busy = False
+
+    @contextlib.contextmanager
+    def timing(self, name: str) -> Iterator[None]:
+        # Per thread: time spent in nested imports, subtracted from the parent's self time
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - t0) * 1000.0
+            nested = stack.pop()
+            self.self_ms[name] = self.self_ms.get(name, 0.0) + elapsed - nested
+            if stack:
+                stack[-1] += elapsed
+
+    def by_package(self) -> List[Tuple[str, float]]:
+        totals: Dict[str, float] = {}
+        for name, ms in self.self_ms.items():
+            top = name.split(".")[0]
+            # Our own packages are worth splitting by module
+            key = ".".join(name.split(".")[:2]) if top in {"core", "ui", "voice"} else top
+            totals[key] = totals.get(key, 0.0) + ms
+        return sorted(totals.items(), key=lambda kv: -kv[1])
+
+
+class StartupProfile:
+    """Named init phases and (when enabled) import times, reported once at ready()."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[int, str, float]] = []
+        self.imports: Optional[ImportTimer] = None
+        self._depth = 0
+        self._reported = False
+
+    def enable(self) -> None:
+        self.enabled = True
+        self.started = time.perf_counter()
+        self.imports = ImportTimer()
+        self.imports.install()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        entry = len(self.phases)
+        self.phases.append((self._depth, name, 0.0))
+        self._depth += 1
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.phases[entry] = (self.phases[entry][0], name, (time.perf_counter() - t0) * 1000.0)
+
+    def report(self, top: int = 12) -> str:
+        total = (time.perf_counter() - self.started) * 1000.0
+        lines = [f"[startup] ready in {total:.1f} ms (since main)"]
+        lines.append("  init phases (include the imports they trigger)")
+        for depth, name, ms in self.phases:
+            lines.append(f"    {'  ' * depth}{name:<{28 - 2 * depth}}{ms:>9.1f} ms")
+        if self.imports is not None:
+            packages = self.imports.by_package()
+            lines.append(f"  imports {sum(self.imports.self_ms.values()):.1f} ms across {len(self.imports.self_ms)} modules")
+            for name, ms in packages[:top]:
+                lines.append(f"    {name:<28}{ms:>9.1f} ms")
+        return "\n".join(lines)
+
+    def ready(self) -> None:
+        """Print the report once (to stderr) if profiling is on."""
+        if not self.enabled or self._reported:
+            return
+        self._reported = True
+        if self.imports is not None:
+            self.imports.uninstall()
+        print(self.report(), file=sys.stderr)
+
+
+PROFILE = StartupProfile()
+
+
+def phase(name: str):
+    return PROFILE.phase(name)
@@ -1,20 +1,99 @@
 from __future__ import annotations
 
+import re
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from itertools import islice
+from typing import Any, Deque, Dict, Iterator, List, Optional, Union
+
+# Rough token estimate: one per CJK character, Latin word or punctuation mark
+_TOKEN_RE = re.compile(r"[぀-ヿ㐀-鿿가-힯]|\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(_TOKEN_RE.findall(text or ""))
 
 
-@dataclass
 class Message:
-    role: str
-    content: str
-    meta: Dict[str, Any] = field(default_factory=dict)
+    __slots__ = ("role", "content", "meta", "tokens")
+
+    def __init__(self, role: str, content: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        self.role = role
+        self.content = content
+        self.meta = meta if meta is not None else {}
+        self.tokens = estimate_tokens(content)
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content!r}, meta={self.meta!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return (self.role, self.content, self.meta) == (other.role, other.content, other.meta)
+
+
+class ConversationWindow:
+    """Short-term conversation history bounded by message count and token budget.
+
+    Backed by a deque used as a ring buffer: appends evict from the left once
+    either bound is exceeded (the newest message is always kept). Evicted
+    messages wait in ``evicted`` until the graph folds them into ``summary``.
+    A message identical to the previous one (same role and content) is dropped.
+    """
+
+    def __init__(self, max_messages: int = 20, token_budget: int = 2000) -> None:
+        self.max_messages = max_messages
+        self.token_budget = token_budget
+        self.tokens = 0
+        self.summary = ""
+        self.evicted: List[Message] = []
+        # Messages ever accepted by ``append``; lets checkpoints find what is new
+        self.appended = 0
+        self._buf: Deque[Message] = deque()
+
+    def append(self, msg: Message) -> bool:
+        if self._buf:
+            last = self._buf[-1]
+            if last.role == msg.role and last.content == msg.content:
+                return False
+        self._buf.append(msg)
+        self.appended += 1
+        self.tokens += msg.tokens
+        while len(self._buf) > 1 and (len(self._buf) > self.max_messages or self.tokens > self.token_budget):
+            old = self._buf.popleft()
+            self.tokens -= old.tokens
+            self.evicted.append(old)
+        return True
+
+    def take_evicted(self) -> List[Message]:
+        evicted, self.evicted = self.evicted, []
+        return evicted
+
+    def recent(self, n: int) -> List[Message]:
+        """Last ``n`` messages, oldest first, in O(n)."""
+        out = list(islice(reversed(self._buf), n))
+        out.reverse()
+        return out
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self._buf)
+
+    def __reversed__(self) -> Iterator[Message]:
+        return reversed(self._buf)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Message, List[Message]]:
+        if isinstance(index, slice):
+            return list(self._buf)[index]
+        return self._buf[index]
 
 
 @dataclass
 class AgentState:
     # Short-term memory: current turn input and conversation history
-    messages: List[Message] = field(default_factory=list)
+    messages: ConversationWindow = field(default_factory=ConversationWindow)
     # Voice-related: original audio/transcribed text
     audio_input_path: Optional[str] = None
     stt_text: Optional[str] = None
@@ -40,4 +119,3 @@ class AgentState:
             if msg.role == "user":
                 return msg.content
         return None
-
@@ -0,0 +1,204 @@
+"""Time-partitioned lexical index: hot partitions in RAM, cold ones loaded on demand.
+
+Memories are indexed per (owner, period), a period being ``partition_days``
+of their ``ts``. The newest ``hot_partitions`` periods (by wall clock) stay
+indexed; older partitions keep only their doc ids and are indexed from the
+store when a search reaches them, at most ``cold_cache`` at a time (LRU).
+With ``storage: segment`` a cold partition's vectors are read from the
+mmap'd segments, so nothing of it stays in RAM but its doc ids.
+
+A search walks the owner's partitions newest first and stops early when
+
+- the top-k is full and no older partition can beat its k-th score: a
+  partition's best possible score is 1 (cosine) times the recency decay of
+  its newest memory, which bounds it once ``recency_half_life_days`` is set; or
+- the hot tier alone filled the top-k with scores of at least
+  ``confident_score`` (0 disables this approximate stop).
+
+Recency decay multiplies each score by ``0.5 ** (age / half_life)``.
+Memories without a ``ts`` (written before timestamps) form the oldest
+period; they are not decayed, so only the confident stop skips them.
+"""
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .scoring import Hits, ScoringBackend, _rank_key, make_backend
+
+DAY = 86400.0
+
+
+class TierSpec(NamedTuple):
+    partition_days: float = 30.0
+    hot_partitions: int = 2
+    cold_cache: int = 4
+    confident_score: float = 0.0
+    recency_half_life_days: float = 0.0
+
+
+def make_tier_spec(rag_conf: Dict[str, Any]) -> Optional[TierSpec]:
+    """TierSpec from ``rag.tiers``, or None when tiering is off."""
+    conf = rag_conf.get("tiers") or {}
+    if not conf.get("enabled", False):
+        return None
+    return TierSpec(
+        partition_days=float(conf.get("partition_days", 30)),
+        hot_partitions=max(1, int(conf.get("hot_partitions", 2))),
+        cold_cache=max(0, int(conf.get("cold_cache", 4))),
+        confident_score=float(conf.get("confident_score", 0.35)),
+        recency_half_life_days=float(conf.get("recency_half_life_days", 0.0)),
+    )
+
+
+class _TimePartition:
+    __slots__ = ("period", "doc_ids", "newest", "index")
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self.doc_ids: List[int] = []
+        self.newest = 0.0
+        self.index: Optional[ScoringBackend] = None
+
+
+class TimePartitionedIndex:
+    """Lexical index over (owner, time period) partitions; see the module docstring."""
+
+    def __init__(self, backend: str, spec: TierSpec, load_vector: Callable[[int], Dict[str, float]]) -> None:
+        self.backend = backend
+        self.spec = spec
+        self.width = max(1.0, spec.partition_days * DAY)
+        self.half_life = spec.recency_half_life_days * DAY
+        self._load_vector = load_vector
+        self._owners: Dict[str, List[_TimePartition]] = {}  # per owner, oldest period first
+        self._ts: Dict[int, float] = {}
+        self._cold: "OrderedDict[Tuple[str, int], _TimePartition]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {"searches": 0, "partitions_searched": 0, "early_stops": 0, "cold_loads": 0}
+
+    def period_of(self, ts: Optional[float]) -> int:
+        return int(ts // self.width) if ts else 0
+
+    def is_hot(self, period: int, now: Optional[float] = None) -> bool:
+        return period > self.period_of(time.time() if now is None else now) - self.spec.hot_partitions
+
+    def _partition(self, owner: str, period: int) -> _TimePartition:
+        parts = self._owners.setdefault(owner, [])
+        # Nearly always the newest period, so scan from the end
+        for i in range(len(parts) - 1, -1, -1):
+            if parts[i].period == period:
+                return parts[i]
+            if parts[i].period < period:
+                part = _TimePartition(period)
+                parts.insert(i + 1, part)
+                return part
+        part = _TimePartition(period)
+        parts.insert(0, part)
+        return part
+
+    def add(self, doc_id: int, owner: str, ts: Optional[float], vec: Optional[Dict[str, float]] = None) -> None:
+        """Index a memory; ``vec`` may be None for a cold partition that is not loaded."""
+        with self._lock:
+            part = self._partition(owner, self.period_of(ts))
+            if ts:
+                self._ts[doc_id] = ts
+                part.newest = max(part.newest, ts)
+            if part.index is None and self.is_hot(part.period):
+                part.index = make_backend(self.backend)
+                # A partition that just turned hot (or was cold) is indexed from what it already holds
+                for local, d in enumerate(part.doc_ids):
+                    part.index.add(local, self._load_vector(d))
+            if part.index is not None:
+                part.index.add(len(part.doc_ids), vec if vec is not None else self._load_vector(doc_id))
+            part.doc_ids.append(doc_id)
+
+    def needs_vector(self, owner: str, ts: Optional[float]) -> bool:
+        """Whether ``add`` would index the memory now (so loading should vectorize it)."""
+        return self.is_hot(self.period_of(ts))
+
+    def count(self, owner: str) -> int:
+        return sum(len(p.doc_ids) for p in self._owners.get(owner, ()))
+
+    def decay(self, ts: Optional[float], now: float) -> float:
+        if not ts or self.half_life <= 0:
+            return 1.0
+        return 0.5 ** (max(0.0, now - ts) / self.half_life)
+
+    def _ensure_loaded(self, owner: str, part: _TimePartition, now: float) -> ScoringBackend:
+        if part.index is not None:
+            # A partition that aged out of the hot tier while indexed joins the LRU like a loaded cold one
+            if not self.is_hot(part.period, now):
+                self._admit(owner, part)
+            return part.index
+        index = make_backend(self.backend)
+        for local, doc_id in enumerate(part.doc_ids):
+            index.add(local, self._load_vector(doc_id))
+        part.index = index
+        self.stats["cold_loads"] += 1
+        self._admit(owner, part)
+        return index
+
+    def _admit(self, owner: str, part: _TimePartition) -> None:
+        self._cold[(owner, part.period)] = part
+        self._cold.move_to_end((owner, part.period))
+        while len(self._cold) > self.spec.cold_cache:
+            _, evicted = self._cold.popitem(last=False)
+            evicted.index = None
+
+    def search(self, owner: str, qvec: Dict[str, float], k: int, now: Optional[float] = None) -> Hits:
+        """Top ``k`` (doc id, decayed score), best first."""
+        now = time.time() if now is None else now
+        spec = self.spec
+        top: List[Tuple[float, int, int, float]] = []  # min-heap of (rank key, -doc id, doc id, score)
+        with self._lock:
+            self.stats["searches"] += 1
+            parts = self._owners.get(owner, [])
+            # Undated memories are not decayed, so their partition can't be bounded with the dated ones
+            undated = parts[0] if parts and parts[0].period == 0 else None
+            for part in reversed(parts):
+                if part is undated:
+                    break
+                if len(top) >= k:
+                    kth = top[0][0]
+                    if not self.is_hot(part.period, now) and spec.confident_score > 0 and kth >= _rank_key(spec.confident_score):
+                        self.stats["early_stops"] += 1
+                        undated = None
+                        break
+                    # Decay only shrinks with age: nothing here or older beats the k-th hit
+                    if kth > _rank_key(self.decay(part.newest, now)):
+                        self.stats["early_stops"] += 1
+                        break
+                self._search_partition(owner, part, qvec, k, now, top)
+            if undated is not None:
+                self._search_partition(owner, undated, qvec, k, now, top)
+        return [(doc_id, score) for _, _, doc_id, score in sorted(top, reverse=True)]
+
+    def _search_partition(self, owner: str, part: _TimePartition, qvec: Dict[str, float], k: int, now: float, top: List) -> None:
+        index = self._ensure_loaded(owner, part, now)
+        self.stats["partitions_searched"] += 1
+        # Fresher memories with lower raw scores can outrank this partition's raw top-k after decay:
+        # keep widening the fetch while an unseen hit (raw score <= the last one, decay <= the
+        # partition's newest) could still beat the k-th hit
+        best_decay = self.decay(part.newest or None, now)
+        fetch, seen = k, 0
+        while True:
+            hits = index.search(qvec, fetch)
+            for local, score in hits[seen:]:
+                doc_id = part.doc_ids[local]
+                decayed = score * self.decay(self._ts.get(doc_id), now)
+                item = (_rank_key(decayed), -doc_id, doc_id, decayed)
+                if len(top) < k:
+                    heapq.heappush(top, item)
+                elif item[:2] > top[0][:2]:
+                    heapq.heapreplace(top, item)
+            seen = len(hits)
+            if seen < fetch or (len(top) >= k and top[0][0] > _rank_key(hits[-1][1] * best_decay)):
+                return
+            fetch *= 4
+
+    def loaded(self) -> Dict[str, int]:
+        hot = sum(1 for parts in self._owners.values() for p in parts if p.index is not None and self.is_hot(p.period))
+        return {"partitions": sum(len(p) for p in self._owners.values()), "hot": hot, "cold_loaded": len(self._cold)}
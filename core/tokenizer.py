@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import re
+import zlib
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+# CJK ideographs, kana and hangul are tokenized as character n-grams
+_CJK = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+_RUN_RE = re.compile(f"([{_CJK}]+)|([^\\W_{_CJK}]+)")
+
+DEFAULT_STOPWORDS = frozenset(
+    "的 了 是 在 和 与 也 就 都 而 及 或 吗 呢 吧 啊 呀 哦 嗯 着 过 把 被 这 那 之 么 "
+    "a an the is are was were be to of and or in on at for with it this that".split()
+)
+
+
+class Tokenizer:
+    """Base tokenizer with an LRU cache over ``tokenize``.
+
+    Subclasses implement ``_tokenize``; cached results are stored as tuples so
+    callers cannot mutate shared entries.
+    """
+
+    name = "base"
+
+    def __init__(self, stopwords: Optional[Iterable[str]] = None, cache_size: int = 4096) -> None:
+        self.stopwords = frozenset(stopwords or ())
+        self._cached = lru_cache(maxsize=cache_size)(self._tokenize_tuple)
+
+    def _tokenize(self, text: str) -> List[str]:
+        raise NotImplementedError
+
+    def _tokenize_tuple(self, text: str) -> Tuple[str, ...]:
+        return tuple(t for t in self._tokenize(text) if t not in self.stopwords)
+
+    def tokenize(self, text: str) -> List[str]:
+        return list(self._cached(text or ""))
+
+    def signature(self) -> str:
+        """Identifies the token stream, e.g. to detect stale stored term vectors."""
+        return f"{self.name}:{zlib.crc32(' '.join(sorted(self.stopwords)).encode('utf-8')):08x}"
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+
+class WhitespaceTokenizer(Tokenizer):
+    """Lowercased whitespace split (the original MemoryManager behaviour)."""
+
+    name = "whitespace"
+
+    def _tokenize(self, text: str) -> List[str]:
+        return text.lower().split()
+
+
+class CJKTokenizer(Tokenizer):
+    """Character n-grams for CJK runs, word split for Latin/digit runs.
+
+    Single-character stop words act as run separators, so "我的城市" yields
+    "城市" instead of the bigrams "我的"/"的城".
+    """
+
+    name = "cjk"
+
+    def __init__(self, stopwords: Optional[Iterable[str]] = None, cache_size: int = 4096, ngram: int = 2) -> None:
+        super().__init__(stopwords, cache_size)
+        self.ngram = ngram
+        stop_chars = "".join(re.escape(s) for s in self.stopwords if len(s) == 1)
+        self._split_re = re.compile(f"[{stop_chars}]+") if stop_chars else None
+
+    def signature(self) -> str:
+        return f"{super().signature()}:{self.ngram}"
+
+    def _ngrams(self, run: str) -> List[str]:
+        n = self.ngram
+        if len(run) <= n:
+            return [run]
+        return [run[i:i + n] for i in range(len(run) - n + 1)]
+
+    def _tokenize(self, text: str) -> List[str]:
+        tokens: List[str] = []
+        for cjk, word in _RUN_RE.findall(text.lower()):
+            if word:
+                tokens.append(word)
+                continue
+            pieces = self._split_re.split(cjk) if self._split_re else [cjk]
+            for piece in pieces:
+                if piece:
+                    tokens.extend(self._ngrams(piece))
+        return tokens
+
+
+TOKENIZERS = {"whitespace": WhitespaceTokenizer, "cjk": CJKTokenizer}
+
+
+def get_tokenizer(name: str = "cjk", stopwords: bool | Iterable[str] = False, cache_size: int = 4096) -> Tokenizer:
+    """Create a tokenizer by name; ``stopwords=True`` enables the built-in list."""
+    name = (name or "cjk").lower()
+    if name not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer: {name}")
+    if stopwords is True:
+        words: Iterable[str] = DEFAULT_STOPWORDS
+    elif stopwords is False or stopwords is None:
+        words = ()
+    else:
+        words = stopwords
+    return TOKENIZERS[name](stopwords=words, cache_size=cache_size)
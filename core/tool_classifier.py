@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import json
+import math
+import random
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .llm_manager import LLMManager
+from .reasoning import ToolRouter
+
+TOOL_LABELS = ("llm", "web_search", "summarize", "emotion_detect")
+
+
+class HashedNgrams:
+    """Character n-grams hashed into ``dim`` buckets, L2-normalized.
+
+    Character n-grams work for Chinese without segmentation and catch word
+    stems in Latin text. The hash is a fixed polynomial over code points (not
+    the per-process salted ``hash``), so saved models stay valid.
+    """
+
+    def __init__(self, dim: int = 1 << 18, ngrams: Sequence[int] = (1, 2, 3)) -> None:
+        self.dim = dim
+        self.ngrams = tuple(ngrams)
+
+    def __call__(self, text: str) -> Dict[int, float]:
+        codes = [ord(c) for c in "\x02" + unicodedata.normalize("NFKC", text or "").casefold() + "\x03"]
+        wanted = set(self.ngrams)
+        top = max(self.ngrams)
+        dim = self.dim
+        counts: Dict[int, float] = {}
+        size = len(codes)
+        # One pass per start position extends the 1..top-gram hashes incrementally
+        for i in range(size):
+            h = 0
+            for n in range(1, min(top, size - i) + 1):
+                h = (h * 1000003) ^ codes[i + n - 1]
+                if n in wanted:
+                    k = (h * 31 + n) % dim
+                    counts[k] = counts.get(k, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        return {h: v / norm for h, v in counts.items()}
+
+
+class ToolClassifier:
+    """Multinomial logistic regression over hashed n-grams.
+
+    Weights are stored sparsely (feature -> per-label list), so scoring a turn
+    touches only the few dozen features present in it.
+    """
+
+    def __init__(self, labels: Sequence[str] = TOOL_LABELS, featurizer: Optional[HashedNgrams] = None) -> None:
+        self.labels = list(labels)
+        self.featurizer = featurizer or HashedNgrams()
+        self.weights: Dict[int, List[float]] = {}
+        self.bias = [0.0] * len(self.labels)
+
+    def _logits(self, feats: Dict[int, float]) -> List[float]:
+        z = list(self.bias)
+        weights = self.weights
+        for h, v in feats.items():
+            w = weights.get(h)
+            if w is not None:
+                for j, wj in enumerate(w):
+                    z[j] += wj * v
+        return z
+
+    @staticmethod
+    def _softmax(z: List[float]) -> List[float]:
+        top = max(z)
+        e = [math.exp(x - top) for x in z]
+        s = sum(e)
+        return [x / s for x in e]
+
+    def predict_proba(self, text: str) -> List[float]:
+        return self._softmax(self._logits(self.featurizer(text)))
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probs = self.predict_proba(text)
+        j = max(range(len(probs)), key=probs.__getitem__)
+        return self.labels[j], probs[j]
+
+    def fit(
+        self,
+        texts: Sequence[str],
+        labels: Sequence[str],
+        epochs: int = 10,
+        lr: float = 0.5,
+        l2: float = 1e-5,
+        seed: int = 7,
+    ) -> "ToolClassifier":
+        """Plain SGD on cross-entropy with a decaying step; L2 shrinks the weights each example touches."""
+        for label in labels:
+            if label not in self.labels:
+                self.labels.append(label)
+                self.bias.append(0.0)
+                for w in self.weights.values():
+                    w.append(0.0)
+        index = {label: j for j, label in enumerate(self.labels)}
+        data = [(self.featurizer(t), index[y]) for t, y in zip(texts, labels)]
+        rng = random.Random(seed)
+        k = len(self.labels)
+        step = 0
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for feats, y in data:
+                rate = lr / (1.0 + 1e-4 * step)
+                step += 1
+                probs = self._softmax(self._logits(feats))
+                grad = [p - (1.0 if j == y else 0.0) for j, p in enumerate(probs)]
+                for j in range(k):
+                    self.bias[j] -= rate * grad[j]
+                for h, v in feats.items():
+                    w = self.weights.get(h)
+                    if w is None:
+                        w = self.weights[h] = [0.0] * k
+                    for j in range(k):
+                        w[j] -= rate * (grad[j] * v + l2 * w[j])
+        return self
+
+    def save(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "labels": self.labels,
+            "dim": self.featurizer.dim,
+            "ngrams": list(self.featurizer.ngrams),
+            "bias": self.bias,
+            # Prune near-zero weights; they cannot move a prediction
+            "weights": {str(h): [round(x, 6) for x in w] for h, w in self.weights.items() if max(map(abs, w)) > 1e-6},
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "ToolClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        model = cls(payload["labels"], HashedNgrams(int(payload["dim"]), payload["ngrams"]))
+        model.bias = [float(b) for b in payload["bias"]]
+        model.weights = {int(h): [float(x) for x in w] for h, w in payload["weights"].items()}
+        return model
+
+
+_ROUTE_PROMPT = (
+    "你是工具路由器。根据用户输入只回答一个标签：{labels}。"
+    "需要联网查询时回答 web_search，需要归纳总结时回答 summarize，"
+    "涉及情绪时回答 emotion_detect，其余回答 llm。"
+)
+
+
+def route_with_llm(llm: LLMManager, text: str, labels: Sequence[str] = TOOL_LABELS) -> str:
+    """Ask the LLM for a label; an unparseable answer routes to ``llm``."""
+    system = _ROUTE_PROMPT.format(labels=" / ".join(labels))
+    reply = llm.chat(system, [{"role": "system", "content": system}, {"role": "user", "content": text}])
+    # Longest labels first so "llm" inside another label never wins by accident
+    for label in sorted(labels, key=len, reverse=True):
+        if label in reply:
+            return label
+    return "llm"
+
+
+class LLMRouter:
+    """``tool_selection: llm``: one LLM call per turn (degrades to the heuristic when
+    ``max_steps`` leaves no step for it besides the reply)."""
+
+    def __init__(self, llm: LLMManager, heuristic: ToolRouter, max_steps: int = 3) -> None:
+        self.llm = llm
+        self.heuristic = heuristic
+        self.max_steps = max_steps
+
+    def route(self, user_text: str) -> Tuple[str, int]:
+        if self.max_steps <= 1:
+            return self.heuristic.select(user_text), 0
+        return route_with_llm(self.llm, user_text or ""), 1
+
+    def select(self, user_text: str) -> str:
+        return self.route(user_text)[0]
+
+
+class CascadeRouter:
+    """``tool_selection: model``: classifier first, LLM only when it is unsure.
+
+    The classifier answers when its top probability reaches ``confidence``.
+    Below that, the LLM is asked, unless ``max_steps`` leaves no step for it
+    besides the reply or no LLM is given; then a keyword hit from the heuristic
+    router, or else the classifier's best guess, is used. ``stats`` counts how
+    each decision was made.
+    """
+
+    def __init__(
+        self,
+        model: ToolClassifier,
+        heuristic: ToolRouter,
+        llm: Optional[LLMManager] = None,
+        confidence: float = 0.6,
+        max_steps: int = 3,
+    ) -> None:
+        self.model = model
+        self.heuristic = heuristic
+        self.llm = llm
+        self.confidence = confidence
+        self.max_steps = max_steps
+        self.stats = {"model": 0, "llm": 0, "heuristic": 0, "low_confidence": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def route(self, user_text: str) -> Tuple[str, int]:
+        """Label plus the reasoning steps spent choosing it (1 when the LLM was asked)."""
+        text = user_text or ""
+        label, prob = self.model.predict(text)
+        if prob >= self.confidence:
+            self._count("model")
+            return label, 0
+        if self.llm is not None and self.max_steps > 1:
+            self._count("llm")
+            return route_with_llm(self.llm, text, self.model.labels), 1
+        keyword = self.heuristic.select(text)
+        if keyword != "llm":
+            self._count("heuristic")
+            return keyword, 0
+        self._count("low_confidence")
+        return label, 0
+
+    def select(self, user_text: str) -> str:
+        return self.route(user_text)[0]
+
+
+class RoutingLog:
+    """Wraps a router and appends ``{"text", "label"}`` per decision to a JSONL
+    file, the training input of scripts/train_router.py."""
+
+    def __init__(self, router, path: str) -> None:
+        self.router = router
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def route(self, user_text: str) -> Tuple[str, int]:
+        label, steps = self.router.route(user_text)
+        line = json.dumps({"ts": round(time.time(), 3), "text": user_text, "label": label}, ensure_ascii=False)
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        return label, steps
+
+    def select(self, user_text: str) -> str:
+        return self.route(user_text)[0]
+
+
+def load_examples(paths: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """Texts and labels from JSONL files of ``{"text", "label"}`` (routing logs)."""
+    texts: List[str] = []
+    labels: List[str] = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if obj.get("text") and obj.get("label"):
+                    texts.append(obj["text"])
+                    labels.append(obj["label"])
+    return texts, labels
+
+
+def make_router(config: Dict, llm: LLMManager, heuristic: ToolRouter):
+    """Router for ``reasoning.tool_selection``: heuristic, llm or model (cascade)."""
+    conf = config.get("reasoning") or {}
+    mode = conf.get("tool_selection", "heuristic")
+    max_steps = int(conf.get("max_steps", 3))
+    router = heuristic
+    if mode == "llm":
+        router = LLMRouter(llm, heuristic, max_steps=max_steps)
+    elif mode == "model":
+        path = conf.get("model_path", "data/router_model.json")
+        try:
+            model = ToolClassifier.load(path)
+        except (OSError, ValueError, KeyError):
+            print(f"未找到可用的路由模型 {path}，改用关键词路由。可用 scripts/train_router.py 训练。")
+        else:
+            router = CascadeRouter(model, heuristic, llm, confidence=float(conf.get("confidence", 0.6)), max_steps=max_steps)
+    if conf.get("log_routing", False):
+        log_dir = ((config.get("app") or {}).get("log_dir")) or "data/logs"
+        router = RoutingLog(router, str(Path(log_dir) / "routing.jsonl"))
+    return router
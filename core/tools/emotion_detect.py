@@ -1,24 +1,41 @@
 from __future__ import annotations
 
+from typing import Dict, Optional
+
+from ..keyword_matcher import KeywordMatcher, KeywordRules, parse_rules
+
+DEFAULT_EMOTION_RULES = {
+    "joy": ["开心", "高兴"],
+    "sadness": ["难过", "伤心"],
+    "anger": ["生气", "愤怒"],
+    "fear": ["害怕", "担心"],
+    "neutral": ["平静", "还好"],
+}
+
 
 class EmotionDetectTool:
-    def __init__(self) -> None:
-        self.keywords = {
-            "开心": "joy",
-            "高兴": "joy",
-            "难过": "sadness",
-            "伤心": "sadness",
-            "生气": "anger",
-            "愤怒": "anger",
-            "害怕": "fear",
-            "担心": "fear",
-            "平静": "neutral",
-            "还好": "neutral",
-        }
+    def __init__(self, rules: Optional[KeywordRules] = None) -> None:
+        # With ``rules`` the ``emotion`` set from settings.yaml replaces the defaults
+        self.keyword_rules = rules
+        self._default = KeywordMatcher(parse_rules(DEFAULT_EMOTION_RULES))
 
-    def run(self, text: str) -> str:
-        for k, v in self.keywords.items():
-            if k in (text or ""):
-                return f"检测到情绪：{v}"
-        return "情绪倾向：neutral（占位）"
+    @property
+    def matcher(self) -> KeywordMatcher:
+        matcher = self.keyword_rules.matcher("emotion") if self.keyword_rules is not None else None
+        return matcher if matcher is not None else self._default
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Multi-label emotion scores (normalized match weights), from one scan."""
+        totals = self.matcher.scores(text or "")
+        norm = sum(totals.values())
+        return {label: w / norm for label, w in totals.items()} if norm else {}
 
+    def run(self, text: str) -> str:
+        scores = self.scores(text)
+        if not scores:
+            return "情绪倾向：neutral（占位）"
+        if len(scores) == 1:
+            return f"检测到情绪：{next(iter(scores))}"
+        # Stable sort keeps first-rule order among equal scores
+        ranked = sorted(scores.items(), key=lambda kv: -kv[1])
+        return "检测到情绪：" + "，".join(f"{label} {score:.2f}" for label, score in ranked)
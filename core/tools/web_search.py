@@ -7,5 +7,5 @@ class WebSearchTool:
 
     def run(self, query: str) -> str:
         # Placeholder implementation: no external requests, returns mock search results
-        return f"[模拟搜索结果] 关于"{query}"的简要要点：1) 示例结果A 2) 示例结果B"
+        return f"[模拟搜索结果] 关于“{query}”的简要要点：1) 示例结果A 2) 示例结果B"
 
@@ -1,26 +1,16 @@
 from __future__ import annotations
 
+import argparse
 import os
 import sys
 from typing import Any, Dict
 
-try:
-    import yaml  # type: ignore
-except Exception:  # pragma: no cover
-    yaml = None
-
-from ui.cli import run_cli
+from core.startup import PROFILE, load_yaml, phase
 
 
 def load_config(path: str) -> Dict[str, Any]:
-    if yaml is None:
-        # Provide minimal fallback when pyyaml is not available
-        return {}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f) or {}
-    except FileNotFoundError:
-        return {}
+    # Provide minimal fallback when pyyaml is not available or the file is missing
+    return load_yaml(path) or {}
 
 
 def ensure_dirs(cfg: Dict[str, Any]) -> None:
@@ -31,13 +21,43 @@ def ensure_dirs(cfg: Dict[str, Any]) -> None:
 
 
 def main() -> None:
-    cfg = load_config("config/settings.yaml")
-    ensure_dirs(cfg)
+    parser = argparse.ArgumentParser(description="Her dialogue agent")
+    parser.add_argument("--profile", action="store_true", help="print a per-node latency breakdown after each turn")
+    parser.add_argument("--batch", metavar="TURNS_JSONL", help="replay a JSONL turn log offline instead of starting app.mode")
+    parser.add_argument("--out", help="batch: output JSONL (default: <input>.replay.jsonl)")
+    parser.add_argument("--workers", type=int, help="batch: worker processes (default: batch.workers)")
+    parser.add_argument("--fresh", action="store_true", help="batch: ignore an existing checkpoint and start over")
+    parser.add_argument("--session", help="cli: checkpoint session to resume and save (default: checkpoint.session)")
+    parser.add_argument("--startup-profile", action="store_true", help="print an import-time and init-time breakdown once the UI is ready")
+    args = parser.parse_args()
+    if args.startup_profile:
+        PROFILE.enable()
+    with phase("config"):
+        cfg = load_config("config/settings.yaml")
+        ensure_dirs(cfg)
     mode = ((cfg.get("app") or {}).get("mode")) or "cli"
-    if mode == "cli":
-        run_cli(cfg)
+    # UI modules are imported per mode, so a CLI start never loads the web or voice stack
+    if args.batch:
+        from ui.batch import run_batch
+
+        run_batch(cfg, args.batch, args.out, args.workers, fresh=args.fresh)
+    elif mode == "cli":
+        with phase("import ui.cli"):
+            from ui.cli import run_cli
+
+        run_cli(cfg, profile=args.profile, session=args.session)
+    elif mode == "web":
+        with phase("import ui.web"):
+            from ui.web import run_web
+
+        run_web(cfg)
+    elif mode == "voice":
+        with phase("import ui.voice"):
+            from ui.voice import run_voice
+
+        run_voice(cfg, profile=args.profile)
     else:
-        print("当前示例仅实现 CLI 模式。可在 config/settings.yaml 中将 app.mode 设为 cli。")  # User-facing message, keep Chinese
+        print("当前示例仅实现 CLI、web 与 voice 模式。可在 config/settings.yaml 中将 app.mode 设为 cli、web 或 voice。")  # User-facing message, keep Chinese
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+"""Migrate memories between memories.jsonl and the binary segment store.
+
+Usage:
+    python -m scripts.memory_store migrate data/vector_store/memories.jsonl
+    python -m scripts.memory_store export data/vector_store/memories.jsonl out.jsonl
+    python -m scripts.memory_store compact data/vector_store/memories.jsonl
+    python -m scripts.memory_store consolidate data/vector_store/memories.jsonl --max-per-user 500
+"""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from core.llm_manager import LLMManager
+from core.memory_manager import MemoryManager, _tf
+from core.memory_policy import MemoryPolicy
+from core.segment_store import SegmentStore, export_jsonl, migrate_jsonl
+from core.tokenizer import get_tokenizer
+
+
+def open_store(jsonl_path: str, tokenizer: str, stopwords: bool) -> SegmentStore:
+    tok = get_tokenizer(tokenizer, stopwords=stopwords)
+    return SegmentStore(Path(jsonl_path).with_suffix(".segments"), lambda t: _tf(t, tok), vector_tag=tok.signature())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["migrate", "export", "compact", "consolidate"])
+    parser.add_argument("jsonl", help="memories.jsonl path; segments live next to it in <name>.segments/")
+    parser.add_argument("out", nargs="?", help="output jsonl for export")
+    parser.add_argument("--tokenizer", default="cjk")
+    parser.add_argument("--stopwords", action="store_true")
+    parser.add_argument("--storage", choices=["jsonl", "segment"], default=None, help="consolidate: store kind (default: segment if present)")
+    parser.add_argument("--half-life-days", type=float, default=30.0)
+    parser.add_argument("--drop-below", type=float, default=0.0, help="consolidate: drop scored facts decayed below this (0 = never)")
+    parser.add_argument("--max-per-user", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "consolidate":
+        storage = args.storage or ("segment" if Path(args.jsonl).with_suffix(".segments").exists() else "jsonl")
+        memory = MemoryManager(args.jsonl, tokenizer=get_tokenizer(args.tokenizer, stopwords=args.stopwords), storage=storage)
+        # Consolidation never calls the LLM; the placeholder only satisfies the policy's constructor
+        policy = MemoryPolicy(
+            memory,
+            LLMManager(provider="openai", model="gpt-4o-mini"),
+            half_life_days=args.half_life_days,
+            drop_below=args.drop_below,
+            max_per_user=args.max_per_user,
+        )
+        try:
+            print(policy.consolidate())
+        finally:
+            memory.close()
+        return
+
+    store = open_store(args.jsonl, args.tokenizer, args.stopwords)
+    try:
+        if args.command == "migrate":
+            if len(store) or store.imported:
+                parser.error(f"segment store already imported ({len(store)} memories)")
+            print(f"migrated {migrate_jsonl(args.jsonl, store)} memories")
+        elif args.command == "export":
+            if not args.out:
+                parser.error("export needs an output path")
+            print(f"exported {export_jsonl(store, args.out)} memories")
+        else:
+            store.seal()
+            store.compact()
+            print(f"compacted {len(store)} memories")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
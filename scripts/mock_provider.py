@@ -0,0 +1,212 @@
+"""Local OpenAI-compatible mock server for exercising core/http_client.py.
+
+Serves POST /chat/completions (plain and SSE streaming), /audio/transcriptions
+and /audio/speech with keep-alive, plus GET /stats (requests and TCP
+connections seen). Latency, slow-tail, 503 and 429 rates are configurable so
+retries, hedging, pooling and rate limiting can be observed.
+
+Usage:
+    python -m scripts.mock_provider --port 8400 --latency 0.05 --fail-rate 0.1
+    # then set llm.base_url: http://127.0.0.1:8400 and http.enabled: true
+    python -m scripts.mock_provider --selftest   # run the client against it and print stats
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from core.http_client import HttpClient, HttpError
+
+
+class MockState:
+    def __init__(self, latency: float, slow_rate: float, slow_latency: float, fail_rate: float, throttle_rate: float, seed: int) -> None:
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.fail_rate = fail_rate
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {"requests": 0, "connections": 0, "failed": 0, "throttled": 0, "slow": 0}
+
+    def bump(self, key: str) -> None:
+        with self.lock:
+            self.counts[key] += 1
+
+    def roll(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so client-side pooling is visible in the stats
+        # Headers and body in one segment; otherwise Nagle + delayed ACK add ~40 ms per response
+        disable_nagle_algorithm = True
+
+        def setup(self) -> None:
+            super().setup()
+            state.bump("connections")
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json", extra: Dict[str, str] = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (extra or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path == "/stats":
+                with state.lock:
+                    self._send(200, json.dumps(state.counts).encode("utf-8"))
+            else:
+                self._send(404, b'{"error": "not found"}')
+
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            state.bump("requests")
+            roll = state.roll()
+            if roll < state.throttle_rate:
+                state.bump("throttled")
+                return self._send(429, b'{"error": "rate limited"}', extra={"Retry-After": "0.05"})
+            if roll < state.throttle_rate + state.fail_rate:
+                state.bump("failed")
+                return self._send(503, b'{"error": "unavailable"}')
+            delay = state.latency
+            if state.roll() < state.slow_rate:
+                state.bump("slow")
+                delay = state.slow_latency
+            time.sleep(delay)
+            path = self.path.split("?")[0]
+            if path.endswith("/chat/completions"):
+                payload = json.loads(body or b"{}")
+                last = next((m["content"] for m in reversed(payload.get("messages", [])) if m.get("role") == "user"), "")
+                reply = f"（模拟回复）{last[:200]}"
+                if payload.get("stream"):
+                    return self._stream(reply)
+                out = {"choices": [{"message": {"role": "assistant", "content": reply}}]}
+                return self._send(200, json.dumps(out, ensure_ascii=False).encode("utf-8"))
+            if path.endswith("/audio/transcriptions"):
+                return self._send(200, json.dumps({"text": f"（模拟转写）{len(body)} bytes"}, ensure_ascii=False).encode("utf-8"))
+            if path.endswith("/audio/speech"):
+                return self._send(200, b"ID3" + body[:64], content_type="audio/mpeg")
+            self._send(404, b'{"error": "not found"}')
+
+        def _stream(self, reply: str) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for ch in list(reply) + [None]:
+                if ch is None:
+                    event = b"data: [DONE]\n\n"
+                else:
+                    chunk = {"choices": [{"delta": {"content": ch}}]}
+                    event = b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n"
+                self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def serve(host: str, port: int, state: MockState) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def selftest(args: argparse.Namespace, state: MockState) -> None:
+    server = serve("127.0.0.1", 0, state)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    client = HttpClient(
+        retries=4,
+        backoff=0.02,
+        hedge_after=args.hedge_after,
+        max_per_host=args.concurrency,
+        rate_limits={"mock": {"rps": args.rps, "burst": args.concurrency}},
+    )
+
+    def one(i: int) -> float:
+        t0 = time.perf_counter()
+        try:
+            client.request(
+                "POST",
+                base + "/chat/completions",
+                json={"model": "mock", "messages": [{"role": "user", "content": f"hello {i % args.distinct}"}]},
+                limit_key="mock",
+                hedge=True,
+                coalesce=True,
+            )
+        except HttpError:
+            return -1.0
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = sorted(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - t0
+    ok = [x for x in latencies if x >= 0]
+    streamed = "".join(
+        json.loads(line[5:])["choices"][0]["delta"]["content"]
+        for line in client.stream_lines("POST", base + "/chat/completions", json={"stream": True, "messages": [{"role": "user", "content": "流"}]})
+        if line.startswith(b"data:") and line != b"data: [DONE]"
+    )
+    report = {
+        "wall_s": round(wall, 3),
+        "ok": len(ok),
+        "errors": len(latencies) - len(ok),
+        "p50_ms": round(ok[len(ok) // 2] * 1000, 2) if ok else None,
+        "p99_ms": round(ok[min(len(ok) - 1, int(0.99 * len(ok)))] * 1000, 2) if ok else None,
+        "stream": streamed,
+        "client": client.stats(),
+        "server": dict(state.counts),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    client.close()
+    server.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per request")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests that take --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--selftest", action="store_true", help="run the shared client against the server and print stats")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--distinct", type=int, default=50, help="distinct prompts in the self-test (fewer = more coalescing)")
+    parser.add_argument("--rps", type=float, default=0.0, help="client rate limit in the self-test (0 = none)")
+    parser.add_argument("--hedge-after", type=float, default=None)
+    args = parser.parse_args()
+
+    state = MockState(args.latency, args.slow_rate, args.slow_latency, args.fail_rate, args.throttle_rate, args.seed)
+    if args.selftest:
+        selftest(args, state)
+        return
+    server = serve(args.host, args.port, state)
+    print(f"mock provider on http://{args.host}:{server.server_address[1]}  (GET /stats)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Train and evaluate the local tool-selection classifier (reasoning.tool_selection: model).
+
+Training data is JSONL of {"text", "label"}: the routing log written with
+reasoning.log_routing: true, hand-labelled files, or --synthetic N utterances
+labelled by the keyword router to bootstrap a model before logs exist.
+
+Usage:
+    python -m scripts.train_router train --data data/logs/routing.jsonl --out data/router_model.json
+    python -m scripts.train_router train --synthetic 5000 --out data/router_model.json
+    python -m scripts.train_router eval --model data/router_model.json --data held_out.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.corpus import conversation_corpus
+from core.reasoning import ToolRouter
+from core.tool_classifier import CascadeRouter, ToolClassifier, load_examples
+
+
+def gather(args: argparse.Namespace) -> Tuple[List[str], List[str]]:
+    texts, labels = load_examples(args.data or [])
+    if args.synthetic:
+        router = ToolRouter()
+        synth = conversation_corpus(args.synthetic, seed=args.seed)
+        texts += synth
+        labels += [router.select(t) for t in synth]
+    if not texts:
+        raise SystemExit("no training examples: pass --data and/or --synthetic")
+    return texts, labels
+
+
+def evaluate(model: ToolClassifier, texts: List[str], labels: List[str], confidence: float) -> Dict[str, object]:
+    heuristic = ToolRouter()
+    # No LLM here: below-confidence turns count as fallbacks and use the offline cascade path
+    cascade = CascadeRouter(model, heuristic, llm=None, confidence=confidence)
+    preds: List[str] = []
+    latencies: List[float] = []
+    low = 0
+    for text in texts:
+        t0 = time.perf_counter()
+        label, prob = model.predict(text)
+        latencies.append(time.perf_counter() - t0)
+        preds.append(label)
+        low += prob < confidence
+    cascade_preds = [cascade.select(t) for t in texts]
+    heuristic_preds = [heuristic.select(t) for t in texts]
+
+    per_label: Dict[str, Dict[str, float]] = {}
+    for label in sorted(set(labels) | set(preds)):
+        tp = sum(p == label and y == label for p, y in zip(preds, labels))
+        fp = sum(p == label and y != label for p, y in zip(preds, labels))
+        fn = sum(p != label and y == label for p, y in zip(preds, labels))
+        per_label[label] = {
+            "precision": round(tp / (tp + fp), 4) if tp + fp else 0.0,
+            "recall": round(tp / (tp + fn), 4) if tp + fn else 0.0,
+            "support": tp + fn,
+        }
+    confusion: Dict[str, Dict[str, int]] = {}
+    for p, y in zip(preds, labels):
+        row = confusion.setdefault(y, {})
+        row[p] = row.get(p, 0) + 1
+    latencies.sort()
+    n = len(texts)
+    return {
+        "examples": n,
+        "accuracy": round(sum(p == y for p, y in zip(preds, labels)) / n, 4),
+        "cascade_accuracy": round(sum(p == y for p, y in zip(cascade_preds, labels)) / n, 4),
+        "heuristic_accuracy": round(sum(p == y for p, y in zip(heuristic_preds, labels)) / n, 4),
+        "fallback_rate": round(low / n, 4),
+        "confidence": confidence,
+        "latency_us": {
+            "p50": round(statistics.median(latencies) * 1e6, 2),
+            "p99": round(latencies[min(n - 1, int(0.99 * n))] * 1e6, 2),
+        },
+        "per_label": per_label,
+        "confusion": confusion,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["train", "eval"])
+    parser.add_argument("--data", nargs="*", help="JSONL files of {text, label}")
+    parser.add_argument("--synthetic", type=int, default=0, help="add N keyword-labelled synthetic utterances")
+    parser.add_argument("--model", default="data/router_model.json", help="model to evaluate")
+    parser.add_argument("--out", default="data/router_model.json", help="where train writes the model")
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of examples held out for evaluation")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--lr", type=float, default=0.5)
+    parser.add_argument("--l2", type=float, default=1e-5)
+    parser.add_argument("--confidence", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    texts, labels = gather(args)
+    if args.command == "eval":
+        model = ToolClassifier.load(args.model)
+        print(json.dumps(evaluate(model, texts, labels, args.confidence), ensure_ascii=False, indent=2))
+        return
+
+    order = list(range(len(texts)))
+    random.Random(args.seed).shuffle(order)
+    cut = int(len(order) * (1 - args.holdout)) if args.holdout > 0 else len(order)
+    train, test = order[:cut], order[cut:]
+    t0 = time.perf_counter()
+    model = ToolClassifier().fit(
+        [texts[i] for i in train], [labels[i] for i in train], epochs=args.epochs, lr=args.lr, l2=args.l2, seed=args.seed
+    )
+    train_s = time.perf_counter() - t0
+    model.save(args.out)
+    report: Dict[str, object] = {"model": args.out, "train_examples": len(train), "train_s": round(train_s, 3)}
+    if test:
+        report["holdout"] = evaluate(model, [texts[i] for i in test], [labels[i] for i in test], args.confidence)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""Offline batch replay of recorded conversations across a process pool.
+
+Input is JSONL, one turn per line (e.g. ``{"session_id", "user_id",
+"text"}``, or ``{"request_id", "title", "body"}`` as in requests.jsonl).
+Turns are sharded to worker processes by session, so each session's
+turns run in file order through ``run_turn`` on one worker, while
+sessions run in parallel. Each worker owns its runtime. Workers share
+long-term memory when ``rag.shards`` enables the process-safe sharded
+store (only the first worker consolidates it); otherwise each writes to
+its own copy of the store. Results stream to an output JSONL with
+per-turn timings.
+
+Memory stays bounded on any input size: the input is streamed, worker
+queues are bounded, and each worker keeps at most ``max_sessions``
+conversation states (LRU). A checkpoint beside the output records the
+input offset below which every turn is done, the output length at that
+point, and the turns already done past it. A rerun truncates the output
+to that length and continues from there. Sessions that straddle a resume
+or an LRU eviction continue with a fresh short-term window; their
+long-term memories persist.
+"""
+from __future__ import annotations
+
+import copy
+import heapq
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+_DEFAULT_FIELDS = {
+    "session": ["session_id", "session", "conversation_id", "request_id"],
+    "user": ["user_id", "user"],
+    "text": ["text", "input", "body", "content"],
+}
+
+
+def _pick(record: Dict[str, Any], names: List[str]) -> Optional[str]:
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+def shard_of(session: str, workers: int) -> int:
+    # Stable across runs and processes (unlike hash()), so a resumed run keeps the same shards
+    return zlib.crc32(session.encode("utf-8")) % workers
+
+
+def _worker_config(config: Dict, shard: int) -> Dict:
+    conf = copy.deepcopy(config)
+    rag = conf.setdefault("rag", {})
+    if int(rag.get("shards", 0)) > 0:
+        # The sharded store is process-safe: workers share it, but only worker 0 consolidates it
+        if shard > 0:
+            conf.setdefault("memory_policy", {})["consolidate_interval"] = 0
+        return conf
+    # The plain memory store has a single writer per directory: one copy per worker
+    rag["persist_dir"] = os.path.join(str(rag.get("persist_dir", "data/vector_store")).rstrip("/"), f"replay-{shard:02d}")
+    os.makedirs(rag["persist_dir"], exist_ok=True)
+    return conf
+
+
+def _worker(shard: int, config: Dict, max_sessions: int, jobs: "mp.Queue", results: "mp.Queue") -> None:
+    from core.http_client import make_http_client
+    from ui.runtime import build_runtime, new_state
+
+    client = make_http_client(config)
+    graph = build_runtime(_worker_config(config, shard), partition_key="user", http_client=client)
+    sessions: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+    evicted = 0
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            offset, session, user, text, rid = job
+            entry = sessions.pop(session, None)
+            state, turn = entry if entry is not None else (new_state(config), 0)
+            state.extra["user_id"] = user or session
+            state.stt_text = text
+            out: Dict[str, Any] = {"offset": offset, "session": session, "turn": turn, "worker": shard}
+            if rid is not None:
+                out["id"] = rid
+            calls_before = len(state.tool_calls)
+            t0 = time.perf_counter()
+            try:
+                state = graph.run_turn(state)
+                out.update(
+                    reply=state.response_text,
+                    tools=[c.get("tool") for c in state.tool_calls[calls_before:]],
+                    retrieved=len(state.retrieved_context),
+                    memory_write=bool(state.should_write_memory),
+                )
+            except Exception as exc:
+                out["error"] = f"{type(exc).__name__}: {exc}"
+            out["ms"] = round((time.perf_counter() - t0) * 1000, 3)
+            sessions[session] = (state, turn + 1)
+            while len(sessions) > max_sessions:
+                sessions.popitem(last=False)
+                evicted += 1
+            results.put(out)
+    except KeyboardInterrupt:
+        pass  # Ctrl+C reaches the whole process group; the parent checkpoints
+    finally:
+        graph.close()
+        if client is not None:
+            client.close()
+        results.put({"done": shard, "evicted_sessions": evicted})
+
+
+class Checkpoint:
+    """Resume point of a replay, written atomically beside the output."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.offset = 0
+        self.out_bytes = 0
+        self.done: Set[int] = set()
+        self.turns = 0
+        self.errors = 0
+        self.complete = False
+
+    def load(self, input_path: str) -> bool:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        if data.get("input") != os.path.abspath(input_path):
+            return False
+        self.offset = int(data["offset"])
+        self.out_bytes = int(data["out_bytes"])
+        self.done = set(data.get("done", []))
+        self.turns = int(data.get("turns", 0))
+        self.errors = int(data.get("errors", 0))
+        self.complete = bool(data.get("complete", False))
+        return True
+
+    def save(self, input_path: str) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "input": os.path.abspath(input_path),
+                    "offset": self.offset,
+                    "out_bytes": self.out_bytes,
+                    "done": sorted(self.done),
+                    "turns": self.turns,
+                    "errors": self.errors,
+                    "complete": self.complete,
+                },
+                f,
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class BatchReplay:
+    def __init__(
+        self,
+        config: Dict,
+        input_path: str,
+        out_path: str,
+        workers: int = 4,
+        queue_size: int = 256,
+        max_sessions: int = 10000,
+        checkpoint_every: int = 500,
+        fields: Optional[Dict[str, List[str]]] = None,
+        fresh: bool = False,
+    ) -> None:
+        self.config = config
+        self.input_path = input_path
+        self.out_path = out_path
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.max_sessions = max(1, max_sessions)
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.fields = {**_DEFAULT_FIELDS, **(fields or {})}
+        self.ckpt = Checkpoint(out_path + ".checkpoint")
+        self.fresh = fresh
+        self.latencies: List[float] = []  # sample for the summary; bounded below
+        self._inflight: List[int] = []  # heap of dispatched offsets
+        self._finished: Set[int] = set()  # completed offsets still in the heap
+        self._since_ckpt = 0
+        self._read_offset = 0
+
+    def parse(self, line: bytes) -> Tuple[Optional[Tuple[str, Optional[str], str, Optional[str]]], Optional[str]]:
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            return None, f"invalid JSON: {exc}"
+        if not isinstance(record, dict):
+            return None, "not a JSON object"
+        session = _pick(record, self.fields["session"])
+        text = _pick(record, self.fields["text"])
+        if session is None or text is None:
+            return None, "missing session or text field"
+        return (session, _pick(record, self.fields["user"]), text, record.get("request_id") or record.get("id")), None
+
+    # -- output and checkpoint ---------------------------------------------
+    def _emit(self, out, record: Dict[str, Any]) -> None:
+        out.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        offset = record["offset"]
+        self.ckpt.turns += 1
+        self.ckpt.errors += "error" in record
+        if "ms" in record and len(self.latencies) < 100000:
+            self.latencies.append(record["ms"])
+        self._finished.add(offset)
+        self._since_ckpt += 1
+
+    def _watermark(self, read_offset: int) -> int:
+        while self._inflight and self._inflight[0] in self._finished:
+            self._finished.discard(heapq.heappop(self._inflight))
+        return self._inflight[0] if self._inflight else read_offset
+
+    def _checkpoint(self, out, read_offset: int, complete: bool = False) -> None:
+        out.flush()
+        os.fsync(out.fileno())
+        self.ckpt.offset = self._watermark(read_offset)
+        self.ckpt.out_bytes = out.tell()
+        self.ckpt.done = {o for o in self._finished if o >= self.ckpt.offset} | {o for o in self.ckpt.done if o >= self.ckpt.offset}
+        self.ckpt.complete = complete
+        self.ckpt.save(self.input_path)
+        self._since_ckpt = 0
+
+    # -- main loop -----------------------------------------------------------
+    def run(self) -> Dict[str, Any]:
+        resumed = not self.fresh and self.ckpt.load(self.input_path)
+        if resumed and self.ckpt.complete:
+            return {"complete": True, "turns": self.ckpt.turns, "errors": self.ckpt.errors, "resumed": True, "new_turns": 0}
+        if not resumed:
+            self.ckpt = Checkpoint(self.ckpt.path)
+        skip = set(self.ckpt.done)
+        start_turns = self.ckpt.turns
+
+        ctx = mp.get_context("spawn")
+        jobs = [ctx.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(i, self.config, self.max_sessions, jobs[i], results), daemon=True) for i in range(self.workers)]
+        for p in procs:
+            p.start()
+
+        t0 = time.perf_counter()
+        worker_stats: Dict[int, Dict[str, Any]] = {}
+        mode = "r+b" if resumed and os.path.exists(self.out_path) else "wb"
+        with open(self.input_path, "rb") as src, open(self.out_path, mode) as out:
+            out.truncate(self.ckpt.out_bytes if mode == "r+b" else 0)
+            out.seek(0, os.SEEK_END)
+            src.seek(self.ckpt.offset)
+            read_offset = self.ckpt.offset
+            try:
+                read_offset = self._dispatch(src, out, jobs, results, procs, worker_stats, skip)
+            except KeyboardInterrupt:
+                # Everything written so far is kept; turns still in flight rerun on resume
+                self._checkpoint(out, self._read_offset)
+                raise
+            for q in jobs:
+                q.put(None)
+            while len(worker_stats) < self.workers:
+                self._drain(out, results, procs, worker_stats, read_offset)
+            self._checkpoint(out, read_offset, complete=True)
+        for p in procs:
+            p.join()
+
+        wall = time.perf_counter() - t0
+        lat = sorted(self.latencies)
+        new_turns = self.ckpt.turns - start_turns
+        return {
+            "complete": True,
+            "resumed": resumed,
+            "turns": self.ckpt.turns,
+            "new_turns": new_turns,
+            "errors": self.ckpt.errors,
+            "wall_s": round(wall, 3),
+            "turns_per_s": round(new_turns / wall, 2) if wall > 0 else 0.0,
+            "p50_ms": lat[len(lat) // 2] if lat else None,
+            "p99_ms": lat[min(len(lat) - 1, int(0.99 * len(lat)))] if lat else None,
+            "evicted_sessions": sum(s.get("evicted_sessions", 0) for s in worker_stats.values()),
+        }
+
+    def _dispatch(self, src, out, jobs: List[Any], results: "mp.Queue", procs: List[Any], worker_stats: Dict[int, Dict[str, Any]], skip: Set[int]) -> int:
+        """Stream the input into the shard queues; returns the offset read up to."""
+        self._read_offset = src.tell()
+        while True:
+            offset = src.tell()
+            line = src.readline()
+            if not line:
+                return self._read_offset
+            self._read_offset = src.tell()
+            if offset in skip or not line.strip():
+                continue
+            parsed, error = self.parse(line)
+            heapq.heappush(self._inflight, offset)
+            if parsed is None:
+                self._emit(out, {"offset": offset, "error": error})
+                continue
+            session, user, text, rid = parsed
+            target = jobs[shard_of(session, self.workers)]
+            job = (offset, session, user, text, rid)
+            # A full shard queue blocks the reader (bounded memory); keep draining results meanwhile
+            while True:
+                try:
+                    target.put(job, timeout=0.05)
+                    break
+                except queue.Full:
+                    self._drain(out, results, procs, worker_stats, self._read_offset)
+            self._drain(out, results, procs, worker_stats, self._read_offset, block=False)
+
+    def _drain(self, out, results: "mp.Queue", procs: List[Any], worker_stats: Dict[int, Dict[str, Any]], read_offset: int, block: bool = True) -> None:
+        try:
+            item = results.get(timeout=0.05) if block else results.get_nowait()
+        except queue.Empty:
+            dead = [i for i, p in enumerate(procs) if not p.is_alive() and i not in worker_stats]
+            if dead:
+                raise RuntimeError(f"replay worker {dead[0]} exited unexpectedly; rerun to resume from the last checkpoint")
+            return
+        while True:
+            if "done" in item:
+                worker_stats[item["done"]] = item
+            else:
+                self._emit(out, item)
+            try:
+                item = results.get_nowait()
+            except queue.Empty:
+                break
+        if self._since_ckpt >= self.checkpoint_every:
+            self._checkpoint(out, read_offset)
+
+
+def run_batch(config: Dict, input_path: str, out_path: Optional[str] = None, workers: Optional[int] = None, fresh: bool = False) -> None:
+    conf = config.get("batch") or {}
+    out_path = out_path or conf.get("out") or os.path.splitext(input_path)[0] + ".replay.jsonl"
+    replay = BatchReplay(
+        config,
+        input_path,
+        out_path,
+        workers=int(workers or conf.get("workers", os.cpu_count() or 1)),
+        queue_size=int(conf.get("queue_size", 256)),
+        max_sessions=int(conf.get("max_sessions", 10000)),
+        checkpoint_every=int(conf.get("checkpoint_every", 500)),
+        fields=conf.get("fields"),
+        fresh=fresh,
+    )
+    print(f"回放 {input_path} -> {out_path}（{replay.workers} 个进程）", file=sys.stderr)
+    try:
+        summary = replay.run()
+    except KeyboardInterrupt:
+        print("\n已中断；重新运行同一命令即可从检查点继续。", file=sys.stderr)
+        return
+    print(json.dumps(summary, ensure_ascii=False))
@@ -1,65 +1,95 @@
 from __future__ import annotations
 
+import asyncio
 import sys
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, Optional
 
 from core.state import AgentState
-from core.llm_manager import LLMManager
-from core.memory_manager import MemoryManager
-try:
-    from core.langgraph_builder import build_graph  # Prefer LangGraph, will auto-fallback internally
-except Exception:
-    from core.graph_builder import build_graph
+from core.instrumentation import format_turn, make_instrumentation
+from core.http_client import make_http_client
+from core.startup import PROFILE, phase
+from ui.runtime import build_runtime, build_tts, resume_state
 
+if TYPE_CHECKING:  # pragma: no cover
+    from voice.player import AudioPlayer
+    from voice.tts import TTSEngine
 
-def load_text(path: str) -> str:
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read()
-    except FileNotFoundError:
-        return ""
 
+async def stream_reply(graph, state: AgentState, tts: Optional[TTSEngine] = None, player: Optional[AudioPlayer] = None) -> None:
+    """Print the reply as it streams; with TTS, synthesis starts at each sentence boundary."""
+    loop = asyncio.get_running_loop()
+    splitter = None
+    if tts is not None:
+        # The voice stack is only imported when TTS is on
+        from voice.tts import SentenceSplitter
 
-def run_cli(config: Dict) -> None:
-    llm_conf = config.get("llm", {})
-    rag_conf = config.get("rag", {})
-    prompts_conf = config.get("prompts", {})
+        splitter = SentenceSplitter()
+    synth = []
+    print("她: ", end="", flush=True)
+    async for delta in graph.astream_turn(state):
+        print(delta, end="", flush=True)
+        if splitter is not None:
+            for sentence in splitter.feed(delta):
+                synth.append(loop.run_in_executor(None, tts.synthesize_frame, sentence))
+    print()
+    if splitter is not None:
+        for sentence in splitter.flush():
+            synth.append(loop.run_in_executor(None, tts.synthesize_frame, sentence))
+    # A failed synthesis (provider down after retries) must not end the conversation
+    results = await asyncio.gather(*synth, return_exceptions=True)
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        print(f"（语音合成失败：{failed[0]}）", file=sys.stderr)
+    if player is not None:
+        for audio in results:
+            if not isinstance(audio, BaseException):
+                await loop.run_in_executor(None, player.play_frame, audio)
 
-    system_prompt = load_text(prompts_conf.get("system_prompt", ""))
-    memory_prompt = load_text(prompts_conf.get("memory_prompt", ""))
 
-    llm = LLMManager(
-        provider=llm_conf.get("provider", "openai"),
-        model=llm_conf.get("model", "gpt-4o-mini"),
-        temperature=float(llm_conf.get("temperature", 0.7)),
-        api_key_env=llm_conf.get("api_key_env", "OPENAI_API_KEY"),
-    )
-    memory = MemoryManager(
-        persist_path=rag_conf.get("persist_dir", "data/vector_store/memories.jsonl") + "/memories.jsonl"
-        if rag_conf.get("persist_dir", "").endswith("/")
-        else f"{rag_conf.get('persist_dir', 'data/vector_store')}/memories.jsonl",
-        top_k=int(rag_conf.get("top_k", 4)),
-    )
+def run_cli(config: Dict, profile: bool = False, session: Optional[str] = None) -> None:
+    ui_conf = config.get("ui", {})
 
-    graph = build_graph(
-        llm=llm,
-        memory=memory,
-        prompts={"system": system_prompt, "memory": memory_prompt},
-    )
+    instrumentation = make_instrumentation(config, profile=profile)
+    # One pooled provider client for the LLM and TTS
+    client = make_http_client(config)
+    graph = build_runtime(config, instrumentation=instrumentation, http_client=client)
 
-    print("Her 风格对话（输入 'exit' 退出）")
-    state = AgentState()
-    while True:
-        try:
-            user_in = input("你: ").strip()
-        except (EOFError, KeyboardInterrupt):
-            print("\n再见👋")
-            break
-        if user_in.lower() in {"exit", "quit"}:
-            print("再见👋")
-            break
-        state.add_user_message(user_in, source="cli")
-        state.stt_text = user_in  # In CLI mode, treat text input as STT output directly
-        state = graph.run_turn(state)
-        print(f"她: {state.response_text}")
+    tts = build_tts(config, client)
+    player = None
+    if tts is not None:
+        with phase("audio player"):
+            from voice.player import AudioPlayer
+
+            player = AudioPlayer()
+    stream = bool(ui_conf.get("stream", True))
 
+    PROFILE.ready()
+    print("Her 风格对话（输入 'exit' 退出）")
+    state = resume_state(config, graph, session)
+    # One loop for the whole session; memory writes drain in the background between turns
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                user_in = input("你: ").strip()
+            except (EOFError, KeyboardInterrupt):
+                print("\n再见👋")
+                break
+            if user_in.lower() in {"exit", "quit"}:
+                print("再见👋")
+                break
+            state.stt_text = user_in  # In CLI mode, treat text input as STT output directly
+            if stream:
+                loop.run_until_complete(stream_reply(graph, state, tts, player))
+            else:
+                state = loop.run_until_complete(graph.arun_turn(state))
+                print(f"她: {state.response_text}")
+            if profile and instrumentation.last_turn is not None:
+                print(format_turn(instrumentation.last_turn))
+    finally:
+        if player is not None:
+            player.close()
+        graph.close()
+        if client is not None:
+            client.close()
+        loop.close()
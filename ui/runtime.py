@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import atexit
+import json
+import threading
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from core.state import AgentState, ConversationWindow
+from core.llm_manager import LLMManager
+from core.http_client import HttpClient, make_http_client
+from core.memory_manager import MemoryManager
+from core.sharded_memory import ShardedMemory
+from core.time_index import make_tier_spec
+from core.tokenizer import get_tokenizer
+from core.embedding import embedding_available, get_embedder
+from core.dense_index import make_dense_retriever
+from core.batching import make_batching_embedder, make_summarizer
+from core.memory_policy import make_memory_policy
+from core.instrumentation import Instrumentation
+from core.cache import make_cache
+from core.keyword_matcher import make_keyword_rules
+from core.reasoning import ToolRouter
+from core.tool_classifier import make_router
+from core.planner import make_planner
+from core.checkpoint import make_checkpointer, make_langgraph_saver
+from core.startup import phase, read_text
+from core.langgraph_builder import build_graph  # Prefers LangGraph when installed, imported on first use
+
+if TYPE_CHECKING:  # pragma: no cover
+    from voice.speech_recognition import STTEngine
+    from voice.tts import TTSEngine
+
+
+def load_text(path: str) -> str:
+    # Cached per process, re-read when the file changes
+    return read_text(path)
+
+
+def build_llm(config: Dict, client: Optional[HttpClient] = None) -> LLMManager:
+    llm_conf = config.get("llm", {})
+    return LLMManager(
+        provider=llm_conf.get("provider", "openai"),
+        model=llm_conf.get("model", "gpt-4o-mini"),
+        temperature=float(llm_conf.get("temperature", 0.7)),
+        api_key_env=llm_conf.get("api_key_env", "OPENAI_API_KEY"),
+        stream_token_delay=float(llm_conf.get("stream_token_delay", 0.0)),
+        client=client,
+        base_url=llm_conf.get("base_url", ""),
+    )
+
+
+def build_tts(config: Dict, client: Optional[HttpClient] = None) -> Optional[TTSEngine]:
+    tts_conf = config.get("tts", {})
+    if not tts_conf.get("enabled"):
+        return None
+    from voice.tts import TTSEngine
+
+    return TTSEngine(
+        provider=tts_conf.get("provider", "openai"),
+        voice=tts_conf.get("voice", "allison"),
+        model=tts_conf.get("model", "tts-1"),
+        client=client,
+        api_key_env=tts_conf.get("api_key_env", "OPENAI_API_KEY"),
+        base_url=tts_conf.get("base_url", ""),
+    )
+
+
+def build_stt(config: Dict, client: Optional[HttpClient] = None) -> STTEngine:
+    stt_conf = config.get("stt", {})
+    from voice.speech_recognition import STTEngine
+
+    return STTEngine(
+        provider=stt_conf.get("provider", "openai"),
+        model=stt_conf.get("model", "whisper-1"),
+        client=client,
+        api_key_env=stt_conf.get("api_key_env", "OPENAI_API_KEY"),
+        base_url=stt_conf.get("base_url", ""),
+    )
+
+
+def build_memory(config: Dict, partition_key: Optional[str] = None) -> MemoryManager:
+    rag_conf = config.get("rag", {})
+    if int(rag_conf.get("shards", 0)) > 0:
+        return ShardedMemory(
+            str(Path(rag_conf.get("persist_dir", "data/vector_store")) / "shards"),
+            shards=int(rag_conf["shards"]),
+            shard_key=rag_conf.get("shard_key", "user"),
+            top_k=int(rag_conf.get("top_k", 4)),
+            backend=rag_conf.get("scoring_backend", "auto"),
+            tokenizer=get_tokenizer(rag_conf.get("tokenizer", "cjk"), stopwords=bool(rag_conf.get("stopwords", False))),
+            partition_key=partition_key,
+            tiers=make_tier_spec(rag_conf),
+        )
+    persist_path = (
+        rag_conf.get("persist_dir", "data/vector_store/memories.jsonl") + "/memories.jsonl"
+        if rag_conf.get("persist_dir", "").endswith("/")
+        else f"{rag_conf.get('persist_dir', 'data/vector_store')}/memories.jsonl"
+    )
+    tokenizer = get_tokenizer(rag_conf.get("tokenizer", "cjk"), stopwords=bool(rag_conf.get("stopwords", False)))
+    retrieval = rag_conf.get("retrieval", "lexical")
+    dense = None
+    if retrieval in {"dense", "hybrid"}:
+        dense = make_dense_retriever(
+            Path(persist_path).with_suffix(".dense"),
+            make_batching_embedder(
+                config,
+                get_embedder(rag_conf.get("embedding_model", "hashing"), int(rag_conf.get("embedding_dim", 256)), tokenizer),
+            )
+            if embedding_available()
+            else None,
+            vector_store=rag_conf.get("vector_store", "faiss"),
+            nprobe=int(rag_conf.get("nprobe", 8)),
+        )
+    return MemoryManager(
+        persist_path=persist_path,
+        top_k=int(rag_conf.get("top_k", 4)),
+        backend=rag_conf.get("scoring_backend", "auto"),
+        tokenizer=tokenizer,
+        storage=rag_conf.get("storage", "jsonl"),
+        retrieval=retrieval,
+        dense=dense,
+        hybrid_alpha=float(rag_conf.get("hybrid_alpha", 0.5)),
+        partition_key=partition_key,
+        tiers=make_tier_spec(rag_conf),
+    )
+
+
+def build_runtime(
+    config: Dict,
+    partition_key: Optional[str] = None,
+    instrumentation: Optional[Instrumentation] = None,
+    http_client: Optional[HttpClient] = None,
+) -> Any:
+    """LLM + long-term memory + dialogue graph, shared by the CLI and web modes.
+
+    ``http_client`` is the provider client shared with the voice engines; the
+    caller owns it and closes it.
+    """
+    with phase("runtime"):
+        prompts_conf = config.get("prompts", {})
+        with phase("prompts"):
+            system_prompt = load_text(prompts_conf.get("system_prompt", ""))
+            memory_prompt = load_text(prompts_conf.get("memory_prompt", ""))
+        with phase("llm"):
+            llm = build_llm(config, http_client)
+        with phase("memory index"):
+            memory = build_memory(config, partition_key=partition_key)
+        with phase("routing"):
+            keyword_rules = make_keyword_rules(config)
+            heuristic = ToolRouter(keyword_rules)
+            router = make_router(config, llm, heuristic)
+            planner = make_planner(config, heuristic)
+        with phase("cache + memory policy"):
+            cache = make_cache(config)
+            summarizer = make_summarizer(config, llm, memory_prompt)
+            memory_policy = make_memory_policy(config, memory, llm, memory_prompt)
+        with phase("checkpoints"):
+            checkpointer = make_checkpointer(config)
+            ckpt_conf = config.get("checkpoint") or {}
+            langgraph_saver = None
+            if checkpointer is not None and ckpt_conf.get("langgraph_saver", False):
+                # Built when the graph compiles, so langgraph is still imported lazily
+                langgraph_saver = partial(
+                    make_langgraph_saver,
+                    str(checkpointer.directory / "langgraph"),
+                    snapshot_every=checkpointer.snapshot_every,
+                    fsync=checkpointer.fsync,
+                )
+        with phase("graph"):
+            return build_graph(
+                llm=llm,
+                memory=memory,
+                prompts={"system": system_prompt, "memory": memory_prompt},
+                instrumentation=instrumentation,
+                cache=cache,
+                keyword_rules=keyword_rules,
+                router=router,
+                planner=planner,
+                summarizer=summarizer,
+                memory_policy=memory_policy,
+                checkpointer=checkpointer,
+                langgraph_saver=langgraph_saver,
+            )
+
+
+_warm: Dict[Tuple[str, Optional[str]], Any] = {}
+_warm_lock = threading.Lock()
+
+
+def get_runtime(config: Dict, partition_key: Optional[str] = None) -> Any:
+    """A runtime built and warmed once per process for this config.
+
+    For handlers invoked many times in one process (serverless, embedding
+    the agent): the memory index, compiled graph and tools load on the first
+    call only. The runtime owns its HTTP client and closes at exit.
+    """
+    key = (json.dumps(config, sort_keys=True, default=str), partition_key)
+    with _warm_lock:
+        graph = _warm.get(key)
+        if graph is None:
+            client = make_http_client(config)
+            graph = build_runtime(config, partition_key=partition_key, http_client=client)
+            graph.warm()
+            _warm[key] = graph
+            # atexit runs last-registered first: the graph flushes before its client closes
+            if client is not None:
+                atexit.register(client.close)
+            atexit.register(graph.close)
+        return graph
+
+
+def resume_state(config: Dict, graph: Any, session: Optional[str] = None) -> AgentState:
+    """A new state for a single-session UI, continuing its checkpointed session when checkpoints are on."""
+    state = new_state(config)
+    conf = config.get("checkpoint") or {}
+    if conf.get("enabled", False):
+        state.extra["session_id"] = session or conf.get("session", "cli")
+        if graph.resume(state):
+            print(f"（已恢复会话 {state.extra['session_id']}：{len(state.messages)} 条消息）")
+    return state
+
+
+def new_state(config: Dict) -> AgentState:
+    conv_conf = config.get("conversation", {})
+    return AgentState(
+        messages=ConversationWindow(
+            max_messages=int(conv_conf.get("max_messages", 20)),
+            token_budget=int(conv_conf.get("token_budget", 2000)),
+        )
+    )
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from typing import Dict
+
+from core.http_client import make_http_client
+from core.instrumentation import make_instrumentation
+from core.startup import PROFILE
+from voice.audio import FRAME_MS, paced
+from voice.microphone import Microphone
+from voice.pipeline import as_async, make_voice_pipeline
+from voice.player import AudioPlayer
+from ui.runtime import build_runtime, build_stt, build_tts, resume_state
+
+
+def format_voice_turn(metrics: Dict) -> str:
+    return (
+        f"  [voice] speech {metrics['speech_ms']:.0f}ms, partials {metrics['partials']}; from end of speech: "
+        f"transcript {metrics['transcript_ms']}ms, first token {metrics['first_token_ms']}ms, "
+        f"first audio {metrics['first_audio_ms']}ms, done {metrics['done_ms']}ms"
+    )
+
+
+def run_voice(config: Dict, profile: bool = False) -> None:
+    voice_conf = config.get("voice") or {}
+    frame_ms = int(voice_conf.get("frame_ms", FRAME_MS))
+
+    instrumentation = make_instrumentation(config, profile=profile)
+    client = make_http_client(config)
+    graph = build_runtime(config, instrumentation=instrumentation, http_client=client)
+    player = AudioPlayer()
+    device = voice_conf.get("device") or {}
+    mic = Microphone(
+        voice_conf.get("source") or None,
+        int(voice_conf.get("sample_rate", 16000)),
+        device_rate=device.get("rate"),
+        device_channels=int(device.get("channels", 1)),
+        device_format=device.get("format", "int16"),
+        ring_slots=int(device.get("ring_slots", 64)),
+    )
+
+    def on_partial(text: str) -> None:
+        print(f"\r（听到）{text}", end="", flush=True)
+
+    def on_transcript(text: str) -> None:
+        print(f"\r你: {text}\n她: ", end="", flush=True)
+
+    def on_delta(delta: str) -> None:
+        print(delta, end="", flush=True)
+
+    pipeline = make_voice_pipeline(
+        config, graph, build_stt(config, client), build_tts(config, client), player, on_partial=on_partial, on_transcript=on_transcript, on_delta=on_delta
+    )
+    pipeline.sample_rate = mic.sample_rate
+    state = resume_state(config, graph)
+    PROFILE.ready()
+    print("Her 语音对话（Ctrl+C 退出）")
+
+    async def session() -> None:
+        # A WAV source is replayed at capture speed so turn timings match a live microphone
+        frames = paced(mic.frames(frame_ms), frame_ms) if mic.source else as_async(mic.frames(frame_ms))
+        while True:
+            metrics = await pipeline.run_turn(frames, state)
+            if metrics is None:
+                return
+            print()
+            if not metrics["transcript"]:
+                print("（没有听清，请再说一遍）")
+                continue
+            if metrics["tts_errors"]:
+                print(f"（语音合成失败 {metrics['tts_errors']} 句）", file=sys.stderr)
+            if profile:
+                print(format_voice_turn(metrics))
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(session())
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as exc:
+        print(exc)
+    finally:
+        print("再见👋")
+        player.close()
+        graph.close()
+        if client is not None:
+            client.close()
+        loop.close()
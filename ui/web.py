@@ -0,0 +1,392 @@
+"""Multi-session HTTP mode (app.mode: web), stdlib asyncio only.
+
+Endpoints:
+    GET  /                 health + session/queue stats
+    GET  /hello/{name}     smoke test used by test_main.http
+    GET  /metrics          Prometheus text (when instrumentation is enabled)
+    POST /chat             {"text", "session_id"?, "user_id"?} -> {"session_id", "response"}
+    POST /chat/stream      same body; chunked NDJSON: {"delta": ...}* then {"done": true, ...}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.state import AgentState
+from core.http_client import make_http_client
+from core.instrumentation import make_instrumentation
+from core.startup import PROFILE, phase
+from ui.runtime import build_runtime, new_state
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Session:
+    __slots__ = ("session_id", "user_id", "state", "lock", "last_seen")
+
+    def __init__(self, session_id: str, user_id: str, state: AgentState) -> None:
+        self.session_id = session_id
+        self.user_id = user_id
+        self.state = state
+        # Turns of one conversation run in order; different sessions run in parallel
+        self.lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    """Per-session AgentState in an LRU bounded by size, with idle eviction."""
+
+    def __init__(
+        self,
+        config: Dict,
+        max_sessions: int = 1000,
+        idle_seconds: float = 1800.0,
+        resume: Optional[Callable[[AgentState], bool]] = None,
+    ) -> None:
+        self.config = config
+        # Loads a checkpointed session into a new state (see DialogueGraph.resume); None starts every session fresh
+        self.resume = resume
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: Optional[str], user_id: Optional[str]) -> Session:
+        sid = session_id or uuid.uuid4().hex
+        session = self._sessions.get(sid)
+        if session is None:
+            state = new_state(self.config)
+            if self.resume is not None:
+                state.extra["session_id"] = sid
+                self.resume(state)
+            uid = user_id or state.extra.get("user_id") or sid
+            state.extra["user_id"] = uid
+            session = Session(sid, uid, state)
+            self._sessions[sid] = session
+        self._sessions.move_to_end(sid)
+        session.last_seen = time.monotonic()
+        self._evict()
+        return session
+
+    def _evict(self) -> None:
+        while len(self._sessions) > self.max_sessions:
+            sid, session = next(iter(self._sessions.items()))
+            if session.lock.locked():
+                break
+            del self._sessions[sid]
+        self.evict_idle()
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_seconds
+        evicted = 0
+        # Oldest first: stop at the first session that is still fresh
+        for sid in list(self._sessions):
+            session = self._sessions[sid]
+            if session.last_seen >= cutoff:
+                break
+            if not session.lock.locked():
+                del self._sessions[sid]
+                evicted += 1
+        return evicted
+
+
+Job = Callable[[], Awaitable[None]]
+
+
+class WebServer:
+    def __init__(self, config: Dict, graph: Any = None) -> None:
+        web_conf = ((config.get("ui") or {}).get("web") or {})
+        self.config = config
+        self.host = web_conf.get("host", "0.0.0.0")
+        self.port = int(web_conf.get("port", 8000))
+        self.workers = int(web_conf.get("workers", 8))
+        self.instrumentation = make_instrumentation(config) if graph is None else None
+        # Long-term memory is shared and partitioned by user id
+        self.http_client = make_http_client(config) if graph is None else None
+        self.graph = graph if graph is not None else build_runtime(
+            config, partition_key="user", instrumentation=self.instrumentation, http_client=self.http_client
+        )
+        self.sessions = SessionStore(
+            config,
+            max_sessions=int(web_conf.get("max_sessions", 1000)),
+            idle_seconds=float(web_conf.get("session_idle_seconds", 1800)),
+            resume=self.graph.resume if (config.get("checkpoint") or {}).get("enabled", False) else None,
+        )
+        self.queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=int(web_conf.get("queue_size", 64)))
+        self._tasks: list = []
+
+    # -- worker pool --------------------------------------------------------
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            try:
+                await job()
+            except Exception:
+                pass  # the job reports its own failure to the waiting request
+            finally:
+                self.queue.task_done()
+
+    async def _sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, self.sessions.idle_seconds / 4))
+            self.sessions.evict_idle()
+
+    def _submit(self, job: Job) -> None:
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise HTTPError(503, "server busy, retry later")
+
+    # -- handlers -----------------------------------------------------------
+    async def chat(self, body: Dict) -> Dict:
+        text, session = self._parse_chat(body)
+        done: "asyncio.Future[Dict]" = asyncio.get_running_loop().create_future()
+
+        async def job() -> None:
+            try:
+                async with session.lock:
+                    session.state.stt_text = text
+                    session.state = await self.graph.arun_turn(session.state)
+                    reply = session.state.response_text
+                done.set_result({"session_id": session.session_id, "response": reply})
+            except Exception as exc:
+                done.set_exception(exc)
+
+        self._submit(job)
+        return await done
+
+    async def chat_stream(self, body: Dict, send_chunk: Callable[[bytes], Awaitable[None]]) -> None:
+        text, session = self._parse_chat(body)
+        deltas: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        failure: list = []
+
+        async def job() -> None:
+            try:
+                async with session.lock:
+                    session.state.stt_text = text
+                    async for delta in self.graph.astream_turn(session.state):
+                        deltas.put_nowait(delta)
+            except Exception as exc:
+                failure.append(exc)
+            finally:
+                deltas.put_nowait(None)
+
+        self._submit(job)
+        while True:
+            delta = await deltas.get()
+            if delta is None:
+                break
+            await send_chunk(_ndjson({"delta": delta}))
+        if failure:
+            await send_chunk(_ndjson({"done": True, "error": str(failure[0])}))
+        else:
+            await send_chunk(_ndjson({"done": True, "session_id": session.session_id, "response": session.state.response_text}))
+
+    def _parse_chat(self, body: Dict) -> Tuple[str, Session]:
+        if not isinstance(body, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        text = str(body.get("text") or "").strip()
+        if not text:
+            raise HTTPError(400, "missing 'text'")
+        for key in ("session_id", "user_id"):
+            if body.get(key) is not None and not isinstance(body[key], str):
+                raise HTTPError(400, f"'{key}' must be a string")
+        return text, self.sessions.get(body.get("session_id"), body.get("user_id"))
+
+    def stats(self) -> Dict:
+        stats = {
+            "app": (self.config.get("app") or {}).get("name", "her-agent"),
+            "sessions": len(self.sessions),
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "workers": self.workers,
+        }
+        cache = getattr(getattr(self.graph, "graph", self.graph), "cache", None)
+        if cache is not None:
+            stats["cache"] = cache.stats()
+        if self.http_client is not None:
+            stats["http"] = self.http_client.stats()
+        batchers = self._batchers()
+        if batchers:
+            stats["batching"] = {b.name: b.stats() for b in batchers}
+        return stats
+
+    def _batchers(self) -> list:
+        """Micro-batchers on the memory paths (summaries, embeddings), when enabled."""
+        seq = getattr(self.graph, "graph", self.graph)
+        dense = getattr(getattr(seq, "memory", None), "dense", None)
+        found = [getattr(seq, "summarizer", None), getattr(getattr(dense, "embedder", None), "batcher", None)]
+        return [b for b in found if b is not None]
+
+    # -- HTTP plumbing ------------------------------------------------------
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HTTPError as exc:
+                    await _write_json(writer, exc.status, {"error": exc.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                try:
+                    await self._dispatch(method, path, body, writer, keep_alive)
+                except HTTPError as exc:
+                    await _write_json(writer, exc.status, {"error": exc.message}, keep_alive)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    # A failed turn must not take the connection down without a response
+                    print(f"（请求处理失败：{method} {path}）", file=sys.stderr)
+                    traceback.print_exc()
+                    await _write_json(writer, 500, {"error": "internal error"}, keep_alive=False)
+                    break
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        path = path.split("?", 1)[0]
+        if method == "GET" and path == "/":
+            await _write_json(writer, 200, self.stats(), keep_alive)
+        elif method == "GET" and path == "/metrics" and self.instrumentation is not None:
+            text = self.instrumentation.prometheus() + "".join(b.prometheus() for b in self._batchers())
+            body = text.encode("utf-8")
+            writer.write(_head(200, "text/plain; version=0.0.4", keep_alive, len(body)) + body)
+            await writer.drain()
+        elif method == "GET" and path.startswith("/hello/"):
+            await _write_json(writer, 200, {"message": f"Hello {path[len('/hello/'):]}"}, keep_alive)
+        elif path in {"/chat", "/chat/stream"}:
+            if method != "POST":
+                raise HTTPError(405, "use POST")
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError:
+                raise HTTPError(400, "body must be JSON")
+            if path == "/chat":
+                await _write_json(writer, 200, await self.chat(payload), keep_alive)
+            else:
+                await self._stream_response(writer, payload, keep_alive)
+        else:
+            raise HTTPError(404, f"no route for {method} {path}")
+
+    async def _stream_response(self, writer: asyncio.StreamWriter, payload: Dict, keep_alive: bool) -> None:
+        started = False
+
+        async def send_chunk(data: bytes) -> None:
+            nonlocal started
+            if not started:
+                writer.write(_head(200, "application/x-ndjson", keep_alive, chunked=True))
+                started = True
+            writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            await writer.drain()
+
+        # Validation and backpressure errors surface before any chunk is sent
+        await self.chat_stream(payload, send_chunk)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def serve(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+        server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_HEADER_BYTES)
+        # A long-lived server pays for the deferred loads (graph compile, tools) before the first request
+        with phase("warm"):
+            self.graph.warm()
+        PROFILE.ready()
+        print(f"Her web 模式已启动: http://{self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            self.graph.close()
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if not exc.partial:
+            return None
+        raise HTTPError(400, "incomplete request")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "headers too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "bad content-length")
+    if length < 0:
+        raise HTTPError(400, "bad content-length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+def _head(status: int, content_type: str, keep_alive: bool, length: Optional[int] = None, chunked: bool = False) -> bytes:
+    lines = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}",
+        f"Content-Type: {content_type}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if chunked:
+        lines.append("Transfer-Encoding: chunked")
+    else:
+        lines.append(f"Content-Length: {length or 0}")
+    if status == 503:
+        lines.append("Retry-After: 1")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _write_json(writer: asyncio.StreamWriter, status: int, payload: Dict, keep_alive: bool) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(_head(status, "application/json; charset=utf-8", keep_alive, len(body)) + body)
+    await writer.drain()
+
+
+def _ndjson(payload: Dict) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def run_web(config: Dict) -> None:
+    server = WebServer(config)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        print("\n再见👋")
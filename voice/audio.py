@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import struct
+import sys
+import time
+import wave
+from array import array
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Union
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+# The voice pipeline moves 16-bit little-endian mono PCM in fixed-size frames
+SAMPLE_WIDTH = 2
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def frame_bytes(sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS) -> int:
+    return sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+
+
+def duration_ms(pcm: Union[Buffer, "AudioFrame"], sample_rate: int = SAMPLE_RATE) -> float:
+    if isinstance(pcm, AudioFrame):
+        return pcm.duration_ms
+    return len(pcm) / SAMPLE_WIDTH / sample_rate * 1000.0
+
+
+class AudioFrame:
+    """A span of 16-bit mono PCM and its sample rate, held as a memoryview.
+
+    Frames are views, not copies: slicing, ``samples`` and ``numpy`` share
+    the underlying buffer (a capture ring slot, a WAV file's data, an HTTP
+    response body). A frame taken from a FrameRing is only valid until the
+    ring reuses its slot; ``copy`` detaches it.
+    """
+
+    __slots__ = ("data", "sample_rate")
+
+    def __init__(self, data: Buffer, sample_rate: int = SAMPLE_RATE) -> None:
+        view = data if isinstance(data, memoryview) else memoryview(data)
+        self.data = view.cast("B") if view.format != "B" else view
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_wav(cls, path: str) -> "AudioFrame":
+        """File adapter: the PCM of a 16-bit WAV, downmixed to mono."""
+        from .dsp import FormatConverter
+
+        with wave.open(path, "rb") as w:
+            if w.getsampwidth() != SAMPLE_WIDTH:
+                raise ValueError(f"{path}: expected 16-bit PCM, got {8 * w.getsampwidth()}-bit")
+            channels, rate = w.getnchannels(), w.getframerate()
+            frame = cls(w.readframes(w.getnframes()), rate)
+        if channels > 1:
+            # One output slot sized to the file; the returned view keeps it alive
+            frame = FormatConverter("int16", channels, len(frame.data) // (SAMPLE_WIDTH * channels), slots=1).convert(frame.data, rate)
+        return frame
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __bytes__(self) -> bytes:
+        return self.data.tobytes()
+
+    def __getitem__(self, s: slice) -> "AudioFrame":
+        return AudioFrame(self.data[s], self.sample_rate)
+
+    @property
+    def num_samples(self) -> int:
+        return len(self.data) // SAMPLE_WIDTH
+
+    @property
+    def duration_ms(self) -> float:
+        return self.num_samples / self.sample_rate * 1000.0
+
+    def samples(self) -> memoryview:
+        """The PCM as a memoryview of native int16 (little-endian hosts)."""
+        return self.data[: self.num_samples * SAMPLE_WIDTH].cast("h")
+
+    def numpy(self):
+        """Zero-copy int16 ndarray over the frame (writable when the buffer is)."""
+        return np.frombuffer(self.data, dtype="<i2", count=self.num_samples)
+
+    def copy(self) -> "AudioFrame":
+        return AudioFrame(bytearray(self.data), self.sample_rate)
+
+    def wav_parts(self) -> List[Buffer]:
+        """WAV header and PCM view, for writers that take chunks (no copy of the audio)."""
+        return [wav_header(len(self.data), self.sample_rate), self.data]
+
+    def save(self, path: str) -> str:
+        """File adapter: write the frame as a WAV."""
+        with open(path, "wb") as f:
+            for part in self.wav_parts():
+                f.write(part)
+        return path
+
+
+def wav_header(nbytes: int, sample_rate: int = SAMPLE_RATE) -> bytes:
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + nbytes, b"WAVE", b"fmt ", 16, 1, 1,
+        sample_rate, sample_rate * SAMPLE_WIDTH, SAMPLE_WIDTH, 8 * SAMPLE_WIDTH, b"data", nbytes,
+    )
+
+
+class FrameRing:
+    """Preallocated ring of fixed-size PCM frames.
+
+    Capture writes device blocks of any size with ``write``; each frame
+    completed is handed out as an AudioFrame view of its slot, so the
+    steady state allocates nothing and copies each sample once (device
+    buffer -> slot). A view stays valid for ``slots - 1`` further frames;
+    consumers that keep audio longer (an utterance buffer) copy it out.
+    """
+
+    def __init__(self, frame_size: int, slots: int = 64, sample_rate: int = SAMPLE_RATE) -> None:
+        self.frame_size = frame_size
+        self.slots = max(2, slots)
+        self.sample_rate = sample_rate
+        self._buf = bytearray(frame_size * self.slots)
+        self._view = memoryview(self._buf)
+        self._slot = 0
+        self._fill = 0
+        self.frames_written = 0
+
+    def slot(self) -> memoryview:
+        """Writable view of the rest of the current slot, for ``readinto``-style capture."""
+        start = self._slot * self.frame_size
+        return self._view[start + self._fill:start + self.frame_size]
+
+    def commit(self, n: int) -> Optional[AudioFrame]:
+        """Mark ``n`` bytes written into ``slot()``; returns the frame if that completed it."""
+        self._fill += n
+        if self._fill < self.frame_size:
+            return None
+        start = self._slot * self.frame_size
+        frame = AudioFrame(self._view[start:start + self.frame_size], self.sample_rate)
+        self._slot = (self._slot + 1) % self.slots
+        self._fill = 0
+        self.frames_written += 1
+        return frame
+
+    def write(self, data: Buffer) -> List[AudioFrame]:
+        """Copy ``data`` into the ring; returns the frames it completed."""
+        src = data if isinstance(data, memoryview) else memoryview(data)
+        src = src.cast("B") if src.format != "B" else src
+        out: List[AudioFrame] = []
+        while len(src):
+            dst = self.slot()
+            n = min(len(dst), len(src))
+            dst[:n] = src[:n]
+            src = src[n:]
+            frame = self.commit(n)
+            if frame is not None:
+                out.append(frame)
+        return out
+
+
+def rms(frame: Union[Buffer, AudioFrame], scratch=None) -> float:
+    """Root-mean-square amplitude of one frame (0 to 32768).
+
+    With NumPy, ``scratch`` (a float32 array at least one frame long) avoids
+    allocating a widened copy per call.
+    """
+    if not isinstance(frame, AudioFrame):
+        frame = AudioFrame(frame)
+    n = frame.num_samples
+    if not n:
+        return 0.0
+    if np is not None:
+        x = frame.numpy()
+        if scratch is None or len(scratch) < n:
+            scratch = np.empty(n, dtype=np.float32)
+        y = scratch[:n]
+        np.copyto(y, x, casting="unsafe")
+        return math.sqrt(float(np.dot(y, y)) / n)
+    s = frame.samples()
+    if sys.byteorder == "big":  # pragma: no cover
+        s = array("h", frame.data.tobytes())
+        s.byteswap()
+    return math.sqrt(sum(x * x for x in s) / n)
+
+
+def iter_frames(audio: AudioFrame, frame_ms: int = FRAME_MS) -> Iterator[AudioFrame]:
+    """Fixed-size views over ``audio``; a short last frame is zero-padded (its only copy)."""
+    size = frame_bytes(audio.sample_rate, frame_ms)
+    for i in range(0, len(audio), size):
+        frame = audio[i:i + size]
+        if len(frame) < size:
+            padded = bytearray(size)
+            padded[: len(frame)] = frame.data
+            frame = AudioFrame(padded, audio.sample_rate)
+        yield frame
+
+
+def wav_frames(path: str, frame_ms: int = FRAME_MS, sample_rate: Optional[int] = None) -> Iterator[AudioFrame]:
+    """File adapter: frames of a WAV file, resampled to ``sample_rate`` when given."""
+    audio = AudioFrame.from_wav(path)
+    if sample_rate is None or sample_rate == audio.sample_rate:
+        yield from iter_frames(audio, frame_ms)
+        return
+    from .dsp import Resampler
+
+    resampler = Resampler(audio.sample_rate, sample_rate, frame_bytes(audio.sample_rate, frame_ms) // SAMPLE_WIDTH)
+    for frame in iter_frames(audio, frame_ms):
+        yield resampler.process(frame)
+
+
+async def paced(frames: Iterable[AudioFrame], frame_ms: int = FRAME_MS) -> AsyncIterator[AudioFrame]:
+    """Yield ``frames`` at capture speed, as a live microphone would deliver them."""
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        delay = start + (i + 1) * frame_ms / 1000.0 - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield frame
@@ -0,0 +1,164 @@
+"""Streaming resampling and sample-format conversion into preallocated buffers.
+
+Both work frame by frame and write into a small ring of output slots
+allocated up front, so steady-state capture allocates no sample buffers.
+Outputs are AudioFrame views of a slot, valid until the ring comes back
+to it (``slots`` calls later). With NumPy every step runs in place via
+``out=``; without it a pure-Python path gives the same results, slower.
+"""
+from __future__ import annotations
+
+import math
+from array import array
+from typing import List
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+from .audio import SAMPLE_WIDTH, AudioFrame, Buffer
+
+_FORMATS = {"int16": ("<i2", 1.0), "int32": ("<i4", 1.0 / 65536.0), "float32": ("<f4", 32767.0)}
+
+
+class _Slots:
+    """Ring of preallocated int16 output buffers."""
+
+    def __init__(self, slots: int, size: int) -> None:
+        self.size = size
+        if np is not None:
+            self.bufs = np.zeros((max(1, slots), size), dtype=np.int16)
+        else:
+            self.bufs = [array("h", bytes(size * SAMPLE_WIDTH)) for _ in range(max(1, slots))]
+        self.n = max(1, slots)
+        self.i = 0
+
+    def next(self):
+        buf = self.bufs[self.i]
+        self.i = (self.i + 1) % self.n
+        return buf
+
+
+def _frame(buf, m: int, sample_rate: int) -> AudioFrame:
+    return AudioFrame(memoryview(buf)[:m], sample_rate)
+
+
+class Resampler:
+    """Linear-interpolation resampler that keeps phase across frames.
+
+    Input frames of up to ``frame_samples`` int16 samples; the last sample
+    of each frame carries over, so frame boundaries leave no clicks.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, frame_samples: int, slots: int = 64) -> None:
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.ratio = in_rate / out_rate
+        self._phase = 0.0  # next output position, in input samples from this frame's first
+        self._prev = 0.0
+        self._slots_n = slots
+        self._alloc(frame_samples)
+
+    def _alloc(self, frame_samples: int) -> None:
+        self.frame_samples = frame_samples
+        self.max_out = int(math.ceil(frame_samples / self.ratio)) + 2
+        self._out = _Slots(self._slots_n, self.max_out)
+        if np is not None:
+            self._ext = np.zeros(frame_samples + 2, dtype=np.float32)
+            self._grid = np.arange(self.max_out, dtype=np.float64) * self.ratio
+            self._pos = np.empty(self.max_out, dtype=np.float64)
+            self._idx = np.empty(self.max_out, dtype=np.intp)
+            self._frac = np.empty(self.max_out, dtype=np.float32)
+            self._a = np.empty(self.max_out, dtype=np.float32)
+            self._b = np.empty(self.max_out, dtype=np.float32)
+
+    def process(self, frame: AudioFrame) -> AudioFrame:
+        if self.in_rate == self.out_rate:
+            return frame
+        n = frame.num_samples
+        if n == 0:
+            return AudioFrame(b"", self.out_rate)
+        if n > self.frame_samples:
+            self._alloc(n)  # only when frames grow; steady state reuses the buffers
+        m = min(self.max_out, int(math.floor((n - 1 - self._phase) / self.ratio)) + 1) if self._phase <= n - 1 else 0
+        out = self._out.next()
+        if np is not None:
+            x = frame.numpy()
+            ext = self._ext
+            ext[0] = self._prev
+            ext[1:n + 1] = x
+            ext[n + 1] = x[-1]
+            pos, idx, frac, a, b = self._pos[:m], self._idx[:m], self._frac[:m], self._a[:m], self._b[:m]
+            np.add(self._grid[:m], self._phase + 1.0, out=pos)  # positions in ``ext``, which starts at the carried sample
+            np.copyto(idx, pos, casting="unsafe")  # pos >= 0, so truncation is floor
+            np.subtract(pos, idx, out=frac, casting="unsafe")
+            np.take(ext, idx, out=a)
+            np.add(idx, 1, out=idx)
+            np.take(ext, idx, out=b)
+            np.subtract(b, a, out=b)
+            np.multiply(b, frac, out=b)
+            np.add(a, b, out=a)
+            np.rint(a, out=a)
+            np.clip(a, -32768, 32767, out=a)
+            np.copyto(out[:m], a, casting="unsafe")
+            self._prev = float(x[-1])
+        else:
+            x = frame.samples()
+            for k in range(m):
+                p = self._phase + k * self.ratio
+                i = int(math.floor(p))
+                f = p - i
+                s0 = x[i] if i >= 0 else self._prev
+                s1 = x[i + 1] if i + 1 < n else x[n - 1]
+                out[k] = max(-32768, min(32767, int(round(s0 + (s1 - s0) * f))))
+            self._prev = float(x[n - 1])
+        self._phase += m * self.ratio - n
+        return _frame(out, m, self.out_rate)
+
+
+class FormatConverter:
+    """Interleaved int16 / int32 / float32 samples of any channel count -> mono int16."""
+
+    def __init__(self, sample_format: str = "int16", channels: int = 1, frame_samples: int = 320, slots: int = 64) -> None:
+        if sample_format not in _FORMATS:
+            raise ValueError(f"unsupported sample format {sample_format!r}; expected one of {sorted(_FORMATS)}")
+        self.dtype, self.scale = _FORMATS[sample_format]
+        self.sample_format = sample_format
+        self.channels = max(1, channels)
+        self._slots_n = slots
+        self._alloc(frame_samples)
+
+    def _alloc(self, frame_samples: int) -> None:
+        self.frame_samples = frame_samples
+        self._out = _Slots(self._slots_n, frame_samples)
+        if np is not None:
+            self._acc = np.empty(frame_samples, dtype=np.float32)
+
+    def convert(self, data: Buffer, sample_rate: int) -> AudioFrame:
+        view = data if isinstance(data, memoryview) else memoryview(data)
+        view = view.cast("B") if view.format != "B" else view
+        width = int(self.dtype[-1])
+        n = len(view) // (width * self.channels)
+        if self.sample_format == "int16" and self.channels == 1:
+            return AudioFrame(view[: n * SAMPLE_WIDTH], sample_rate)  # already the pipeline format
+        if n > self.frame_samples:
+            self._alloc(n)
+        out = self._out.next()
+        if np is not None:
+            src = np.frombuffer(view, dtype=self.dtype, count=n * self.channels).reshape(n, self.channels)
+            acc = self._acc[:n]
+            np.mean(src, axis=1, out=acc)
+            if self.scale != 1.0:
+                np.multiply(acc, self.scale, out=acc)
+            np.rint(acc, out=acc)
+            np.clip(acc, -32768, 32767, out=acc)
+            np.copyto(out[:n], acc, casting="unsafe")
+        else:
+            code = {"int16": "h", "int32": "i", "float32": "f"}[self.sample_format]
+            src: List = view[: n * width * self.channels].cast(code).tolist()
+            c = self.channels
+            for k in range(n):
+                v = sum(src[k * c:(k + 1) * c]) / c * self.scale
+                out[k] = max(-32768, min(32767, int(round(v))))
+        return _frame(out, n, sample_rate)
@@ -1,10 +1,78 @@
 from __future__ import annotations
 
-from typing import Optional
+import os
+import tempfile
+from typing import Iterator, Optional
+
+try:
+    import sounddevice as sd  # type: ignore
+except Exception:  # pragma: no cover
+    sd = None
+
+from .audio import FRAME_MS, SAMPLE_RATE, SAMPLE_WIDTH, AudioFrame, FrameRing, frame_bytes, wav_frames
+from .dsp import FormatConverter, Resampler
 
 
 class Microphone:
+    """Capture as AudioFrames of 16-bit mono PCM at ``sample_rate``.
+
+    ``source`` replays a WAV file in place of a capture device. A device
+    that only offers another rate, channel count or sample format
+    (``device_rate``, ``device_channels``, ``device_format``) is converted
+    frame by frame into preallocated buffers; a device already in the
+    pipeline format is copied once into a FrameRing.
+    """
+
+    def __init__(
+        self,
+        source: Optional[str] = None,
+        sample_rate: int = SAMPLE_RATE,
+        device_rate: Optional[int] = None,
+        device_channels: int = 1,
+        device_format: str = "int16",
+        ring_slots: int = 64,
+    ) -> None:
+        self.source = source
+        self.sample_rate = sample_rate
+        self.device_rate = device_rate or sample_rate
+        self.device_channels = device_channels
+        self.device_format = device_format
+        self.ring_slots = ring_slots
+
     def record(self, seconds: int = 5, out_path: Optional[str] = None) -> Optional[str]:
-        # Placeholder: no actual recording
-        return None
+        """File adapter: ``seconds`` of capture written as a WAV."""
+        if sd is None and not self.source:
+            # Placeholder: no capture device
+            return None
+        buf = bytearray(int(seconds * self.sample_rate) * SAMPLE_WIDTH)
+        n = 0
+        for frame in self.frames():
+            take = min(len(frame), len(buf) - n)
+            buf[n:n + take] = frame.data[:take]
+            n += take
+            if n >= len(buf):
+                break
+        if out_path is None:
+            fd, out_path = tempfile.mkstemp(prefix="mic_", suffix=".wav")
+            os.close(fd)
+        return AudioFrame(memoryview(buf)[:n], self.sample_rate).save(out_path)
 
+    def frames(self, frame_ms: int = FRAME_MS) -> Iterator[AudioFrame]:
+        """Frames as they are captured (blocking). Ring-backed frames are views; see FrameRing."""
+        if self.source:
+            yield from wav_frames(self.source, frame_ms, self.sample_rate)
+            return
+        if sd is None:
+            raise RuntimeError("实时录音需要安装 sounddevice，或在 voice.source 中指定 WAV 文件")  # User-facing message, keep Chinese
+        block = self.device_rate * frame_ms // 1000
+        direct = self.device_format == "int16" and self.device_channels == 1 and self.device_rate == self.sample_rate
+        ring = FrameRing(frame_bytes(self.sample_rate, frame_ms), self.ring_slots, self.sample_rate) if direct else None
+        converter = FormatConverter(self.device_format, self.device_channels, block, self.ring_slots)
+        resampler = Resampler(self.device_rate, self.sample_rate, block, self.ring_slots)
+        with sd.RawInputStream(samplerate=self.device_rate, channels=self.device_channels, dtype=self.device_format, blocksize=block) as stream:
+            while True:
+                data, _ = stream.read(block)
+                if ring is not None:
+                    yield from ring.write(data)
+                else:
+                    yield resampler.process(converter.convert(data, self.device_rate))
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Union
+
+from core.state import AgentState
+
+from .audio import FRAME_MS, SAMPLE_RATE, AudioFrame
+from .tts import SentenceSplitter
+from .vad import EnergyVAD
+
+Frames = Union[Iterable[AudioFrame], AsyncIterator[AudioFrame]]
+
+
+async def as_async(frames: Frames) -> AsyncIterator[AudioFrame]:
+    """Async view of a frame source; blocking sources (a capture device) are read on the executor."""
+    if hasattr(frames, "__aiter__"):
+        async for frame in frames:  # type: ignore[union-attr]
+            yield frame
+        return
+    loop = asyncio.get_running_loop()
+    it = iter(frames)  # type: ignore[arg-type]
+    while True:
+        frame = await loop.run_in_executor(None, next, it, None)
+        if frame is None:
+            return
+        yield frame
+
+
+class VoicePipeline:
+    """One spoken turn, streamed end to end.
+
+    Capture feeds PCM frames through the VAD; frames inside an utterance go
+    to an incremental transcriber on the executor (partials reach
+    ``on_partial``), and the VAD's end-of-speech closes the turn without
+    waiting for a fixed recording length. The reply streams from the graph
+    into a sentence splitter; each sentence is synthesized as soon as it
+    completes, and a player task plays sentence N while later ones are
+    still being synthesized (at most ``max_ahead`` queued).
+
+    ``run_turn`` returns the turn's timings in milliseconds relative to
+    end of speech, ``first_audio_ms`` being the headline metric.
+    """
+
+    def __init__(
+        self,
+        graph: Any,
+        stt: Any,
+        tts: Any = None,
+        player: Any = None,
+        vad: Optional[EnergyVAD] = None,
+        sample_rate: int = SAMPLE_RATE,
+        partial_every_ms: int = 400,
+        max_ahead: int = 2,
+        on_partial: Optional[Callable[[str], None]] = None,
+        on_transcript: Optional[Callable[[str], None]] = None,
+        on_delta: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.graph = graph
+        self.stt = stt
+        self.tts = tts
+        self.player = player
+        self.vad = vad or EnergyVAD()
+        self.sample_rate = sample_rate
+        self.partial_every_ms = partial_every_ms
+        self.max_ahead = max(1, max_ahead)
+        self.on_partial = on_partial
+        self.on_transcript = on_transcript
+        self.on_delta = on_delta
+
+    async def listen(self, frames: AsyncIterator[AudioFrame], marks: Dict[str, float]) -> Optional[str]:
+        """Consume ``frames`` up to the end of one utterance and return its transcript (None at end of input)."""
+        stream = None
+        wake = asyncio.Event()
+        stt_task: Optional[asyncio.Task] = None
+        async for frame in frames:
+            events = self.vad.feed(frame)
+            for kind, audio in events:
+                if kind == "start":
+                    stream = self.stt.stream(self.sample_rate, self.partial_every_ms)
+                    stt_task = asyncio.ensure_future(self._transcribe(stream, wake, marks))
+                    marks["speech_start"] = time.perf_counter()
+                elif kind == "audio":
+                    # Copied into the utterance buffer before the capture ring can reuse the slot
+                    stream.append(audio)
+                else:
+                    marks["end_of_speech"] = time.perf_counter()
+            if events:
+                if events[0][0] == "start":  # the pre-roll reaches back before the trigger
+                    marks["speech_start"] -= sum(a.duration_ms for k, a in events if k == "audio") / 1000.0
+                wake.set()
+            if "end_of_speech" in marks:
+                break
+        if stt_task is None:
+            return None
+        if "end_of_speech" not in marks:  # input ran out mid-utterance
+            marks["end_of_speech"] = time.perf_counter()
+            self.vad.reset()
+            wake.set()
+        text = await stt_task
+        marks["transcript"] = time.perf_counter()
+        return text
+
+    async def _transcribe(self, stream: Any, wake: asyncio.Event, marks: Dict[str, float]) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        partials = 0
+        while True:
+            await wake.wait()
+            wake.clear()
+            if "end_of_speech" in marks:
+                # The final transcript follows at once; no partial may delay it
+                marks["partials"] = partials
+                return await loop.run_in_executor(None, stream.finish)
+            # No partials during a pause: the utterance is probably about to end
+            if self.vad.silent_frames == 0 and stream.partial_due():
+                partial = await loop.run_in_executor(None, stream.partial)
+                if partial:
+                    partials += 1
+                    if self.on_partial is not None:
+                        self.on_partial(partial)
+
+    async def speak(self, state: AgentState, marks: Dict[str, float]) -> None:
+        """Stream the reply for ``state``, synthesizing and playing it sentence by sentence."""
+        loop = asyncio.get_running_loop()
+        pending: "asyncio.Queue[Optional[asyncio.Future]]" = asyncio.Queue(maxsize=self.max_ahead)
+        counts = {"sentences": 0, "tts_errors": 0, "audio_ms": 0.0}
+
+        async def submit(sentence: str) -> None:
+            counts["sentences"] += 1
+            marks.setdefault("first_sentence", time.perf_counter())
+            if self.tts is not None:
+                await pending.put(loop.run_in_executor(None, self.tts.synthesize_frame, sentence))
+
+        async def produce() -> None:
+            splitter = SentenceSplitter()
+            try:
+                async for delta in self.graph.astream_turn(state):
+                    marks.setdefault("first_token", time.perf_counter())
+                    if self.on_delta is not None:
+                        self.on_delta(delta)
+                    for sentence in splitter.feed(delta):
+                        await submit(sentence)
+                for sentence in splitter.flush():
+                    await submit(sentence)
+            finally:
+                await pending.put(None)
+
+        async def play() -> None:
+            while True:
+                future = await pending.get()
+                if future is None:
+                    return
+                try:
+                    audio = await future
+                except Exception:
+                    # A failed sentence is skipped; the rest of the reply still plays
+                    counts["tts_errors"] += 1
+                    continue
+                if audio is None or not len(audio):
+                    continue
+                marks.setdefault("first_audio", time.perf_counter())
+                counts["audio_ms"] += audio.duration_ms
+                if self.player is not None:
+                    await loop.run_in_executor(None, self.player.play_frame, audio)
+
+        await asyncio.gather(produce(), play())
+        marks["done"] = time.perf_counter()
+        marks.update(counts)
+
+    async def run_turn(self, frames: AsyncIterator[AudioFrame], state: AgentState) -> Optional[Dict[str, Any]]:
+        """Listen for one utterance and answer it; None once ``frames`` is exhausted."""
+        marks: Dict[str, Any] = {}
+        text = await self.listen(frames, marks)
+        if text is None and "end_of_speech" not in marks:
+            return None
+        if text:
+            if self.on_transcript is not None:
+                self.on_transcript(text)
+            state.stt_text = text
+            await self.speak(state, marks)
+        return turn_metrics(marks, text, state.response_text if text else "")
+
+
+def turn_metrics(marks: Dict[str, Any], transcript: Optional[str], reply: str) -> Dict[str, Any]:
+    eos = marks["end_of_speech"]
+
+    def since_eos(key: str) -> Optional[float]:
+        return round((marks[key] - eos) * 1000, 1) if key in marks else None
+
+    return {
+        "transcript": transcript or "",
+        "reply": reply,
+        "end_of_speech_at": eos,  # perf_counter seconds, for aligning with external clocks
+        "speech_ms": round((eos - marks.get("speech_start", eos)) * 1000, 1),
+        "partials": marks.get("partials", 0),
+        "transcript_ms": since_eos("transcript"),
+        "first_token_ms": since_eos("first_token"),
+        "first_sentence_ms": since_eos("first_sentence"),
+        "first_audio_ms": since_eos("first_audio"),
+        "done_ms": since_eos("done"),
+        "sentences": marks.get("sentences", 0),
+        "tts_errors": marks.get("tts_errors", 0),
+        "audio_ms": round(marks.get("audio_ms", 0.0), 1),
+    }
+
+
+def make_vad(config: Dict) -> EnergyVAD:
+    conf = (config.get("voice") or {}).get("vad") or {}
+    return EnergyVAD(
+        threshold=float(conf.get("threshold", 500.0)),
+        ratio=float(conf.get("ratio", 3.0)),
+        start_ms=int(conf.get("start_ms", 60)),
+        hangover_ms=int(conf.get("hangover_ms", 300)),
+        pre_roll_ms=int(conf.get("pre_roll_ms", 200)),
+        frame_ms=int((config.get("voice") or {}).get("frame_ms", FRAME_MS)),
+    )
+
+
+def make_voice_pipeline(config: Dict, graph: Any, stt: Any, tts: Any = None, player: Any = None, **callbacks: Any) -> VoicePipeline:
+    conf = config.get("voice") or {}
+    return VoicePipeline(
+        graph,
+        stt,
+        tts,
+        player,
+        vad=make_vad(config),
+        sample_rate=int(conf.get("sample_rate", SAMPLE_RATE)),
+        partial_every_ms=int(conf.get("partial_every_ms", 400)),
+        max_ahead=int(conf.get("max_ahead", 2)),
+        **callbacks,
+    )
@@ -2,9 +2,40 @@ from __future__ import annotations
 
 from typing import Optional
 
+try:
+    import sounddevice as sd  # type: ignore
+except Exception:  # pragma: no cover
+    sd = None
+
+from .audio import AudioFrame
+
 
 class AudioPlayer:
+    def __init__(self) -> None:
+        self._stream = None
+        self._rate: Optional[int] = None
+
     def play(self, audio_path: str) -> None:
-        # Placeholder: no actual playback
-        pass
+        """File adapter: plays a 16-bit WAV; other formats are not decoded."""
+        if sd is None or not audio_path.lower().endswith(".wav"):
+            # Placeholder: no actual playback
+            return
+        self.play_frame(AudioFrame.from_wav(audio_path))
+
+    def play_frame(self, audio: AudioFrame) -> None:
+        """Play PCM straight from the frame's buffer, blocking until the device has taken it."""
+        if sd is None or not len(audio):
+            return
+        if self._stream is None or self._rate != audio.sample_rate:
+            self.close()
+            # One open stream across frames, so consecutive sentences play without a gap
+            self._stream = sd.RawOutputStream(samplerate=audio.sample_rate, channels=1, dtype="int16")
+            self._stream.start()
+            self._rate = audio.sample_rate
+        self._stream.write(audio.data)
 
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
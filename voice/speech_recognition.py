@@ -1,14 +1,116 @@
 from __future__ import annotations
 
-from typing import Optional
+import mimetypes
+import os
+from typing import Callable, List, Optional, Sequence, Union
+
+from core.http_client import HttpClient, encode_multipart, provider_endpoint
+
+from .audio import SAMPLE_RATE, SAMPLE_WIDTH, AudioFrame, Buffer
+
+
+class IncrementalTranscriber:
+    """Partial transcripts of an utterance while it is still being spoken.
+
+    Frames are appended (one copy each) into a preallocated utterance
+    buffer that doubles when full; transcription reads a view of it, so
+    the frames themselves may be ring views. Every ``partial_every_ms`` of
+    new audio the utterance so far is transcribed again and returned as a
+    partial (``partial_every_ms=0`` disables partials). ``finish``
+    transcribes the whole utterance once.
+    """
+
+    def __init__(
+        self,
+        transcribe_frame: Callable[[AudioFrame], Optional[str]],
+        sample_rate: int = SAMPLE_RATE,
+        partial_every_ms: int = 0,
+        max_seconds: float = 30.0,
+    ) -> None:
+        self.transcribe_frame = transcribe_frame
+        self.sample_rate = sample_rate
+        self.partial_every_ms = partial_every_ms
+        self._buf = bytearray(int(sample_rate * max_seconds) * SAMPLE_WIDTH)
+        self._len = 0
+        self._pending_ms = 0.0
+        self.partials: List[str] = []
+
+    def append(self, frame: Union[AudioFrame, Buffer]) -> None:
+        data = frame.data if isinstance(frame, AudioFrame) else frame
+        end = self._len + len(data)
+        if end > len(self._buf):
+            # A new buffer rather than a resize: views handed to an in-flight partial stay valid
+            grown = bytearray(max(end, 2 * len(self._buf)))
+            grown[: self._len] = memoryview(self._buf)[: self._len]
+            self._buf = grown
+        self._buf[self._len:end] = data
+        self._len = end
+        self._pending_ms += len(data) / SAMPLE_WIDTH / self.sample_rate * 1000.0
+
+    def audio(self) -> AudioFrame:
+        """View of the utterance so far."""
+        return AudioFrame(memoryview(self._buf)[: self._len], self.sample_rate)
+
+    def partial_due(self) -> bool:
+        return self.partial_every_ms > 0 and self._pending_ms >= self.partial_every_ms
+
+    def partial(self) -> Optional[str]:
+        self._pending_ms = 0.0
+        text = self.transcribe_frame(self.audio()) if self._len else None
+        if text and (not self.partials or text != self.partials[-1]):
+            self.partials.append(text)
+            return text
+        return None
+
+    def feed(self, frame: Union[AudioFrame, Buffer], partial: bool = True) -> Optional[str]:
+        self.append(frame)
+        return self.partial() if partial and self.partial_due() else None
+
+    def finish(self) -> Optional[str]:
+        text = self.transcribe_frame(self.audio()) if self._len else None
+        self._len = 0
+        self._pending_ms = 0.0
+        return text
 
 
 class STTEngine:
-    def __init__(self, provider: str = "openai", model: str = "whisper-1") -> None:
+    def __init__(
+        self,
+        provider: str = "openai",
+        model: str = "whisper-1",
+        client: Optional[HttpClient] = None,
+        api_key_env: str = "OPENAI_API_KEY",
+        base_url: str = "",
+    ) -> None:
         self.provider = provider
         self.model = model
+        self.client = client
+        self.api_key = os.getenv(api_key_env, "")
+        self.base_url = base_url
 
     def transcribe(self, audio_path: str) -> Optional[str]:
-        # Placeholder: returns None, indicating fallback to CLI text input
-        return None
+        if self.client is None or not audio_path:
+            # Placeholder: returns None, indicating fallback to CLI text input
+            return None
+        # File adapter: the file's bytes are uploaded as they are, in any format the provider takes
+        with open(audio_path, "rb") as f:
+            audio = f.read()
+        mime = mimetypes.guess_type(audio_path)[0] or "application/octet-stream"
+        return self._post(os.path.basename(audio_path), audio, mime)
+
+    def transcribe_frame(self, audio: AudioFrame) -> Optional[str]:
+        if self.client is None or not len(audio):
+            return None
+        # Header and PCM view go into the request body as-is; no WAV is built in between
+        return self._post("speech.wav", audio.wav_parts(), "audio/wav")
+
+    def stream(self, sample_rate: int = SAMPLE_RATE, partial_every_ms: int = 0) -> IncrementalTranscriber:
+        return IncrementalTranscriber(self.transcribe_frame, sample_rate, partial_every_ms)
 
+    def _post(self, filename: str, audio: Union[Buffer, Sequence[Buffer]], mime: str) -> Optional[str]:
+        body, content_type = encode_multipart({"model": self.model}, {"file": (filename, audio, mime)})
+        url, headers = provider_endpoint(self.provider, "/audio/transcriptions", self.model, self.api_key, self.base_url)
+        headers["Content-Type"] = content_type
+        # Transcription is idempotent, so a slow upload may be hedged
+        resp = self.client.request("POST", url, data=body, headers=headers, limit_key=f"{self.provider}:{self.model}", hedge=True)
+        return (resp.json().get("text") or "").strip() or None
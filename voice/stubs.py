@@ -0,0 +1,106 @@
+"""WAV-backed stand-ins for the voice engines, for exercising the pipeline offline.
+
+``ScriptedSTT`` "recognizes" a known transcript, revealing it in proportion
+to the audio heard; ``ToneTTS`` renders each sentence as a tone whose length
+follows the text; ``WavPlayer`` plays into a WAV file in real time. Each
+models provider latency (a fixed cost plus a cost per unit of work) so the
+pipeline's timings behave like the real thing.
+"""
+from __future__ import annotations
+
+import math
+import random
+import time
+from array import array
+from typing import Optional
+
+from .audio import SAMPLE_RATE, AudioFrame
+from .speech_recognition import IncrementalTranscriber
+
+
+def _pcm(values: array) -> bytes:
+    if array("h", [1]).tobytes() != b"\x01\x00":  # pragma: no cover
+        values.byteswap()
+    return values.tobytes()
+
+
+def synth_utterance(path: str, speech_ms: int = 2400, lead_ms: int = 400, tail_ms: int = 1200, sample_rate: int = SAMPLE_RATE, seed: int = 7) -> str:
+    """Write a WAV of silence, speech-like noise bursts and trailing silence."""
+    rng = random.Random(seed)
+    out = array("h")
+
+    def noise(ms: int, amp: float) -> None:
+        out.extend(int(rng.gauss(0.0, amp)) for _ in range(sample_rate * ms // 1000))
+
+    noise(lead_ms, 30.0)
+    t = 0
+    while t < speech_ms:
+        syllable = min(rng.randint(120, 260), speech_ms - t)
+        n = sample_rate * syllable // 1000
+        freq = rng.uniform(140.0, 260.0)
+        out.extend(
+            max(-32767, min(32767, int(6000 * math.sin(math.pi * i / n) * math.sin(2 * math.pi * freq * i / sample_rate) + rng.gauss(0.0, 300.0))))
+            for i in range(n)
+        )
+        t += syllable
+        gap = min(rng.randint(20, 60), max(0, speech_ms - t))  # short pauses stay under the VAD hangover
+        noise(gap, 30.0)
+        t += gap
+    noise(tail_ms, 30.0)
+    return AudioFrame(_pcm(out), sample_rate).save(path)
+
+
+class ScriptedSTT:
+    def __init__(self, transcript: str, speech_ms: float, latency_ms: float = 120.0, ms_per_audio_second: float = 60.0) -> None:
+        self.transcript = transcript
+        self.speech_ms = max(1.0, speech_ms)
+        self.latency_ms = latency_ms
+        self.ms_per_audio_second = ms_per_audio_second
+        self.calls = 0
+
+    def transcribe_frame(self, audio: AudioFrame) -> Optional[str]:
+        heard = audio.duration_ms
+        time.sleep((self.latency_ms + self.ms_per_audio_second * heard / 1000.0) / 1000.0)
+        self.calls += 1
+        n = int(round(len(self.transcript) * min(1.0, heard / self.speech_ms)))
+        return self.transcript[:n] or None
+
+    def stream(self, sample_rate: int = SAMPLE_RATE, partial_every_ms: int = 0) -> IncrementalTranscriber:
+        return IncrementalTranscriber(self.transcribe_frame, sample_rate, partial_every_ms)
+
+
+class ToneTTS:
+    sample_rate = SAMPLE_RATE
+
+    def __init__(self, ms_per_char: float = 120.0, latency_ms: float = 150.0, ms_per_char_compute: float = 8.0) -> None:
+        self.ms_per_char = ms_per_char
+        self.latency_ms = latency_ms
+        self.ms_per_char_compute = ms_per_char_compute
+        self.calls = 0
+
+    def synthesize_frame(self, text: str) -> AudioFrame:
+        time.sleep((self.latency_ms + self.ms_per_char_compute * len(text)) / 1000.0)
+        self.calls += 1
+        n = int(self.sample_rate * self.ms_per_char * len(text) / 1000)
+        freq = 200.0 + 20.0 * (len(text) % 10)
+        return AudioFrame(_pcm(array("h", (int(4000 * math.sin(2 * math.pi * freq * i / self.sample_rate)) for i in range(n)))), self.sample_rate)
+
+
+class WavPlayer:
+    """Collects played audio into ``out_path``; ``realtime`` blocks for the audio's duration."""
+
+    def __init__(self, out_path: Optional[str] = None, realtime: bool = True) -> None:
+        self.out_path = out_path
+        self.realtime = realtime
+        self.buf = bytearray()
+        self.sample_rate = SAMPLE_RATE
+
+    def play_frame(self, audio: AudioFrame) -> None:
+        self.buf += audio.data  # frames may be views of reused buffers
+        self.sample_rate = audio.sample_rate
+        if self.realtime:
+            time.sleep(audio.duration_ms / 1000.0)
+
+    def close(self) -> None:
+        if self.out_path and self.buf:
+            AudioFrame(self.buf, self.sample_rate).save(self.out_path)
@@ -1,14 +1,99 @@
 from __future__ import annotations
 
-from typing import Optional
+import os
+import tempfile
+from typing import Iterable, Iterator, List, Optional
+
+from core.http_client import HttpClient, provider_endpoint
+
+from .audio import AudioFrame
+
+_SENTENCE_END = set("。！？!?；;\n")
+
+
+class SentenceSplitter:
+    """Incrementally cuts streamed text into sentences for TTS.
+
+    A "." only ends a sentence when followed by whitespace, so decimals and
+    abbreviations inside a chunk stay intact.
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+
+    def feed(self, delta: str) -> List[str]:
+        self._buf += delta
+        out: List[str] = []
+        start = 0
+        buf = self._buf
+        for i, ch in enumerate(buf):
+            if ch in _SENTENCE_END or (ch == "." and i + 1 < len(buf) and buf[i + 1].isspace()):
+                sentence = buf[start:i + 1].strip()
+                if sentence:
+                    out.append(sentence)
+                start = i + 1
+        self._buf = buf[start:]
+        return out
+
+    def flush(self) -> List[str]:
+        rest, self._buf = self._buf.strip(), ""
+        return [rest] if rest else []
 
 
 class TTSEngine:
-    def __init__(self, provider: str = "openai", voice: str = "allison") -> None:
+    # Raw "pcm" responses are 24 kHz 16-bit mono
+    sample_rate = 24000
+
+    def __init__(
+        self,
+        provider: str = "openai",
+        voice: str = "allison",
+        model: str = "tts-1",
+        client: Optional[HttpClient] = None,
+        api_key_env: str = "OPENAI_API_KEY",
+        base_url: str = "",
+    ) -> None:
         self.provider = provider
         self.voice = voice
+        self.model = model
+        self.client = client
+        self.api_key = os.getenv(api_key_env, "")
+        self.base_url = base_url
+
+    def _speech(self, text: str, response_format: str) -> bytes:
+        url, headers = provider_endpoint(self.provider, "/audio/speech", self.model, self.api_key, self.base_url)
+        resp = self.client.request(
+            "POST",
+            url,
+            json={"model": self.model, "input": text, "voice": self.voice, "response_format": response_format},
+            headers=headers,
+            limit_key=f"{self.provider}:{self.model}",
+            coalesce=True,
+        )
+        return resp.body
+
+    def synthesize_frame(self, text: str) -> Optional[AudioFrame]:
+        """Raw PCM at ``sample_rate`` as a view of the response body; None without a client."""
+        if self.client is None:
+            return None
+        return AudioFrame(self._speech(text, "pcm"), self.sample_rate)
 
     def synthesize(self, text: str, out_path: Optional[str] = None) -> Optional[str]:
-        # Placeholder: no audio generation, returns None
-        return None
+        """File adapter: the synthesized sentence written as a WAV (a temp file by default)."""
+        audio = self.synthesize_frame(text)
+        if audio is None:
+            # Placeholder: no audio generation, returns None
+            return None
+        if out_path is None:
+            fd, out_path = tempfile.mkstemp(prefix="tts_", suffix=".wav")
+            os.close(fd)
+        return audio.save(out_path)
 
+    def synthesize_stream(self, deltas: Iterable[str]) -> Iterator[Optional[AudioFrame]]:
+        """Synthesize streamed reply text sentence by sentence, as soon as each one completes."""
+        splitter = SentenceSplitter()
+        for delta in deltas:
+            for sentence in splitter.feed(delta):
+                yield self.synthesize_frame(sentence)
+        for sentence in splitter.flush():
+            yield self.synthesize_frame(sentence)
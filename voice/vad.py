@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Deque, List, Optional, Tuple, Union
+
+from .audio import FRAME_MS, AudioFrame, Buffer, np, rms
+
+
+class EnergyVAD:
+    """Energy-based voice activity detection over fixed-size PCM frames.
+
+    A frame is speech when its RMS exceeds both ``threshold`` and
+    ``ratio`` times a running noise floor (tracked on non-speech frames).
+    An utterance starts after ``start_ms`` of consecutive speech and ends
+    after ``hangover_ms`` of consecutive silence, so a turn closes as soon
+    as the speaker pauses instead of after a fixed recording length.
+
+    ``feed`` returns events: ``("start", None)``, then ``("audio", frame)``
+    for the frames that triggered the start (and up to ``pre_roll_ms``
+    before them) and for each frame inside the utterance, and
+    ``("end", None)``. Pre-roll frames are held as views, so a capture
+    ring must have more slots than the pre-roll spans.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 500.0,
+        ratio: float = 3.0,
+        start_ms: int = 60,
+        hangover_ms: int = 300,
+        pre_roll_ms: int = 200,
+        frame_ms: int = FRAME_MS,
+    ) -> None:
+        self.threshold = threshold
+        self.ratio = ratio
+        self.frame_ms = frame_ms
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self._pre_roll: Deque[AudioFrame] = deque(maxlen=max(self.start_frames, pre_roll_ms // frame_ms))
+        self.noise_floor = threshold / ratio
+        self.in_speech = False
+        self._voiced = 0
+        self.silent_frames = 0
+        self._scratch = np.empty(0, dtype=np.float32) if np is not None else None
+
+    def is_speech(self, frame: AudioFrame) -> bool:
+        if self._scratch is not None and len(self._scratch) < frame.num_samples:
+            self._scratch = np.empty(frame.num_samples, dtype=np.float32)
+        level = rms(frame, self._scratch)
+        speech = level > max(self.threshold, self.noise_floor * self.ratio)
+        if not speech:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * level
+        return speech
+
+    def feed(self, frame: Union[AudioFrame, Buffer]) -> List[Tuple[str, Optional[AudioFrame]]]:
+        if not isinstance(frame, AudioFrame):
+            frame = AudioFrame(frame)
+        speech = self.is_speech(frame)
+        if not self.in_speech:
+            self._pre_roll.append(frame)
+            self._voiced = self._voiced + 1 if speech else 0
+            if self._voiced < self.start_frames:
+                return []
+            self.in_speech, self.silent_frames = True, 0
+            events: List[Tuple[str, Optional[AudioFrame]]] = [("start", None)]
+            events.extend(("audio", f) for f in self._pre_roll)
+            self._pre_roll.clear()
+            return events
+        self.silent_frames = 0 if speech else self.silent_frames + 1
+        events = [("audio", frame)]
+        if self.silent_frames >= self.hangover_frames:
+            self.reset()
+            events.append(("end", None))
+        return events
+
+    def reset(self) -> None:
+        self.in_speech = False
+        self._voiced = self.silent_frames = 0
+        self._pre_roll.clear()